@@ -6,10 +6,11 @@ import configparser
 import gettext
 import locale
 import os.path
+from apps import compression, vendor
 _ = gettext.gettext
 
 ## Settings
-CONFIG_FILE = 'config.ini'
+CONFIG_FILE = os.getenv('CONFIG_FILE', 'config.ini')
 
 # Read configuration File
 if not os.path.isfile(CONFIG_FILE):
@@ -31,6 +32,20 @@ else:
 # Backend settings
 API_URL = os.getenv('API_URL')
 
+# Background callbacks, executed on a local process pool (dash[diskcache])
+background_callback_manager = None
+if config['BACKGROUND']['ENABLED'].lower() == 'true':
+    try:
+        import diskcache
+        from dash import DiskcacheManager
+        background_callback_manager = DiskcacheManager(
+            diskcache.Cache(config['BACKGROUND']['CACHE_DIR'])
+        )
+    except ImportError:
+        print('WARNING: diskcache not installed, background callbacks ' \
+              'disabled')
+BACKGROUND = background_callback_manager is not None
+
 # Set locale
 locale.setlocale(locale.LC_MONETARY, config['SITE']['LANG'])
 
@@ -44,11 +59,17 @@ if config['SITE']['LANG'].split('.')[0]=='pt_BR':
     _ = pt_br.gettext # Brazilian portuguese
 
 # Dash app object
-THEME = dbc.themes.BOOTSTRAP
-FA = "https://use.fontawesome.com/releases/v5.15.3/css/all.css"
+LOCAL_ASSETS = config.getboolean('ASSETS', 'LOCAL')
+if LOCAL_ASSETS:
+    THEME = vendor.url(vendor.BOOTSTRAP)
+    FA = vendor.url(vendor.FONT_AWESOME)
+else:
+    THEME = dbc.themes.BOOTSTRAP
+    FA = "https://use.fontawesome.com/releases/v5.15.3/css/all.css"
 app = dash.Dash(
     __name__,
     external_stylesheets=[THEME, FA],
+    background_callback_manager=background_callback_manager,
     meta_tags=[
         {
             'name': 'viewport',
@@ -61,3 +82,9 @@ app = dash.Dash(
 )
 app.config.suppress_callback_exceptions=True
 
+# Flask server, for WSGI servers
+server = app.server
+if LOCAL_ASSETS:
+    vendor.register(server)
+compression.register(server, config['COMPRESSION'])
+
@@ -0,0 +1,281 @@
+"""api.py
+
+Backend API (API_URL) client.
+
+Requests go through a keep-alive connection pool per process, are bounded by
+connect and read timeouts, and are retried a few times, with exponential
+backoff, on connection errors and, for idempotent methods, on read timeouts
+and 502, 503 or 504 answers. A circuit breaker
+fails calls fast while the backend is down, so Dash workers are not tied up
+waiting for it.
+
+Access tokens' expiry is checked locally, from their JWT 'exp' claim, so
+callbacks only need the API again once the token expired.
+"""
+import base64
+import binascii
+import json
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app import config, API_URL
+
+###############################################################################
+# Settings
+CONNECT_TIMEOUT = config.getfloat('API', 'CONNECT_TIMEOUT')
+READ_TIMEOUT = config.getfloat('API', 'READ_TIMEOUT')
+RETRIES = config.getint('API', 'RETRIES')
+BACKOFF = config.getfloat('API', 'BACKOFF')
+POOL_SIZE = config.getint('API', 'POOL_SIZE')
+BREAKER_THRESHOLD = config.getint('API', 'BREAKER_THRESHOLD')
+BREAKER_RESET = config.getfloat('API', 'BREAKER_RESET')
+TOKEN_LEEWAY = config.getfloat('API', 'TOKEN_LEEWAY')
+
+# Answers worth retrying, the backend or its proxy being momentarily down
+RETRY_STATUS = (502, 503, 504)
+
+# Requests that could not be sent, whatever the backend's health
+INVALID_REQUEST = (
+    requests.exceptions.MissingSchema,
+    requests.exceptions.InvalidSchema,
+    requests.exceptions.InvalidURL,
+    requests.exceptions.InvalidHeader,
+    requests.exceptions.URLRequired,
+)
+
+###############################################################################
+# Circuit breaker
+###############################################################################
+class CircuitOpenError(requests.ConnectionError):
+    """Call rejected without trying, the backend failed repeatedly
+    """
+
+class CircuitBreaker:
+    """Rejects calls for a while after repeated failures
+
+    After 'threshold' failures in a row the circuit opens: calls fail with
+    CircuitOpenError for 'reset_timeout' seconds. Then a single trial call
+    goes through (half-open), closing the circuit on success or opening it
+    again on failure.
+
+    Parameters
+    ----------
+        threshold | Integer
+            Consecutive failures opening the circuit
+
+        reset_timeout | Float
+            Seconds before a trial call
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD,
+                 reset_timeout=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """'closed', 'open' or 'half-open'
+        """
+        if self.opened_at is None:
+            return 'closed'
+        if self.trial or \
+                time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self):
+        """Raise CircuitOpenError unless the call may go through
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if self.trial or \
+                    time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError('backend API circuit is open')
+            self.trial = True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+    def release(self):
+        """End a call that tells nothing of the backend's health
+
+        A trial call ending so lets the next call try again.
+        """
+        with self._lock:
+            self.trial = False
+
+breaker = CircuitBreaker()
+
+###############################################################################
+# Requests
+###############################################################################
+_session = {'pid': None, 'session': None}
+_session_lock = threading.Lock()
+
+def session():
+    """Keep-alive session of the current process
+
+    Created on first use: connections must not be shared with the processes
+    forked by the WSGI server.
+    """
+    with _session_lock:
+        if _session['pid'] != os.getpid():
+            retry = Retry(
+                total=RETRIES,
+                backoff_factor=BACKOFF,
+                status_forcelist=RETRY_STATUS,
+                # Idempotent methods only (urllib3's default): a login
+                # (POST /token) is not sent again once it reached the
+                # backend, only when the connection failed
+                allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE,
+                                  max_retries=retry)
+            s = requests.Session()
+            s.mount('http://', adapter)
+            s.mount('https://', adapter)
+            _session.update(pid=os.getpid(), session=s)
+        return _session['session']
+
+def build_request_headers(
+        access_token,
+        accept_type="application/json",
+        **kwargs
+    ):
+    headers = {
+        "accept": accept_type
+    }
+    if access_token:
+        headers["Authorization"] = f"Bearer {access_token}"
+
+    if "content_type" in kwargs:
+        headers["Content-Type"] = kwargs["content_type"]
+
+    return headers
+
+def request(method, path, access_token=None, base_url=None,
+            content_type=None, **kwargs):
+    """Send a backend API request
+
+    Parameters
+    ----------
+        path | String
+            Endpoint path, ex.: '/token'
+
+        access_token | String
+            Bearer token, if any
+
+        base_url | String
+            API location, defaults to API_URL
+
+        kwargs
+            requests.Session.request() parameters (params, data, json...)
+
+    Returns
+    -------
+        requests.Response, after retries
+
+    Raises
+    ------
+        requests.RequestException on connection errors and timeouts,
+        CircuitOpenError while the backend is considered down
+
+    Only connection errors, timeouts and 5xx answers count as breaker
+    failures, not invalid requests (INVALID_REQUEST) or interruptions.
+    """
+    breaker.before_call()
+
+    headers = build_request_headers(access_token)
+    if content_type:
+        headers['Content-Type'] = content_type
+    headers.update(kwargs.pop('headers', {}))
+
+    try:
+        response = session().request(
+            method, f'{base_url or API_URL}{path}', headers=headers,
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs
+        )
+    except INVALID_REQUEST:
+        breaker.release()
+        raise
+    except requests.RequestException:
+        breaker.failure()
+        raise
+    except BaseException:
+        # Still end a half-open circuit's trial call
+        breaker.release()
+        raise
+
+    if response.status_code >= 500:
+        breaker.failure()
+    else:
+        breaker.success()
+    return response
+
+def login(username, password, base_url=None):
+    """Request an access token
+
+    Returns
+    -------
+        requests.Response of the '/token' endpoint
+    """
+    return request(
+        'POST', '/token', base_url=base_url,
+        content_type='application/x-www-form-urlencoded',
+        data={'username': username, 'password': password},
+    )
+
+###############################################################################
+# Tokens
+###############################################################################
+def token_expiry(access_token):
+    """Expiry time (UNIX epoch) of a JWT access token
+
+    The signature is not checked, the backend does.
+
+    Returns
+    -------
+        'exp' claim, None for tokens that are not JWTs or never expire
+    """
+    try:
+        payload = access_token.split('.')[1]
+        claims = json.loads(
+            base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4))
+        )
+        return float(claims['exp'])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError,
+            binascii.Error):
+        return None
+
+def token_valid(access_token, leeway=TOKEN_LEEWAY):
+    """Whether a token is present and not expiring within 'leeway' seconds
+    """
+    if not access_token:
+        return False
+    expiry = token_expiry(access_token)
+    return expiry is None or time.time() < expiry - leeway
+
+def authenticated(auth_data):
+    """Whether an 'auth-data' store holds a user with a valid token
+    """
+    return bool(auth_data and auth_data.get('username')) and \
+        token_valid(auth_data.get('access_token'))
@@ -0,0 +1,162 @@
+"""buckets.py
+
+Adaptive time bucketing: the chart granularity (day, week, month, quarter or
+year) is chosen from the selected range, so every series holds a bounded
+number of points however wide the range is.
+
+Buckets are identified by their first day, as 'YYYY-MM-DD' strings.
+"""
+import datetime as dt
+import numpy as np
+
+###############################################################################
+# Settings
+
+# From the finest to the coarsest
+GRANULARITIES = ['day', 'week', 'month', 'quarter', 'year']
+
+# Chart axis titles
+TITLES = {
+    'day': 'Dia',
+    'week': 'Semana',
+    'month': 'Mês',
+    'quarter': 'Trimestre',
+    'year': 'Ano',
+}
+
+MAX_POINTS = 60
+
+###############################################################################
+# Granularity
+###############################################################################
+def start(granularity, date):
+    """First day of the bucket holding 'date'
+
+    Weeks start on Monday (ISO 8601).
+    """
+    if granularity == 'day':
+        return date
+    if granularity == 'week':
+        return date - dt.timedelta(days=date.weekday())
+    if granularity == 'month':
+        return date.replace(day=1)
+    if granularity == 'quarter':
+        return date.replace(month=(date.month - 1) // 3 * 3 + 1, day=1)
+    if granularity == 'year':
+        return date.replace(month=1, day=1)
+    raise ValueError(f'invalid granularity "{granularity}"')
+
+def count(granularity, since, until):
+    """Number of buckets in the [since, until] range
+    """
+    first, last = start(granularity, since), start(granularity, until)
+    if granularity == 'day':
+        return (last - first).days + 1
+    if granularity == 'week':
+        return (last - first).days // 7 + 1
+    months = (last.year - first.year) * 12 + last.month - first.month
+    if granularity == 'month':
+        return months + 1
+    if granularity == 'quarter':
+        return months // 3 + 1
+    return last.year - first.year + 1
+
+def choose(since, until, max_points=MAX_POINTS):
+    """Finest granularity with at most 'max_points' buckets in the range
+
+    Parameters
+    ----------
+        since, until | datetime.date
+            Range limits, inclusive
+
+        max_points | Integer
+            Maximum number of buckets per series
+
+    Returns
+    -------
+        One of GRANULARITIES, 'year' when none fits
+    """
+    for granularity in GRANULARITIES:
+        if count(granularity, since, until) <= max_points:
+            return granularity
+    return GRANULARITIES[-1]
+
+###############################################################################
+# Bucket keys
+###############################################################################
+def sql(granularity, column):
+    """SQLite expression of the bucket key of a 'YYYY-MM-DD...' column
+    """
+    if granularity == 'day':
+        return f'substr({column}, 1, 10)'
+    if granularity == 'week':
+        # Next Sunday (or the same day), then back to its week's Monday
+        return f"date({column}, 'weekday 0', '-6 days')"
+    if granularity == 'month':
+        return f"substr({column}, 1, 7) || '-01'"
+    if granularity == 'quarter':
+        return (
+            f"substr({column}, 1, 5) || printf('%02d', "
+            f"(CAST(substr({column}, 6, 2) AS INTEGER) - 1) / 3 * 3 + 1) "
+            "|| '-01'"
+        )
+    if granularity == 'year':
+        return f"substr({column}, 1, 4) || '-01-01'"
+    raise ValueError(f'invalid granularity "{granularity}"')
+
+def day_keys(granularity, days):
+    """Bucket keys of an array of days
+
+    Parameters
+    ----------
+        days | np.ndarray
+            datetime64[D] values
+
+    Returns
+    -------
+        datetime64[D] array of bucket first days
+    """
+    if granularity == 'day':
+        return days
+    if granularity == 'week':
+        # 1970-01-01 was a Thursday
+        return days - (days.astype(np.int64) + 3) % 7
+    if granularity == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    if granularity == 'quarter':
+        months = days.astype('datetime64[M]').astype(np.int64)
+        return (months - months % 3).astype('datetime64[M]') \
+            .astype('datetime64[D]')
+    if granularity == 'year':
+        return days.astype('datetime64[Y]').astype('datetime64[D]')
+    raise ValueError(f'invalid granularity "{granularity}"')
+
+###############################################################################
+# Labels
+###############################################################################
+def labels(granularity, dates):
+    """Chart axis labels of bucket first days
+
+    Parameters
+    ----------
+        dates | pd.Series
+            datetime64 values
+
+    Returns
+    -------
+        pd.Series of strings, ex.: '25/03/2013' (day), 'S13/2013' (week),
+        '3/2013' (month), 'T1/2013' (quarter), '2013' (year)
+    """
+    if granularity == 'day':
+        return dates.dt.strftime('%d/%m/%Y')
+    if granularity == 'week':
+        iso = dates.dt.isocalendar()
+        return 'S' + iso['week'].astype(str) + '/' + iso['year'].astype(str)
+    if granularity == 'month':
+        return dates.dt.month.astype(str) + '/' + dates.dt.year.astype(str)
+    if granularity == 'quarter':
+        return 'T' + dates.dt.quarter.astype(str) + '/' + \
+            dates.dt.year.astype(str)
+    if granularity == 'year':
+        return dates.dt.year.astype(str)
+    raise ValueError(f'invalid granularity "{granularity}"')
@@ -0,0 +1,340 @@
+"""cache.py
+
+Result cache shared between the worker processes serving the dashboards.
+"""
+import functools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+###############################################################################
+# Settings
+COUNTERS = ('hits', 'misses', 'evictions')
+
+# Raised by pickle.loads() on corrupted or outdated entries (ex.: classes
+# moved or removed since they were stored)
+UNPICKLE_ERRORS = (
+    pickle.UnpicklingError, EOFError, AttributeError, ImportError,
+    IndexError, TypeError, ValueError,
+)
+
+###############################################################################
+# Helpers
+###############################################################################
+def canonical_key(since, until, segments):
+    """Return the canonical representation of a filter state
+
+    Parameters
+    ----------
+        since, until | Integer
+            Range limits in YYYYMMDD format
+
+        segments | list
+            Selected segments, in any order
+
+    Returns
+    -------
+        (since, until, segments) tuple, where segments is a sorted tuple
+        without duplicates
+    """
+    return (
+        int(since or 0),
+        int(until or 0),
+        tuple(sorted(set(segments or []))),
+    )
+
+def file_version(path):
+    """Returns a string that changes whenever the database file changes
+
+    The '-wal' file is taken into account, so commits that were not yet
+    checkpointed also invalidate the cache.
+    """
+    version = []
+    for f in (path, path + '-wal'):
+        try:
+            st = os.stat(f)
+            version.append(f'{st.st_mtime_ns}:{st.st_size}')
+        except OSError:
+            version.append('-')
+    return '/'.join(version)
+
+###############################################################################
+# Cache
+###############################################################################
+class ResultCache:
+    """Size bounded LRU cache with TTL, stored in a SQLite file
+
+    As the storage is a file, the entries are shared by every worker process
+    that opens the same path. Entries are tagged with the version of the
+    `source` (database file or data version function) and are discarded as
+    soon as it changes.
+
+    Hit/miss counters are kept in memory, so lookups do not write to the
+    file, and added to the file's totals along with the next stored entry or
+    stats() call of the process.
+
+    Parameters
+    ----------
+        path | String
+            Cache file location
+
+        source | String or callable
+            Database file whose changes invalidate the cache, or function
+            returning the current version of the cached data. None when
+            entries only expire with their ttl.
+
+        maxsize | Integer
+            Maximum number of entries, least recently used entries are
+            evicted first
+
+        ttl | Integer
+            Entries time to live, in seconds
+
+        enabled | Boolean
+            When False, lookups always miss and nothing is stored
+    """
+
+    def __init__(self, path, source, maxsize=256, ttl=600, enabled=True):
+        self.path = path
+        self.source = source
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self._local = threading.local()
+        self._ready = False
+        self._counts_lock = threading.Lock()
+        self._counts_pid = os.getpid()
+        self._counts = dict.fromkeys(COUNTERS, 0)
+
+    def _connect(self):
+        # Connections are per thread and must not cross a fork()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        if not self._ready:
+            conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT,
+                key TEXT,
+                version TEXT,
+                created REAL,
+                accessed REAL,
+                value BLOB,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed);
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER
+            );
+            INSERT OR IGNORE INTO counters VALUES ('hits', 0);
+            INSERT OR IGNORE INTO counters VALUES ('misses', 0);
+            INSERT OR IGNORE INTO counters VALUES ('evictions', 0);
+            """)
+            self._ready = True
+        return conn
+
+    def version(self):
+        """Current version of the source
+        """
+        if callable(self.source):
+            return self.source()
+        return file_version(self.source) if self.source else '-'
+
+    def _count(self, name, n=1):
+        with self._counts_lock:
+            # Counts inherited through fork() are the parent's
+            if self._counts_pid != os.getpid():
+                self._counts = dict.fromkeys(COUNTERS, 0)
+                self._counts_pid = os.getpid()
+            self._counts[name] += n
+
+    def _take_counts(self):
+        """This process' counts since the last call, reset to zero
+        """
+        with self._counts_lock:
+            counts = self._counts
+            if self._counts_pid != os.getpid():
+                counts = dict.fromkeys(COUNTERS, 0)
+            self._counts = dict.fromkeys(COUNTERS, 0)
+            self._counts_pid = os.getpid()
+        return counts
+
+    def _add_counts(self, conn, counts):
+        """Add 'counts' (see _take_counts()) to the file's totals
+        """
+        conn.executemany(
+            'UPDATE counters SET value = value + ? WHERE name = ?',
+            [(n, name) for name, n in counts.items() if n]
+        )
+
+    def _restore_counts(self, counts):
+        """Keep 'counts' that could not be added for the next attempt
+        """
+        for name, n in counts.items():
+            self._count(name, n)
+
+    def get(self, namespace, key):
+        """Lookup an entry
+
+        Returns
+        -------
+            (hit, value) tuple
+        """
+        if not self.enabled:
+            return False, None
+
+        key = repr(key)
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT version, created, value FROM entries '
+                'WHERE namespace = ? AND key = ?',
+                (namespace, key)
+            ).fetchone()
+
+            if row and row[0] == self.version() \
+                    and now - row[1] <= self.ttl:
+                try:
+                    value = pickle.loads(row[2])
+                except UNPICKLE_ERRORS as e:
+                    # Unreadable entry, computed again
+                    print(f'WARNING: cache entry dropped ({e!r})')
+                    conn.execute(
+                        'DELETE FROM entries WHERE namespace = ? AND key = ?',
+                        (namespace, key)
+                    )
+                else:
+                    conn.execute(
+                        'UPDATE entries SET accessed = ? '
+                        'WHERE namespace = ? AND key = ?',
+                        (now, namespace, key)
+                    )
+                    self._count('hits')
+                    return True, value
+
+        except sqlite3.Error as e:
+            print(f'WARNING: cache lookup failed ({e})')
+
+        self._count('misses')
+        return False, None
+
+    def set(self, namespace, key, value):
+        """Store an entry, evicting stale and least recently used ones
+        """
+        if not self.enabled:
+            return
+
+        now = time.time()
+        version = self.version()
+        try:
+            conn = self._connect()
+            counts, evicted = None, 0
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(
+                    'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                    (namespace, repr(key), version, now, now,
+                     pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+                )
+
+                # Stale entries: source changed or ttl expired
+                conn.execute(
+                    'DELETE FROM entries WHERE version <> ? OR created < ?',
+                    (version, now - self.ttl)
+                )
+
+                # LRU eviction
+                size = conn.execute(
+                    'SELECT count(*) FROM entries'
+                ).fetchone()[0]
+                if size > self.maxsize:
+                    evicted = size - self.maxsize
+                    conn.execute(
+                        'DELETE FROM entries WHERE rowid IN ('
+                        'SELECT rowid FROM entries ORDER BY accessed ASC '
+                        'LIMIT ?)',
+                        (evicted,)
+                    )
+
+                counts = self._take_counts()
+                counts['evictions'] += evicted
+                self._add_counts(conn, counts)
+                conn.execute('COMMIT')
+            except:
+                if counts:
+                    counts['evictions'] -= evicted
+                    self._restore_counts(counts)
+                conn.execute('ROLLBACK')
+                raise
+
+        except sqlite3.Error as e:
+            print(f'WARNING: cache store failed ({e})')
+
+    def clear(self):
+        """Remove every entry and reset counters
+        """
+        try:
+            conn = self._connect()
+            conn.execute('DELETE FROM entries')
+            conn.execute('UPDATE counters SET value = 0')
+            self._take_counts()
+        except sqlite3.Error as e:
+            print(f'WARNING: cache clear failed ({e})')
+
+    def stats(self):
+        """Returns cache statistics
+
+        Returns
+        -------
+            dict with 'hits', 'misses', 'evictions', 'hit_ratio', 'size',
+            'maxsize' and 'ttl' keys. Counters are the totals of all
+            processes, as of their last store or stats() call. When the file
+            can not be read, they are this process' own, and 'size' is None.
+        """
+        try:
+            conn = self._connect()
+            counts = self._take_counts()
+            try:
+                self._add_counts(conn, counts)
+            except sqlite3.Error:
+                self._restore_counts(counts)
+                raise
+            stats = dict(conn.execute('SELECT name, value FROM counters'))
+            stats['size'] = conn.execute(
+                'SELECT count(*) FROM entries'
+            ).fetchone()[0]
+        except sqlite3.Error as e:
+            print(f'WARNING: cache stats failed ({e})')
+            with self._counts_lock:
+                stats = dict(self._counts)
+            stats['size'] = None
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        stats['maxsize'] = self.maxsize
+        stats['ttl'] = self.ttl
+        return stats
+
+    def memoize(self, namespace):
+        """Decorator caching f(since, until, segments) by its canonical key
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(since, until, segments):
+                key = canonical_key(since, until, segments)
+                hit, value = self.get(namespace, key)
+                if hit:
+                    return value
+                value = func(since, until, segments)
+                self.set(namespace, key, value)
+                return value
+            wrapper.uncached = func
+            return wrapper
+        return decorator
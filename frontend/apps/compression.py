@@ -0,0 +1,168 @@
+"""compression.py
+
+Brotli or gzip compression of the Dash callback, layout and vendored asset
+responses, as WSGI middleware around the Flask server.
+
+Figure updates and layouts are JSON, which shrinks several times over.
+Responses under MIN_SIZE bytes, other than JSON or text (ex.: fonts), file
+downloads and requests without a matching Accept-Encoding header are left
+as they are. Brotli is used when installed and accepted by the client, gzip
+otherwise.
+
+Running as middleware, compression applies after every Flask after_request
+hook, so those (ex.: metrics) see the uncompressed response.
+
+Immutable responses (fingerprinted /vendor/ files) are compressed once per
+encoding, later requests for the same file get the stored bytes.
+
+The module does not depend on the Dash app, app.py applies the middleware
+with register().
+"""
+import gzip
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+###############################################################################
+# Settings
+# Compressed responses, by path prefix
+PATHS = (
+    '/_dash-update-component',
+    '/_dash-layout',
+    '/_dash-dependencies',
+    '/vendor/',
+)
+
+# Compressed content types, fonts and images are compressed already
+MIMETYPES = (
+    'application/json',
+    'text/',
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+    print('WARNING: brotli not installed, responses are gzip compressed')
+
+ENCODINGS = ['br', 'gzip'] if brotli else ['gzip']
+
+###############################################################################
+# Compression
+###############################################################################
+def compress(data, encoding, level):
+    """'data' bytes compressed with 'br' or 'gzip', 'level' being brotli's
+    quality or gzip's compresslevel
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level)
+
+def negotiate(accept_encoding):
+    """Preferred ENCODINGS item accepted by the client, or None
+    """
+    return parse_accept_header(accept_encoding).best_match(ENCODINGS)
+
+def encoded(headers, encoding, body):
+    """Update a response's 'headers' for its 'body' compressed with
+    'encoding'
+    """
+    headers['Content-Encoding'] = encoding
+    headers['Content-Length'] = str(len(body))
+    headers['Vary'] = ', '.join(
+        v for v in (headers.get('Vary'), 'Accept-Encoding') if v
+    )
+    # The encoded body differs byte-wise, keeps matching weakly
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        headers['ETag'] = f'W/{etag}'
+
+class CompressionMiddleware:
+    """WSGI middleware compressing the PATHS responses
+
+    Parameters
+    ----------
+        wsgi_app | Callable
+            Wrapped WSGI application
+
+        min_size | Integer
+            Smallest response body compressed, in bytes
+
+        gzip_level, brotli_quality | Integer
+            Compression levels
+    """
+
+    def __init__(self, wsgi_app, min_size, gzip_level, brotli_quality):
+        self.wsgi_app = wsgi_app
+        self.min_size = min_size
+        self.levels = {'gzip': gzip_level, 'br': brotli_quality}
+
+        # Compressed immutable responses (fingerprinted /vendor/ files), by
+        # (path, encoding): (uncompressed ETag, compressed body)
+        self.immutable = {}
+
+    def __call__(self, environ, start_response):
+        encoding = negotiate(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if not encoding or environ['REQUEST_METHOD'] == 'HEAD' or \
+                not environ.get('PATH_INFO', '').startswith(PATHS):
+            return self.wsgi_app(environ, start_response)
+
+        chunks = []
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = Headers(headers)
+            return chunks.append
+
+        result = self.wsgi_app(environ, capture)
+
+        # Same file as compressed before: its body is not even read
+        key = (environ['PATH_INFO'], encoding)
+        cached = self.immutable.get(key)
+        if cached and captured.get('status', '').startswith('200') and \
+                captured['headers'].get('ETag') == cached[0]:
+            if hasattr(result, 'close'):
+                result.close()
+            headers = captured['headers']
+            encoded(headers, encoding, cached[1])
+            start_response(captured['status'], headers.to_wsgi_list())
+            return [cached[1]]
+
+        # Buffer the response
+        try:
+            chunks.extend(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+        body = b''.join(chunks)
+        status, headers = captured['status'], captured['headers']
+
+        if status.startswith('200') and len(body) >= self.min_size and \
+                headers.get('Content-Type', '').startswith(MIMETYPES) and \
+                'Content-Encoding' not in headers:
+            etag = headers.get('ETag')
+            body = compress(body, encoding, self.levels[encoding])
+            if etag and 'immutable' in headers.get('Cache-Control', ''):
+                self.immutable[key] = (etag, body)
+            encoded(headers, encoding, body)
+
+        start_response(status, headers.to_wsgi_list())
+        return [body]
+
+def register(server, settings):
+    """Compress the Flask 'server' responses, unless disabled
+
+    Parameters
+    ----------
+        settings | configparser.SectionProxy
+            config.ini's [COMPRESSION] section
+    """
+    if not settings.getboolean('ENABLED'):
+        return
+    server.wsgi_app = CompressionMiddleware(
+        server.wsgi_app,
+        min_size=settings.getint('MIN_SIZE'),
+        gzip_level=settings.getint('GZIP_LEVEL'),
+        brotli_quality=settings.getint('BROTLI_QUALITY'),
+    )
@@ -0,0 +1,302 @@
+"""dates.py
+
+Calendar dimension: one row per day from FIRST_YEAR to LAST_YEAR, keyed by
+its YYYYMMDD integer ('day key'), with its ISO week, month, quarter, year
+and fiscal year attributes.
+
+It is built once per process, and date conversions and the date picker's
+period bounds (day, week, month, quarter, year) become array lookups. It
+is also stored in sales.db as 'dim_calendar', along with a "Day Key"
+column on the 'orders' tables (kept filled by triggers), so that queries
+filter on integer day keys and group on the precomputed bucket columns.
+Build or refresh both with:
+
+    python -m apps.dates [path/to/sales.db]
+"""
+import argparse
+import datetime as dt
+import functools
+import sqlite3
+import numpy as np
+import pandas as pd
+from apps import partitions
+
+###############################################################################
+# Settings
+FIRST_YEAR = 2000
+LAST_YEAR = 2040
+
+# First month of the fiscal year. Fiscal years are named after the calendar
+# year they end in.
+FISCAL_YEAR_START = 1
+
+# Periods of the date picker. Its weeks start on Sunday, as the clientside
+# version does (assets/datepicker.js); the chart buckets' ISO weeks start on
+# Monday.
+PERIODS = ['day', 'week', 'month', 'quarter', 'year']
+
+COLUMN = '"Day Key"'
+
+###############################################################################
+# Builder
+###############################################################################
+def day_key(date):
+    """YYYYMMDD integer of a datetime.date
+    """
+    return date.year * 10000 + date.month * 100 + date.day
+
+@functools.lru_cache(maxsize=1)
+def calendar_dimension():
+    """Calendar table, built once per process
+
+    Returns
+    -------
+        pd.DataFrame with 'day_key', 'date' ('YYYY-MM-DD'), 'weekday' (ISO,
+        Monday is 1), 'iso_year', 'iso_week', 'week_start' (ISO week's
+        Monday), 'month', 'month_start', 'quarter', 'quarter_start', 'year',
+        'year_start', 'fiscal_year', 'fiscal_quarter' and 'fiscal_month'
+        columns
+    """
+    days = pd.date_range(f'{FIRST_YEAR}-01-01', f'{LAST_YEAR}-12-31')
+    iso = days.isocalendar()
+
+    def iso_dates(index):
+        return index.strftime('%Y-%m-%d')
+
+    fiscal_month = (days.month - FISCAL_YEAR_START) % 12 + 1
+    return pd.DataFrame({
+        'day_key': days.year * 10000 + days.month * 100 + days.day,
+        'date': iso_dates(days),
+        'weekday': iso['day'].to_numpy(),
+        'iso_year': iso['year'].to_numpy(),
+        'iso_week': iso['week'].to_numpy(),
+        'week_start': iso_dates(days - pd.to_timedelta(days.weekday, 'D')),
+        'month': days.month,
+        'month_start': iso_dates(days.to_period('M').start_time),
+        'quarter': days.quarter,
+        'quarter_start': iso_dates(days.to_period('Q').start_time),
+        'year': days.year,
+        'year_start': iso_dates(days.to_period('Y').start_time),
+        'fiscal_year': days.year + (
+            (days.month >= FISCAL_YEAR_START) & (FISCAL_YEAR_START > 1)
+        ),
+        'fiscal_quarter': (fiscal_month - 1) // 3 + 1,
+        'fiscal_month': fiscal_month,
+    })
+
+class Calendar:
+    """In-memory calendar lookups, by day key
+
+    Parameters
+    ----------
+        dim | pd.DataFrame
+            calendar_dimension() rows, one per consecutive day
+    """
+
+    def __init__(self, dim):
+        self.keys = dim['day_key'].to_numpy()
+        self.dates = [
+            dt.date(k // 10000, k // 100 % 100, k % 100) for k in self.keys
+        ]
+        self.position = {int(k): i for i, k in enumerate(self.keys)}
+
+        # First and last day positions of every day's periods
+        n = len(self.keys)
+        days = np.arange(n)
+        weekday = dim['weekday'].to_numpy() % 7     # Sunday is 0
+        self.bounds = {'day': (days, days)}
+        self.bounds['week'] = (days - weekday, days - weekday + 6)
+        for period in ['month', 'quarter', 'year']:
+            group = dim[f'{period}_start'].to_numpy()
+            first = np.unique(group, return_index=True)
+            start = first[1][np.searchsorted(first[0], group)]
+            ends = np.append(first[1][1:], n) - 1
+            end = ends[np.searchsorted(first[0], group)]
+            self.bounds[period] = (start, end)
+
+    def period(self, period, key, offset=0):
+        """(first, last) day keys of the period holding the 'key' day
+
+        Parameters
+        ----------
+            period | String
+                One of PERIODS
+
+            key | Integer
+                Day key
+
+            offset | Integer
+                -1 for the previous period, 1 for the next one
+
+        Returns
+        -------
+            tuple of day keys, None outside the calendar
+        """
+        i = self.position.get(key)
+        if i is None or period not in self.bounds:
+            return None
+        starts, ends = self.bounds[period]
+        if offset < 0:
+            i = starts[i] - 1
+        elif offset > 0:
+            i = ends[i] + 1
+        if not 0 <= i < len(self.keys) or starts[i] < 0 or \
+                ends[i] >= len(self.keys):
+            return None
+        return int(self.keys[starts[i]]), int(self.keys[ends[i]])
+
+@functools.lru_cache(maxsize=1)
+def calendar():
+    """Calendar of calendar_dimension(), built once per process
+    """
+    return Calendar(calendar_dimension())
+
+###############################################################################
+# Lookup functions
+###############################################################################
+def to_key(value):
+    """Day key of a datetime.date, an ISO date ('YYYY-MM-DD', time part
+    ignored) or a YYYYMMDD integer or string
+
+    Raises
+    ------
+        ValueError for anything else
+    """
+    if isinstance(value, dt.date):
+        return day_key(value)
+    value = str(value)
+    if len(value) >= 10 and value[4] == '-' and value[7] == '-':
+        value = value[:4] + value[5:7] + value[8:10]
+    if len(value) != 8 or not value.isdigit():
+        raise ValueError(f'invalid date "{value}"')
+    return int(value)
+
+def to_date(value):
+    """datetime.date of a day key, see to_key() for the accepted values
+
+    Raises
+    ------
+        ValueError for invalid dates
+    """
+    key = to_key(value)
+    i = calendar().position.get(key)
+    if i is not None:
+        return calendar().dates[i]
+    return dt.date(key // 10000, key // 100 % 100, key % 100)
+
+def period_bounds(period, key, offset=0):
+    """(first, last) day keys of a period, see Calendar.period()
+    """
+    return calendar().period(period, key, offset)
+
+def current_period(since, until, today=None):
+    """Period of 'today' spanning exactly [since, until]
+
+    Parameters
+    ----------
+        since, until | Integer
+            Day keys
+
+    Returns
+    -------
+        'day', 'week', 'month' or 'year', None when it is none of them
+    """
+    key = day_key(today or dt.date.today())
+    for period in ['day', 'week', 'month', 'year']:
+        if period_bounds(period, key) == (since, until):
+            return period
+    return None
+
+###############################################################################
+# Storage
+###############################################################################
+def has_day_key(conn, table):
+    """Returns True when 'table' has the "Day Key" column
+    """
+    return any(
+        row[1] == COLUMN.strip('"')
+        for row in conn.execute(f'PRAGMA table_info({table})')
+    )
+
+def day_keys_available(conn):
+    """Returns True when sales.db holds 'dim_calendar' and every orders
+    table has its "Day Key" column
+    """
+    if conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+        "AND name = 'dim_calendar'"
+    ).fetchone() is None:
+        return False
+    return all(has_day_key(conn, t) for t in partitions.tables(conn))
+
+def add_day_key(conn, table):
+    """Add and fill the "Day Key" column of an orders table, with triggers
+    filling it on insert and on "Order Date" updates
+    """
+    if not has_day_key(conn, table):
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {COLUMN} INTEGER')
+
+    key = """CAST(replace(substr({}."Order Date", 1, 10), '-', '')
+                  AS INTEGER)"""
+    conn.execute(
+        f'UPDATE {table} SET {COLUMN} = {key.format(table)} '
+        f'WHERE {COLUMN} IS NULL'
+    )
+    for event in ['INSERT', 'UPDATE OF "Order Date"']:
+        name = f'{table}_day_key_{event.split()[0].lower()}'
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        conn.execute(f"""
+        CREATE TRIGGER {name} AFTER {event} ON {table}
+        BEGIN
+            UPDATE {table} SET {COLUMN} = {key.format('NEW')}
+            WHERE rowid = NEW.rowid;
+        END""")
+
+def build_dim_calendar(db_path):
+    """(Re)build the 'dim_calendar' table and the orders' "Day Key"
+    """
+    print('INFO: building dim_calendar')
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute('DROP TABLE IF EXISTS dim_calendar')
+        conn.execute("""
+        CREATE TABLE dim_calendar (
+            day_key INTEGER PRIMARY KEY,
+            date TEXT,
+            weekday INTEGER,
+            iso_year INTEGER,
+            iso_week INTEGER,
+            week_start TEXT,
+            month INTEGER,
+            month_start TEXT,
+            quarter INTEGER,
+            quarter_start TEXT,
+            year INTEGER,
+            year_start TEXT,
+            fiscal_year INTEGER,
+            fiscal_quarter INTEGER,
+            fiscal_month INTEGER
+        )""")
+        conn.executemany(
+            f'INSERT INTO dim_calendar VALUES ({", ".join("?" * 15)})',
+            calendar_dimension().astype(object).itertuples(index=False),
+        )
+
+        for table in partitions.tables(conn):
+            print(f'INFO: adding {COLUMN} to {table}')
+            add_day_key(conn, table)
+    conn.close()
+
+###############################################################################
+## Main
+if __name__ == '__main__':
+
+    from app import config
+
+    parser = argparse.ArgumentParser(
+        description='Build sales.db dim_calendar'
+    )
+    parser.add_argument('db', nargs='?', default=config['DATA']['DB'])
+    args = parser.parse_args()
+
+    build_dim_calendar(args.db)
@@ -0,0 +1,218 @@
+"""db.py
+
+Read-only SQLite data access shared by the dashboards.
+"""
+import contextlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+###############################################################################
+# Settings
+PRAGMAS = {
+    'query_only': 1,
+    'mmap_size': 256 * 1024 * 1024,     # bytes
+    'cache_size': -64 * 1024,           # negative values are KiB
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,               # ms, wait for writers' locks
+}
+
+###############################################################################
+# Connections
+###############################################################################
+def connect(path, pragmas=None, cached_statements=256):
+    """Open a read-only, autocommit connection to 'path', outside of the
+    pools
+
+    Used for long lived reads, ex. exports streamed to slow clients, which
+    would otherwise keep a pooled connection from the dashboards.
+    """
+    uri = 'file:{}?mode=ro'.format(os.path.abspath(path))
+    conn = sqlite3.connect(
+        uri,
+        uri=True,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=cached_statements,
+    )
+    for name, value in (PRAGMAS if pragmas is None else pragmas).items():
+        conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+###############################################################################
+# Connection pool
+###############################################################################
+class ConnectionPool:
+    """Thread-safe pool of read-only SQLite connections
+
+    Connections are opened lazily in read-only URI mode and in autocommit
+    mode, so readers never hold a transaction (and the WAL snapshot) open
+    between statements. Each connection keeps its own prepared statements
+    cache, so queries must use parameters instead of literal values.
+
+    Parameters
+    ----------
+        path | String
+            Database file location
+
+        size | Integer
+            Maximum number of open connections
+
+        timeout | Float
+            Seconds to wait for a free connection before raising
+            sqlite3.OperationalError
+
+        pragmas | dict
+            PRAGMA settings applied to new connections, defaults to PRAGMAS
+
+        cached_statements | Integer
+            Prepared statements cache size of each connection
+    """
+
+    def __init__(self, path, size=4, timeout=10, pragmas=None,
+                 cached_statements=256):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = PRAGMAS if pragmas is None else pragmas
+        self.cached_statements = cached_statements
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'in_use': 0,
+            'errors': 0,
+        }
+
+    def _open(self):
+        return connect(self.path, self.pragmas, self.cached_statements)
+
+    def _checkout(self):
+        with self._lock:
+            # Connections must not be shared with a forked worker
+            if self._pid != os.getpid():
+                self._reset()
+
+            try:
+                return self._idle.get_nowait(), 0.0
+            except queue.Empty:
+                pass
+
+            if self._opened < self.size:
+                self._opened += 1
+                opening = True
+            else:
+                opening = False
+
+        if opening:
+            try:
+                return self._open(), 0.0
+            except:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        # Pool exhausted, wait for a connection to be returned
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f'no database connection available after {self.timeout}s'
+            )
+        return conn, time.perf_counter() - start
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Checkout a connection for the duration of a 'with' block
+        """
+        conn, waited = self._checkout()
+        pid = self._pid
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_time'] += waited
+                self._stats['max_wait_time'] = max(
+                    self._stats['max_wait_time'], waited
+                )
+        try:
+            yield conn
+        except sqlite3.Error:
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                self._stats['in_use'] -= 1
+                if pid == self._pid:
+                    self._idle.put(conn)
+
+    def stats(self):
+        """Returns pool statistics
+
+        Returns
+        -------
+            dict with 'size', 'opened', 'idle', 'in_use', 'checkouts',
+            'waits', 'wait_time', 'max_wait_time' and 'errors' keys.
+            Times in seconds, counters since process start.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['opened'] = self._opened
+            stats['idle'] = self._idle.qsize()
+        return stats
+
+    def close(self):
+        """Close idle connections
+        """
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                    self._opened -= 1
+                except queue.Empty:
+                    break
+
+###############################################################################
+# Module interface
+###############################################################################
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(path, **kwargs):
+    """Returns the process wide pool for 'path', creating it on first use
+    """
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = ConnectionPool(path, **kwargs)
+        return _pools[path]
+
+def connection(path):
+    """Checkout a pooled connection to 'path'
+
+    Example
+    -------
+        with db.connection(DB_PATH) as conn:
+            df = pd.read_sql(query, conn, params=params)
+    """
+    return get_pool(path).connection()
+
+def stats():
+    """Returns statistics of every pool, by database path
+    """
+    with _pools_lock:
+        pools = dict(_pools)
+    return {path: pool.stats() for path, pool in pools.items()}
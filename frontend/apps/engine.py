@@ -0,0 +1,169 @@
+"""engine.py
+
+In-process columnar engine for the sales dashboard.
+
+The 'orders' table is loaded once into NumPy arrays and pre-aggregated by
+day x segment x (market, country), with running totals along the day axis,
+so each lookup costs a binary search on the day axis plus one subtraction per
+bucket, regardless of how many days or orders the range holds.
+"""
+import threading
+import numpy as np
+import pandas as pd
+from apps import buckets, db
+from apps.cache import file_version
+
+# Aggregated measures, in cube's last axis order
+MEASURES = ['sales', 'quantity', 'orders']
+
+###############################################################################
+# Engine
+###############################################################################
+class SalesEngine:
+    """Date sorted, pre-aggregated copy of the 'orders' table
+
+    Parameters
+    ----------
+        db_path | String
+            sales.db location. The data is reloaded on the next lookup
+            whenever the file changes.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.version = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load 'orders' and build the day x segment x place cube
+
+        Rows are summed by day in SQLite first, so memory use follows the
+        cube size rather than the number of orders. The cube holds running
+        totals: row i sums the days before days[i], the extra last row sums
+        them all.
+        """
+        version = file_version(self.db_path)
+        print('INFO: loading sales engine')
+
+        query = """
+        SELECT
+            substr("Order Date", 1, 10) AS date
+            ,Segment
+            ,Market
+            ,Country
+            ,sum(Sales) AS Sales
+            ,sum(Quantity) AS Quantity
+            ,count("Order ID") AS orders
+        FROM orders
+        GROUP BY 1, 2, 3, 4
+        """
+        with db.connection(self.db_path) as conn:
+            df = pd.read_sql(query, conn)
+
+        # Integer day keys and sorted unique days
+        day = pd.to_datetime(df['date'], format='%Y-%m-%d').to_numpy(
+            dtype='datetime64[D]'
+        ).astype(np.int64)
+        days, day_idx = np.unique(day, return_inverse=True)
+
+        # Categorical codes, places are (market, country) pairs
+        segments, segment_idx = np.unique(
+            df['Segment'].to_numpy(dtype=str), return_inverse=True
+        )
+        place_idx, places = pd.MultiIndex.from_frame(
+            df[['Market', 'Country']].astype(str)
+        ).factorize()
+        measures = np.column_stack([
+            df['Sales'].to_numpy(dtype=float),
+            df['Quantity'].to_numpy(dtype=float),
+            df['orders'].to_numpy(dtype=float),
+        ])
+
+        shape = (len(days), len(segments), len(places))
+        flat = np.ravel_multi_index((day_idx, segment_idx, place_idx), shape)
+        cube = np.stack([
+            np.bincount(flat, weights=measures[:, i],
+                        minlength=np.prod(shape))
+            for i in range(len(MEASURES))
+        ], axis=-1).reshape(shape + (len(MEASURES),))
+        # Counts stay exact, they are integers far below 2**53
+        cube = np.concatenate([np.zeros_like(cube[:1]), cube.cumsum(axis=0)])
+
+        self.days = days
+        self.segments = segments
+        self.markets = places.get_level_values(0).to_numpy()
+        self.countries = places.get_level_values(1).to_numpy()
+        self.cube = cube
+        self.version = version
+
+    def data_version(self):
+        """Version of the engine's data, see cache.file_version()
+        """
+        return file_version(self.db_path)
+
+    def ensure_loaded(self):
+        """Load data on first use or after sales.db changed
+        """
+        if self.version != file_version(self.db_path):
+            with self._lock:
+                if self.version != file_version(self.db_path):
+                    self.load()
+
+    def lookup_buckets(self, since, until, segments, granularity):
+        """Aggregates by 'granularity' buckets for the [since, until] range
+
+        Same interface and output as rollup.lookup_buckets(), without the
+        'conn' parameter.
+        """
+        self.ensure_loaded()
+
+        # Date filter: binary search on the sorted day keys
+        lo, hi = np.searchsorted(
+            self.days,
+            [
+                np.datetime64(since, 'D').astype(np.int64),
+                np.datetime64(until, 'D').astype(np.int64) + 1,
+            ],
+        )
+
+        # Segment filter: mask on segment codes
+        selected = np.isin(self.segments, list(segments))
+
+        if lo == hi or not selected.any():
+            return pd.DataFrame(
+                columns=['bucket', 'segment', 'market', 'country'] + MEASURES
+            )
+
+        # Group days by bucket, keys are sorted as days are. A bucket's
+        # aggregates are the difference of the running totals at its edges.
+        keys = buckets.day_keys(
+            granularity, self.days[lo:hi].astype('datetime64[D]')
+        )
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        edges = self.cube[lo + np.r_[starts, hi - lo]][:, selected]
+        grouped = np.diff(edges, axis=0)
+
+        # Non empty cells to rows
+        b, s, d = np.nonzero(grouped[..., MEASURES.index('orders')])
+        df = pd.DataFrame({
+            'bucket': np.datetime_as_string(keys[starts][b], unit='D'),
+            'segment': self.segments[selected][s],
+            'market': self.markets[d],
+            'country': self.countries[d],
+        })
+        for i, measure in enumerate(MEASURES):
+            df[measure] = grouped[b, s, d, i]
+        for measure in ['quantity', 'orders']:
+            df[measure] = df[measure].astype(np.int64)
+
+        return df
+
+    def lookup_monthly(self, since, until, segments):
+        """Monthly aggregates for the [since, until] range
+
+        Same interface and output as rollup.lookup_monthly(), without the
+        'conn' parameter.
+        """
+        df = self.lookup_buckets(since, until, segments, 'month')
+        df['bucket'] = df['bucket'].str[:7]
+        return df.rename(columns={'bucket':'month'})
@@ -0,0 +1,325 @@
+"""export.py
+
+Streaming exports of the sales data.
+
+Rows are fetched from the database in chunks and encoded as they arrive,
+so memory use does not depend on the size of the export. CSV (optionally
+gzip compressed) is streamed straight to the response, while Parquet and
+XLSX are first written to a temporary file, which is then streamed and
+removed.
+
+Exports read through their own connection rather than the dashboards' pool:
+a CSV export holds it until the client received the last byte. With a
+lookup engine other than sales.db (see sales.py), monthly exports are
+computed by the engine, and raw exports are not available.
+"""
+import contextlib
+import csv
+import io
+import os
+import tempfile
+import zlib
+import pandas as pd
+from apps import dates, db, partitions, rollup
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+###############################################################################
+# Settings
+FORMATS = {
+    # format: (file extension, mimetype)
+    'csv': ('csv', 'text/csv'),
+    'csv.gz': ('csv.gz', 'application/gzip'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'xlsx': (
+        'xlsx',
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    ),
+}
+
+SCOPES = {
+    'monthly': 'Monthly aggregates',
+    'raw': 'Orders',
+}
+
+XLSX_MAX_ROWS = 1048576 - 1     # rows per sheet, besides the header
+BLOCK_SIZE = 64 * 1024          # bytes read from temporary files at once
+
+###############################################################################
+# Helper functions
+###############################################################################
+def available_formats():
+    """Returns the formats supported by the installed packages
+    """
+    formats = ['csv', 'csv.gz']
+    if pa is not None:
+        formats.append('parquet')
+    if openpyxl is not None:
+        formats.append('xlsx')
+    return formats
+
+def filename(scope, fmt, since, until):
+    """Export's file name, ex.: 'sales_monthly_20110101_20141231.csv'
+    """
+    return f'sales_{scope}_{since}_{until}.{FORMATS[fmt][0]}'
+
+def export_query(conn, scope, since, until, segments):
+    """Build the export statement
+
+    Parameters
+    ----------
+        scope | String
+            'raw' for orders or 'monthly' for month x segment x market
+            aggregates
+
+        since, until | datetime.date
+            Range limits, inclusive
+
+        segments | list
+            Selected segments
+
+    Returns
+    -------
+        (query, params) tuple
+    """
+    if scope == 'monthly':
+        query, params = rollup.monthly_query(conn, since, until, segments)
+        query = f"""
+        SELECT
+            month
+            ,segment
+            ,market
+            ,sum(sales) AS sales
+            ,sum(quantity) AS quantity
+            ,sum(orders) AS orders
+        FROM ({query})
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+        """
+        return query, params
+
+    day_keys = dates.day_keys_available(conn)
+    condition, params = rollup.range_filter(since, until, day_keys)
+    query = f"""
+    SELECT
+        "Order ID"
+        ,"Order Date"
+        ,Segment
+        ,Market
+        ,Country
+        ,Sales
+        ,Quantity
+    FROM {partitions.source(conn, since, until)}
+    WHERE {condition}
+        AND Segment IN ({', '.join('?' * len(segments))})
+    ORDER BY {'"Day Key"' if day_keys else '"Order Date"'} ASC
+    """
+    return query, params + list(segments)
+
+def fetch_chunks(cursor, chunksize):
+    """Yield lists of at most 'chunksize' rows from an executed cursor
+    """
+    while True:
+        rows = cursor.fetchmany(chunksize)
+        if not rows:
+            break
+        yield rows
+
+###############################################################################
+# Encoders
+###############################################################################
+def encode_csv(columns, chunks):
+    """Yield CSV encoded bytes, one block per chunk of rows
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def encode_gzip(blocks):
+    """Gzip compress a stream of byte blocks
+    """
+    compressor = zlib.compressobj(wbits=31)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def write_parquet(path, columns, chunks):
+    """Write chunks of rows as Parquet row groups
+    """
+    writer = None
+    try:
+        for rows in chunks:
+            table = pa.Table.from_pandas(
+                pd.DataFrame.from_records(rows, columns=columns),
+                preserve_index=False,
+            )
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+        if writer is None:
+            table = pa.Table.from_pandas(
+                pd.DataFrame(columns=columns), preserve_index=False
+            )
+            pq.write_table(table, path)
+    finally:
+        if writer is not None:
+            writer.close()
+
+def write_xlsx(path, columns, chunks):
+    """Write chunks of rows to a streaming (write-only) workbook
+
+    Rows beyond a sheet's capacity continue on a new sheet.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = None
+    count = XLSX_MAX_ROWS
+    for rows in chunks:
+        for row in rows:
+            if count == XLSX_MAX_ROWS:
+                n_sheets = len(workbook.sheetnames)
+                sheet = workbook.create_sheet(f'sales{n_sheets + 1}')
+                sheet.append(columns)
+                count = 0
+            sheet.append(row)
+            count += 1
+    if sheet is None:
+        workbook.create_sheet('sales1').append(columns)
+    workbook.save(path)
+
+def read_file(path):
+    """Yield a file's contents in blocks and remove it afterwards
+    """
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+    finally:
+        os.remove(path)
+
+###############################################################################
+# Export
+###############################################################################
+def export(db_path, scope, fmt, since, until, segments, chunksize=10000,
+           engine=None):
+    """Stream an export of the sales data
+
+    Parameters
+    ----------
+        db_path | String
+            Database location
+
+        scope | String
+            One of SCOPES keys
+
+        fmt | String
+            One of available_formats()
+
+        since, until | datetime.date
+            Range limits, inclusive
+
+        segments | list
+            Selected segments
+
+        chunksize | Integer
+            Rows fetched from the database at once
+
+        engine |
+            Lookup engine computing 'monthly' exports instead of the
+            database (see engine.py, remote.py), None for sales.db
+
+    Returns
+    -------
+        Generator of bytes blocks
+    """
+    if scope not in SCOPES:
+        raise ValueError(f'invalid export scope "{scope}"')
+    if fmt not in available_formats():
+        raise ValueError(f'unsupported export format "{fmt}"')
+    if engine is not None and scope != 'monthly':
+        raise ValueError(f'"{scope}" exports need the sales.db engine')
+
+    if engine is not None:
+        columns, chunks = engine_rows(engine, since, until, segments,
+                                      chunksize)
+        return encode(fmt, columns, chunks)
+
+    if fmt in ('csv', 'csv.gz'):
+        return _stream_csv(db_path, scope, fmt, since, until, segments,
+                           chunksize)
+
+    with contextlib.closing(db.connect(db_path)) as conn:
+        query, params = export_query(conn, scope, since, until, segments)
+        cursor = conn.execute(query, params)
+        columns = [c[0] for c in cursor.description]
+        return encode(fmt, columns, fetch_chunks(cursor, chunksize))
+
+def encode(fmt, columns, chunks):
+    """Encode chunks of rows in 'fmt'
+
+    Binary formats are built on disk first, before returning.
+
+    Returns
+    -------
+        Generator of bytes blocks
+    """
+    if fmt in ('csv', 'csv.gz'):
+        blocks = encode_csv(columns, chunks)
+        return encode_gzip(blocks) if fmt == 'csv.gz' else blocks
+
+    fd, path = tempfile.mkstemp(suffix='.' + FORMATS[fmt][0])
+    os.close(fd)
+    try:
+        if fmt == 'parquet':
+            write_parquet(path, columns, chunks)
+        else:
+            write_xlsx(path, columns, chunks)
+    except:
+        os.remove(path)
+        raise
+
+    return read_file(path)
+
+def engine_rows(engine, since, until, segments, chunksize):
+    """'monthly' export rows, from a lookup engine
+
+    Returns
+    -------
+        (columns, chunks) tuple, same rows as the 'monthly' export_query()
+    """
+    df = engine.lookup_monthly(since, until, segments)
+    df = df.groupby(['month', 'segment', 'market'], as_index=False)[
+        ['sales', 'quantity', 'orders']
+    ].sum().sort_values(['month', 'segment', 'market'])
+    rows = list(df.itertuples(index=False, name=None))
+    chunks = (
+        rows[i:i + chunksize] for i in range(0, len(rows), chunksize)
+    )
+    return list(df.columns), chunks
+
+def _stream_csv(db_path, scope, fmt, since, until, segments, chunksize):
+    with contextlib.closing(db.connect(db_path)) as conn:
+        query, params = export_query(conn, scope, since, until, segments)
+        cursor = conn.execute(query, params)
+        columns = [c[0] for c in cursor.description]
+        yield from encode(fmt, columns, fetch_chunks(cursor, chunksize))
@@ -1,6 +1,7 @@
 """financial.py
 """
 import dash
+import functools
 import dash_bootstrap_components as dbc
 from dash import dcc, html
 from dash.dependencies import Input, Output, State
@@ -11,6 +12,12 @@ from app import app
 def layout(pathname, auth_data):
     """Define dashboard layout
     """
+    return skeleton()
+
+@functools.lru_cache(maxsize=1)
+def skeleton():
+    """Dashboard components, built once per process
+    """
 
     # Page Layout
     layout = [
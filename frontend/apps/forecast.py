@@ -0,0 +1,164 @@
+"""forecast.py
+
+Sales forecast of the /sales dashboard, from the trained model in
+data/model.pkl (a scikit-learn regressor of the yearly sales total, by
+'year').
+
+The model is unpickled once per process, and again only when its file
+changes. A forecast scores every year of the horizon in a single predict()
+call, then splits the yearly totals by month and segment with their shares
+of the historical sales.
+"""
+import pickle
+import threading
+import time
+import numpy as np
+import pandas as pd
+from apps.cache import UNPICKLE_ERRORS, file_version
+
+###############################################################################
+# Settings
+FEATURES = ['year']
+
+# Loaded model, by path: (file version, model)
+_models = {}
+_models_lock = threading.Lock()
+
+# Inference counters of this process
+timings = {'batches': 0, 'rows': 0, 'seconds': 0.0}
+
+###############################################################################
+# Model
+###############################################################################
+def load_model(path):
+    """Model stored at 'path', unpickled on first use and on file changes
+
+    Returns
+    -------
+        Fitted model, None when it can not be loaded (missing or corrupted
+        file, scikit-learn not installed)
+    """
+    version = file_version(path)
+    loaded = _models.get(path)
+    if loaded and loaded[0] == version:
+        return loaded[1]
+
+    with _models_lock:
+        loaded = _models.get(path)
+        if loaded and loaded[0] == version:
+            return loaded[1]
+
+        start = time.perf_counter()
+        try:
+            with open(path, 'rb') as f:
+                model = pickle.load(f)
+        except UNPICKLE_ERRORS + (OSError,) as e:
+            print(f'WARNING: forecast model not loaded ({e})')
+            model = None
+        else:
+            print(f'INFO: forecast model loaded in '
+                  f'{time.perf_counter() - start:.2f}s')
+        _models[path] = (version, model)
+        return model
+
+def predict_years(model, years):
+    """Yearly sales totals, scored in one batch
+
+    Parameters
+    ----------
+        years | list
+            Years to score
+
+    Returns
+    -------
+        np.ndarray, in 'years' order
+    """
+    start = time.perf_counter()
+    values = model.predict(pd.DataFrame({'year': years}, columns=FEATURES))
+    timings['batches'] += 1
+    timings['rows'] += len(years)
+    timings['seconds'] += time.perf_counter() - start
+    return np.asarray(values, dtype=float)
+
+###############################################################################
+# Forecast
+###############################################################################
+def shares(history):
+    """Month of year x segment shares of the yearly sales
+
+    Parameters
+    ----------
+        history | pd.DataFrame
+            Monthly sales, with 'bucket' ('YYYY-MM-DD', first day of the
+            month), 'segment' and 'sales' columns. Incomplete years are
+            ignored unless there is no complete one.
+
+    Returns
+    -------
+        pd.DataFrame indexed by month (1 to 12), one column per segment,
+        summing to 1
+    """
+    df = history.groupby(['bucket', 'segment'])['sales'].sum().reset_index()
+    date = pd.to_datetime(df['bucket'])
+    df['year'] = date.dt.year
+    df['month'] = date.dt.month
+
+    months = df.groupby('year')['month'].nunique()
+    complete = months[months == 12].index
+    if len(complete):
+        df = df[df['year'].isin(complete)]
+
+    table = df.pivot_table(
+        index='month', columns='segment', values='sales', aggfunc='sum'
+    ).reindex(range(1, 13)).fillna(0.0)
+    total = table.to_numpy().sum()
+    return table / total if total else table
+
+def future_months(history, horizon):
+    """First days of the 'horizon' months following the history's last one
+    """
+    last = pd.Period(history['bucket'].max(), 'M')
+    return pd.period_range(last + 1, periods=horizon, freq='M')
+
+def forecast(model, history, segments, horizon):
+    """Monthly sales forecast by segment
+
+    Parameters
+    ----------
+        model |
+            See load_model()
+
+        history | pd.DataFrame
+            Monthly sales by segment, see shares()
+
+        segments | list
+            Segments to forecast
+
+        horizon | Integer
+            Number of months, following the last month of 'history'
+
+    Returns
+    -------
+        pd.DataFrame with 'month' ('YYYY-MM-DD'), 'segment' and 'sales'
+        columns, by month then segment
+    """
+    if history.empty:
+        return pd.DataFrame({'month': [], 'segment': [], 'sales': []})
+
+    share = shares(history)
+    segments = [s for s in share.columns if s in set(segments)]
+    months = future_months(history, horizon)
+    if not segments or not len(months):
+        return pd.DataFrame({'month': [], 'segment': [], 'sales': []})
+
+    # One prediction per year, spread over months x segments
+    years, year_index = np.unique(months.year, return_inverse=True)
+    yearly = predict_years(model, years.tolist())
+    split = share.loc[months.month, segments].to_numpy()
+    sales = yearly[year_index][:, None] * split
+
+    return pd.DataFrame({
+        'month': np.repeat(months.strftime('%Y-%m-01'), len(segments)),
+        'segment': np.tile(segments, len(months)),
+        'sales': sales.ravel(),
+    })
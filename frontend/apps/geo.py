@@ -0,0 +1,229 @@
+"""geo.py
+
+Country dimension (ISO-3 code and continent) used by the sales globe.
+
+Stored in sales.db as 'dim_country', build or refresh it with:
+
+    python -m apps.geo [path/to/sales.db]
+"""
+import argparse
+import functools
+import sqlite3
+import pandas as pd
+from apps import rollup
+
+###############################################################################
+# Settings
+
+# Country names in 'orders' that differ from plotly's gapminder dataset
+ALIASES = {
+    'Democratic Republic of the Congo': 'Congo, Dem. Rep.',
+    'Republic of the Congo': 'Congo, Rep.',
+    'South Korea': 'Korea, Rep.',
+    'North Korea': 'Korea, Dem. Rep.',
+    'Slovakia': 'Slovak Republic',
+    'Yemen': 'Yemen, Rep.',
+    'Hong Kong': 'Hong Kong, China',
+    'Myanmar (Burma)': 'Myanmar',
+    'Eswatini': 'Swaziland',
+    "Côte d'Ivoire": "Cote d'Ivoire",
+    'Czechia': 'Czech Republic',
+}
+
+# Countries missing from the gapminder dataset: (ISO-3, continent)
+EXTRA = {
+    'Armenia': ('ARM', 'Asia'),
+    'Azerbaijan': ('AZE', 'Asia'),
+    'Barbados': ('BRB', 'Americas'),
+    'Belarus': ('BLR', 'Europe'),
+    'Bhutan': ('BTN', 'Asia'),
+    'Estonia': ('EST', 'Europe'),
+    'French Guiana': ('GUF', 'Americas'),
+    'Georgia': ('GEO', 'Asia'),
+    'Guadeloupe': ('GLP', 'Americas'),
+    'Kazakhstan': ('KAZ', 'Asia'),
+    'Kyrgyzstan': ('KGZ', 'Asia'),
+    'Latvia': ('LVA', 'Europe'),
+    'Lithuania': ('LTU', 'Europe'),
+    'Luxembourg': ('LUX', 'Europe'),
+    'Macedonia': ('MKD', 'Europe'),
+    'Malta': ('MLT', 'Europe'),
+    'Martinique': ('MTQ', 'Americas'),
+    'Moldova': ('MDA', 'Europe'),
+    'Papua New Guinea': ('PNG', 'Oceania'),
+    'Qatar': ('QAT', 'Asia'),
+    'Russia': ('RUS', 'Europe'),
+    'South Sudan': ('SSD', 'Africa'),
+    'Tajikistan': ('TJK', 'Asia'),
+    'Turkmenistan': ('TKM', 'Asia'),
+    'Ukraine': ('UKR', 'Europe'),
+    'United Arab Emirates': ('ARE', 'Asia'),
+    'Uzbekistan': ('UZB', 'Asia'),
+}
+
+COLUMNS = ['country', 'iso_alpha', 'continent']
+
+CONTINENTS = ['Africa', 'Americas', 'Asia', 'Europe', 'Oceania']
+
+###############################################################################
+# Builder
+###############################################################################
+@functools.lru_cache(maxsize=1)
+def country_dimension():
+    """Country, ISO-3 code and continent table, built once per process
+
+    Returns
+    -------
+        pd.DataFrame with 'country', 'iso_alpha' and 'continent' columns
+    """
+    import plotly.express as px
+
+    country = px.data.gapminder()[['country', 'iso_alpha', 'continent']]
+    country = country.drop_duplicates().reset_index(drop=True)
+
+    aliases = country.merge(
+        pd.DataFrame(list(ALIASES.items()), columns=['alias', 'country']),
+        on='country',
+    ).drop(columns='country').rename(columns={'alias':'country'})
+
+    extra = pd.DataFrame(
+        [(c, iso, continent) for c, (iso, continent) in EXTRA.items()],
+        columns=COLUMNS,
+    )
+
+    return pd.concat([country, aliases[COLUMNS], extra], ignore_index=True)
+
+def build_dim_country(db_path):
+    """(Re)build the 'dim_country' table
+    """
+    print('INFO: building dim_country')
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute('DROP TABLE IF EXISTS dim_country')
+        conn.execute("""
+        CREATE TABLE dim_country (
+            country TEXT PRIMARY KEY,
+            iso_alpha TEXT,
+            continent TEXT
+        )""")
+        conn.executemany(
+            'INSERT OR REPLACE INTO dim_country VALUES (?, ?, ?)',
+            country_dimension().itertuples(index=False),
+        )
+    conn.close()
+
+def dim_country_available(conn):
+    """Returns True when sales.db holds the 'dim_country' table
+    """
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+        "AND name = 'dim_country'"
+    ).fetchone() is not None
+
+###############################################################################
+# Lookup functions
+###############################################################################
+def cube_query(conn, since, until, segments, granularity='month'):
+    """Build the lookup_cube() statement, joining 'dim_country'
+
+    Returns
+    -------
+        (query, params) tuple, see rollup.bucket_query(). Only valid when
+        dim_country_available().
+    """
+    query, params = rollup.bucket_query(
+        conn, since, until, segments, granularity
+    )
+    query = f"""
+    SELECT
+        m.*
+        ,d.iso_alpha
+        ,d.continent
+    FROM ({query}) AS m
+    LEFT JOIN dim_country AS d ON d.country = m.country
+    ORDER BY m.bucket ASC
+    """
+    return query, params
+
+def lookup_cube(conn, since, until, segments, granularity='month'):
+    """Time bucket x segment x market x country aggregates with ISO-3 codes
+
+    The country dimension is joined inside the aggregation query when
+    sales.db holds 'dim_country'.
+
+    Returns
+    -------
+        pd.DataFrame with rollup.bucket_query() columns plus 'iso_alpha'
+        and 'continent'
+    """
+    if not dim_country_available(conn):
+        query, params = rollup.bucket_query(
+            conn, since, until, segments, granularity
+        )
+        return join_countries(pd.read_sql(query, conn, params=params))
+
+    query, params = cube_query(conn, since, until, segments, granularity)
+    return pd.read_sql(query, conn, params=params)
+
+def aggregate_countries(cube):
+    """Per country totals of lookup_cube() rows
+
+    Returns
+    -------
+        pd.DataFrame with 'Country', 'Quantity', 'Sales', 'Orders',
+        'iso_alpha' and 'continent' columns, by descending sales
+    """
+    top = cube.groupby('country', dropna=False).agg(
+        {
+            'quantity':'sum',
+            'sales':'sum',
+            'orders':'sum',
+            'iso_alpha':'first',
+            'continent':'first',
+        }
+    ).sort_values('sales', ascending=False).reset_index()
+
+    top.rename(index=str,
+              columns={
+                  'country':'Country',
+                  'quantity':'Quantity',
+                  'sales':'Sales',
+                  'orders':'Orders',
+              },
+              inplace=True)
+
+    return top
+
+def lookup_countries(conn, since, until, segments):
+    """Per country totals for the [since, until] range, with ISO-3 codes
+
+    Returns
+    -------
+        pd.DataFrame, see aggregate_countries()
+    """
+    return aggregate_countries(lookup_cube(conn, since, until, segments))
+
+def join_countries(df):
+    """Add 'iso_alpha' and 'continent' columns to lookup_cube() like rows
+
+    Used when the aggregation does not run in sales.db or sales.db has no
+    'dim_country' table.
+    """
+    return df.merge(country_dimension(), on='country', how='left')
+
+def unmapped(top):
+    """Returns the countries without an ISO-3 code
+    """
+    return top.loc[top['iso_alpha'].isna(), 'Country'].tolist()
+
+###############################################################################
+## Main
+if __name__ == '__main__':
+
+    from app import config
+
+    parser = argparse.ArgumentParser(description='Build sales.db dim_country')
+    parser.add_argument('db', nargs='?', default=config['DATA']['DB'])
+    args = parser.parse_args()
+
+    build_dim_country(args.db)
@@ -4,14 +4,18 @@ import dash_bootstrap_components as dbc
 from dash import html
 from dash.dependencies import Input, Output, State
 from app import _, app, config
-from apps import home, login, sales, financial
+from apps import api, metrics, pages
 
 ###############################################################################
 # Report Definition
 
-def layout(pathname, auth_data, alerts=None):
+def layout(alerts=None):
     """Define app layout
 
+    Static shell (header, navbar and alerts) around the 'dashboard'
+    container. It is built once, as part of app.layout: navigation only
+    updates the 'dashboard' contents, see display_dashboard().
+
     Parameters
     ----------
         alerts | list of dicts
@@ -122,26 +126,25 @@ def layout(pathname, auth_data, alerts=None):
     Input('url', 'pathname'),
     State('auth-data', 'data'),
 )
+@metrics.instrument
 def display_dashboard(pathname, auth_data):
 
-    if pathname =='/':
-        return home.layout
-    elif pathname =='/login':
-        return login.layout(pathname, auth_data)
-    elif pathname =='/sales':
-        return sales.layout(pathname, auth_data)
-    elif pathname =='/financial':
-        return financial.layout(pathname, auth_data)
-    else:
+    page = pages.get(pathname)
+    if page is None:
         return html.Div([html.P(_('404 Page not found!'))])
+    elif callable(page.layout):
+        return page.layout(pathname, auth_data)
+    else:
+        return page.layout
 
 @app.callback(
     Output('login-btn', 'children'),
     Input('auth-data','data'),
 )
+@metrics.instrument
 def update_login_btn(auth_data):
 
-    if not auth_data['username']:
+    if not api.authenticated(auth_data):
         return _('Login')
 
     else:
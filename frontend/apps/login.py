@@ -3,6 +3,8 @@
 import requests
 import dash_bootstrap_components as dbc
 from app import app, _, API_URL
+from apps import api, metrics
+from apps.api import build_request_headers
 from dash import html 
 from dash.dependencies import Input, Output, State
 
@@ -94,7 +96,7 @@ def layout(pathname, auth_data):
     print(pathname, end=' ')
     print(auth_data)
 
-    if not auth_data['username']:
+    if not api.authenticated(auth_data):
 
         # Page Layout
         layout = login_form_layout
@@ -121,38 +123,18 @@ def layout(pathname, auth_data):
 ###############################################################################
 
 def api_login(app_url, username, password):
-    request_headers = {
-        "Content-Type": "application/x-www-form-urlencoded",
-        "accept": "application/json"
-    }
-    payload = {"username": username, "password": password}
-    request_url = f"{app_url}/token"
+    """Request an access token, see api.login()
 
+    Returns
+    -------
+        requests.Response, None when the backend could not be reached
+    """
     try:
-        response = requests.post(
-            request_url, headers=request_headers, data=payload
-        )
-        return response
-    except Exception as e:
-        print(e)
+        return api.login(username, password, base_url=app_url)
+    except requests.RequestException as e:
+        print(f'WARNING: login failed ({e})')
         return None
 
-def build_request_headers(
-        access_token,
-        accept_type="application/json",
-        **kwargs
-    ):
-    headers = {
-        "accept": accept_type
-    }
-    if access_token:
-        headers["Authorization"] = f"Bearer {access_token}"
-
-    if "content_type" in kwargs:
-        headers["Content-Type"] = kwargs["content_type"]
-
-    return headers
-
 ###############################################################################
 # Callbacks
 ###############################################################################
@@ -166,6 +148,7 @@ def build_request_headers(
     State('password', 'value'),
     prevent_initial_call=True,
 )
+@metrics.instrument
 def login(n_clicks, username, password):
 
     if not n_clicks:
@@ -173,7 +156,8 @@ def login(n_clicks, username, password):
 
     # login
     try:
-        response =  api_login(API_URL, username, password)
+        with metrics.phase('query'):
+            response =  api_login(API_URL, username, password)
     except Exception as e:
         print(e)
         response = None
@@ -198,6 +182,7 @@ def login(n_clicks, username, password):
     State('auth-data','data'),
     prevent_initial_call=True,
 )
+@metrics.instrument
 def logout(n_clicks, auth_data):
 
     if not n_clicks:
@@ -216,9 +201,10 @@ def logout(n_clicks, auth_data):
     Input('auth-data','data'),
     prevent_initial_call=True,
 )
+@metrics.instrument
 def update_dashboard(auth_data):
 
-    if not auth_data['username']:
+    if not api.authenticated(auth_data):
         return login_form_layout
 
     else:
@@ -229,6 +215,7 @@ def update_dashboard(auth_data):
     Input('auth-data','data'),
     prevent_initial_call=True,
 )
+@metrics.instrument
 def update_username_p(auth_data):
 
     return html.P(_(f'Logged as: ') + str(auth_data['username']))
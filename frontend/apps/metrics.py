@@ -0,0 +1,263 @@
+"""metrics.py
+
+Prometheus metrics of the Dash callbacks, served at /metrics.
+
+Callbacks decorated with instrument() record their latency, split into
+phases with the phase() context manager, plus errors, in-flight requests and
+response sizes:
+
+    @app.callback(...)
+    @metrics.instrument
+    def update(...):
+        with metrics.phase('query'):
+            ...
+
+Phases are 'query', 'transform', 'figure' and 'inference' (forecasts),
+measured inside the callback, 'serialization', from the callback's return
+to the response, and 'total', the whole callback execution.
+
+Once setup() ran in the serving process (dev server or WSGI master), metric
+values are kept in files (prometheus_client's multiprocess mode), so the
+/metrics endpoint of any worker reports every worker process. Without it,
+ex. in tests and scripts, each process keeps its own values in memory.
+Background callbacks run in short lived job processes, which hand their
+timings over to the worker polling for the job result, through the
+background callback cache.
+"""
+import contextlib
+import contextvars
+import functools
+import os
+import shutil
+import time
+import flask
+from dash.exceptions import PreventUpdate
+from app import app, config, background_callback_manager
+
+###############################################################################
+# Settings
+ENABLED = config.getboolean('METRICS', 'ENABLED')
+METRICS_DIR = config['METRICS']['DIR']
+
+prometheus_client = None
+if ENABLED:
+    try:
+        import prometheus_client
+        from prometheus_client import multiprocess, values
+    except ImportError:
+        print('WARNING: prometheus_client not installed, metrics disabled')
+
+# Response sizes, from 256 B to 4 MB
+BYTES_BUCKETS = [256 * 4**i for i in range(8)]
+
+# Seconds to keep background jobs' timings, if no worker picks them up
+JOB_METRICS_TTL = 600
+
+# Timings of the callback running in the current thread (or background job)
+_current = contextvars.ContextVar('callback', default=None)
+
+###############################################################################
+# Metrics
+###############################################################################
+if prometheus_client:
+    LATENCY = prometheus_client.Histogram(
+        'dash_callback_duration_seconds',
+        'Dash callback latency, by phase',
+        ['callback', 'phase'],
+    )
+    RESPONSE_BYTES = prometheus_client.Histogram(
+        'dash_callback_response_bytes',
+        'Dash callback response size',
+        ['callback'],
+        buckets=BYTES_BUCKETS,
+    )
+    ERRORS = prometheus_client.Counter(
+        'dash_callback_errors',
+        'Dash callback exceptions',
+        ['callback'],
+    )
+    IN_FLIGHT = prometheus_client.Gauge(
+        'dash_callback_in_flight',
+        'Dash callback requests being handled',
+        ['callback'],
+        multiprocess_mode='livesum',
+    )
+
+###############################################################################
+# Setup
+###############################################################################
+def setup():
+    """Clear the metric files and switch to multiprocess mode
+
+    Called once by the serving process (dev server or WSGI master) before it
+    handles requests, the processes it starts inherit the directory. Does
+    nothing if a parent process already set it up.
+    """
+    if not prometheus_client or 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        return
+
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    os.makedirs(METRICS_DIR)
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = METRICS_DIR
+
+    # The value class is picked when prometheus_client is imported. Metrics
+    # above all have labels, so none of their values exist yet.
+    values.ValueClass = values.get_value_class()
+
+def multiprocess_mode():
+    """Whether metric values are shared through files, see setup()
+    """
+    return 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+###############################################################################
+# Instrumentation
+###############################################################################
+def instrument(func):
+    """Decorator recording a callback's metrics, under its function name
+    """
+    if not prometheus_client:
+        return func
+
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        record = {'callback': name, 'phases': {}, 'error': False}
+        token = _current.set(record)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except PreventUpdate:
+            raise
+        except Exception:
+            record['error'] = True
+            raise
+        finally:
+            end = time.perf_counter()
+            record['phases']['total'] = end - start
+            _current.reset(token)
+            if in_request_process():
+                observe(record)
+                # Serialization is measured by record_response()
+                flask.g.callback_done = end
+            elif background_callback_manager:
+                background_callback_manager.handle.set(
+                    f'metrics-{os.getpid()}', record, expire=JOB_METRICS_TTL
+                )
+
+    return wrapper
+
+@contextlib.contextmanager
+def phase(name):
+    """Record the enclosed block as a phase of the running callback
+    """
+    record = _current.get()
+    if record is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record['phases'][name] = record['phases'].get(name, 0) + \
+            time.perf_counter() - start
+
+def in_request_process():
+    """False inside background jobs, even though, as they are forked from
+    the request handler, they inherit its request context
+    """
+    return flask.has_request_context() and \
+        flask.g.get('request_pid', os.getpid()) == os.getpid()
+
+def observe(record):
+    """Record a callback execution's timings and error
+    """
+    for name, seconds in record['phases'].items():
+        LATENCY.labels(record['callback'], name).observe(seconds)
+    if record['error']:
+        ERRORS.labels(record['callback']).inc()
+
+def callback_name(output):
+    """Function name of the callback updating 'output', if known
+    """
+    callback = app.callback_map.get(output, {}).get('callback')
+    return getattr(callback, '__name__', None)
+
+def mark_process_dead(pid):
+    """Drop the in-flight values of a finished worker process
+    """
+    if prometheus_client and multiprocess_mode():
+        multiprocess.mark_process_dead(pid)
+
+###############################################################################
+# Routes
+###############################################################################
+if prometheus_client:
+
+    @app.server.before_request
+    def track_request():
+        """Count Dash callback requests in flight
+        """
+        if flask.request.path != '/_dash-update-component':
+            return
+
+        body = flask.request.get_json(silent=True) or {}
+        name = callback_name(body.get('output'))
+        if name is not None:
+            flask.g.callback_name = name
+            flask.g.request_pid = os.getpid()
+            flask.g.request_start = time.perf_counter()
+            IN_FLIGHT.labels(name).inc()
+
+    @app.server.after_request
+    def record_response(response):
+        """Record Dash callbacks' response sizes and serialization time
+        """
+        name = flask.g.get('callback_name')
+        if name is None or response.status_code != 200 or \
+                response.is_streamed:
+            return response
+
+        # Background callbacks answer 'running' until the result is ready
+        if b'"response":' not in response.get_data():
+            return response
+
+        # Background results are serialized while handling the last poll
+        done = flask.g.get('callback_done', flask.g.request_start)
+        LATENCY.labels(name, 'serialization').observe(
+            time.perf_counter() - done
+        )
+        RESPONSE_BYTES.labels(name).observe(
+            response.calculate_content_length() or 0
+        )
+        return response
+
+    @app.server.teardown_request
+    def end_request(exception):
+        """Close in-flight requests and collect background jobs' timings
+        """
+        name = flask.g.get('callback_name')
+        if name is None:
+            return
+
+        IN_FLIGHT.labels(name).dec()
+
+        job = flask.request.args.get('job')
+        if job and background_callback_manager:
+            record = background_callback_manager.handle.pop(f'metrics-{job}')
+            if record is not None:
+                observe(record)
+
+    @app.server.route('/metrics')
+    def metrics():
+        """Prometheus scrape endpoint, aggregating every worker process
+        """
+        registry = prometheus_client.REGISTRY
+        if multiprocess_mode():
+            registry = prometheus_client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return flask.Response(
+            prometheus_client.generate_latest(registry),
+            mimetype=prometheus_client.CONTENT_TYPE_LATEST,
+        )
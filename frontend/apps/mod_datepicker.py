@@ -1,11 +1,17 @@
 import ast
 import dash
 import dash_bootstrap_components as dbc
-import dash_html_components as html
-import dash_core_components as dcc
 import datetime as dt
-from dash.dependencies import Input, Output, State
-from app import app
+from dash import dcc, html
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from app import app, config
+from apps import dates, metrics
+
+###############################################################################
+# Settings
+
+# Run the callbacks in the browser (assets/datepicker.js)
+CLIENTSIDE = config['APP']['CLIENTSIDE_DATEPICKER'].lower() == 'true'
 
 ###############################################################################
 # Layout Objects
@@ -124,6 +130,10 @@ def get_filter_card(df_name):
 ###############################################################################
 # Lookup functions
 ###############################################################################
+
+# lookup_daterange() modes, as dates.period_bounds() offsets
+OFFSETS = {'this': 0, 'previous': -1, 'next': 1}
+
 def lookup_daterange(desired_period, start_date=None, end_date=None):
     """ Returns date ranges
 
@@ -147,6 +157,27 @@ def lookup_daterange(desired_period, start_date=None, end_date=None):
     -------
         "start_state,end_date" string in "YYYYMMDD,YYYYMMDD" format
     """
+    if len(desired_period.split(',')) == 2: # period in form YYYYMMDD,YYYYMMDD
+        return desired_period
+
+    # Calendar dimension lookup
+    if len(desired_period.split('_')) == 2:
+        mode, period = desired_period.split('_')
+        if start_date:
+            key = dates.to_key(start_date)
+        else:
+            key = dates.day_key(dt.date.today())
+        if mode in OFFSETS:
+            bounds = dates.period_bounds(period, key, OFFSETS[mode])
+            if bounds:
+                return '{},{}'.format(*bounds)
+
+    # Days outside of the calendar
+    return compute_daterange(desired_period, start_date, end_date)
+
+def compute_daterange(desired_period, start_date=None, end_date=None):
+    """lookup_daterange() computed with date arithmetic
+    """
 
     if start_date:
         d = str(start_date)
@@ -262,13 +293,6 @@ def lookup_daterange(desired_period, start_date=None, end_date=None):
 ###############################################################################
 # Callbacks
 ###############################################################################
-@app.callback(
-    Output("filter-collapse", "is_open"),
-    Output("filter-btn", "active"),
-    Input("filter-btn", "n_clicks"),
-    Input('update-defaults', 'children'),
-    State("filter-collapse", "is_open"),
-)
 def toggle_collapse(n, defaults, is_open):
     """toggle_collapse()
     """
@@ -297,21 +321,6 @@ def toggle_collapse(n, defaults, is_open):
         return not is_open, not is_open
     return is_open, is_open
 
-@app.callback(
-    Output('date-picker', 'start_date'),
-    Output('date-picker', 'end_date'),
-    Output('period-type', 'children'),
-    Output('period-arrows', 'style'),
-    Output('period-dropdown', 'value'),
-    Input('period-dropdown', 'value'),
-    Input('period-left-btn', 'n_clicks'),
-    Input('period-right-btn', 'n_clicks'),
-    Input('date-picker-container', 'n_clicks'),
-    Input('update-defaults', 'children'),
-    State('date-picker', 'start_date'),
-    State('date-picker', 'end_date'),
-    State('period-type', 'children'),
-)
 def update_datepicker(period, left_btn, right_btn, dt_picker_btn, defaults,
                        start_date, end_date, period_type):
 
@@ -333,23 +342,15 @@ def update_datepicker(period, left_btn, right_btn, dt_picker_btn, defaults,
             return None, None, None, {'display': 'none'}, period
 
         else:
-            s = str(period.split(',')[0])
-            e = str(period.split(',')[1])
-            start_date = dt.date(int(s[:4]), int(s[4:6]), int(s[6:8]))
-            end_date = dt.date(int(e[:4]), int(e[4:6]), int(e[6:8]))
+            s, e = period.split(',')
+            start_date = dates.to_date(s)
+            end_date = dates.to_date(e)
 
             display_arrows = {} # display arrows
 
-            if f'{s},{e}' == lookup_daterange('this_day'):
-                period_type = 'day'
-            elif f'{s},{e}' == lookup_daterange('this_week'):
-                period_type = 'week'
-            elif f'{s},{e}' == lookup_daterange('this_month'):
-                period_type = 'month'
-            elif f'{s},{e}' == lookup_daterange('this_year'):
-                period_type = 'year'
-            else:
-                period_type = None
+            # Today's day, week, month or year
+            period_type = dates.current_period(int(s), int(e))
+            if not period_type:
                 display_arrows = {'display': 'none'} # do not display arrows
 
             return start_date, end_date, period_type, display_arrows, period
@@ -368,9 +369,8 @@ def update_datepicker(period, left_btn, right_btn, dt_picker_btn, defaults,
                                  start_date.replace('-','')
                                 )
             s, e = a.split(',')
-            start_date = dt.date(int(s[:4]), int(s[4:6]), int(s[6:8]))
-            end_date = dt.date(int(e[:4]), int(e[4:6]), int(e[6:8]))
-            return start_date, end_date, period_type, {}, period
+            return dates.to_date(s), dates.to_date(e), period_type, {}, \
+                period
 
     # Process 'next' arrow button
     elif button_id == 'period-right-btn':
@@ -386,9 +386,8 @@ def update_datepicker(period, left_btn, right_btn, dt_picker_btn, defaults,
                                  start_date.replace('-','')
                                 )
             s, e = a.split(',')
-            start_date = dt.date(int(s[:4]), int(s[4:6]), int(s[6:8]))
-            end_date = dt.date(int(e[:4]), int(e[4:6]), int(e[6:8]))
-            return start_date, end_date, period_type, {}, period
+            return dates.to_date(s), dates.to_date(e), period_type, {}, \
+                period
 
     # Process 'next' arrow button
     elif button_id == 'period-right-btn':
@@ -411,16 +410,12 @@ def update_datepicker(period, left_btn, right_btn, dt_picker_btn, defaults,
                         if len(period.split('_'))==2: # period in form 'this_year'
                             period_type = period.split('_')[1]
                             s, e = a.split(',')
-                            start_date = dt.date(int(s[:4]),
-                                                 int(s[4:6]),
-                                                 int(s[6:8]))
-                            end_date = dt.date(int(e[:4]),
-                                               int(e[4:6]),
-                                               int(e[6:8]))
+                            start_date = dates.to_date(s)
+                            end_date = dates.to_date(e)
                         elif len(period.split(','))==2: # period in form 'YYYYMMDD,YYYYMMDD'
-                            dts = period.split(',')
-                            start_date = dt.datetime.strptime(dts[0], '%Y%m%d').date()
-                            end_date = dt.datetime.strptime(dts[1], '%Y%m%d').date()
+                            s, e = period.split(',')
+                            start_date = dates.to_date(s)
+                            end_date = dates.to_date(e)
                     else:
                         start_date = end_date = None
                         period_type = period_value = None
@@ -439,10 +434,6 @@ def update_datepicker(period, left_btn, right_btn, dt_picker_btn, defaults,
     else:
         return None, None, None, {'display': 'none'}, period
 
-@app.callback(
-    Output('period-dropdown', 'options'),
-    Input('period-dropdown', 'options'),
-)
 def update_period_dropdown(options, dim_periodo=False):
 
     if not options:
@@ -466,10 +457,63 @@ def update_period_dropdown(options, dim_periodo=False):
 
     return options
 
-@app.callback(
-    Output('update-defaults', 'children'),
-    Input('defaults', 'children'),
-)
 def set_defaults(defaults):
     return defaults
 
+###############################################################################
+# Callbacks registration
+###############################################################################
+CALLBACKS = [
+    (
+        toggle_collapse,
+        [
+            Output("filter-collapse", "is_open"),
+            Output("filter-btn", "active"),
+            Input("filter-btn", "n_clicks"),
+            Input('update-defaults', 'children'),
+            State("filter-collapse", "is_open"),
+        ]
+    ),
+    (
+        update_datepicker,
+        [
+            Output('date-picker', 'start_date'),
+            Output('date-picker', 'end_date'),
+            Output('period-type', 'children'),
+            Output('period-arrows', 'style'),
+            Output('period-dropdown', 'value'),
+            Input('period-dropdown', 'value'),
+            Input('period-left-btn', 'n_clicks'),
+            Input('period-right-btn', 'n_clicks'),
+            Input('date-picker-container', 'n_clicks'),
+            Input('update-defaults', 'children'),
+            State('date-picker', 'start_date'),
+            State('date-picker', 'end_date'),
+            State('period-type', 'children'),
+        ]
+    ),
+    (
+        update_period_dropdown,
+        [
+            Output('period-dropdown', 'options'),
+            Input('period-dropdown', 'options'),
+        ]
+    ),
+    (
+        set_defaults,
+        [
+            Output('update-defaults', 'children'),
+            Input('defaults', 'children'),
+        ]
+    ),
+]
+
+for func, dependencies in CALLBACKS:
+    if CLIENTSIDE:
+        app.clientside_callback(
+            ClientsideFunction(namespace='datepicker',
+                               function_name=func.__name__),
+            *dependencies
+        )
+    else:
+        app.callback(*dependencies)(metrics.instrument(func))
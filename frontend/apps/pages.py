@@ -0,0 +1,105 @@
+"""pages.py
+
+Dashboard pages registry.
+
+Page modules, with their callbacks and routes, are imported when first
+needed instead of when the app loads, so the server, the tests and the
+tools that do not show a page skip their imports (pandas, plotly.express,
+the lookup engines...).
+
+Dash only sends the browser the callbacks registered when the page loads,
+and Flask refuses new routes once it served a request: every page is
+therefore registered by warmup (see warmup.py) or, failing that, right
+before the first request reaches the app (RegistryMiddleware).
+
+Each page's import time is reported as it loads.
+"""
+import importlib
+import sys
+import threading
+import time
+from app import app
+
+###############################################################################
+# Settings
+
+# Page modules, by path
+PAGES = {
+    '/': 'apps.home',
+    '/login': 'apps.login',
+    '/sales': 'apps.sales',
+    '/financial': 'apps.financial',
+}
+
+# Seconds taken by each page module's import, once loaded
+timings = {}
+
+_lock = threading.RLock()
+
+###############################################################################
+# Registry
+###############################################################################
+def load(name):
+    """Import a page module, registering its callbacks
+
+    Returns
+    -------
+        module
+    """
+    with _lock:
+        if name in timings:
+            return sys.modules[name]
+
+        modules = len(sys.modules)
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        timings[name] = time.perf_counter() - start
+
+        print(f'INFO: page {name} loaded in {timings[name]:.3f}s '
+              f'({len(sys.modules) - modules} modules imported)')
+        return module
+
+def get(pathname):
+    """Page module of an URL path, None for unknown paths
+    """
+    name = PAGES.get(pathname)
+    return load(name) if name else None
+
+def load_all():
+    """Import every page module
+
+    Returns
+    -------
+        Total seconds spent importing
+    """
+    with _lock:
+        for name in PAGES.values():
+            load(name)
+        return sum(timings.values())
+
+def loaded():
+    """Whether every page is registered
+    """
+    return all(name in timings for name in PAGES.values())
+
+class RegistryMiddleware:
+    """WSGI middleware registering the pages before the first request
+
+    Parameters
+    ----------
+        wsgi_app | Callable
+            Wrapped WSGI application
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if not loaded():
+            start = time.perf_counter()
+            load_all()
+            print(f'INFO: pages registered in '
+                  f'{time.perf_counter() - start:.2f}s, on first request')
+        return self.wsgi_app(environ, start_response)
+
+app.server.wsgi_app = RegistryMiddleware(app.server.wsgi_app)
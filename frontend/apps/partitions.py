@@ -0,0 +1,265 @@
+"""partitions.py
+
+Year partitioned storage of the 'orders' table.
+
+Once partitioned, sales.db holds one 'orders_YYYY' table per year and
+'orders' becomes a view over all of them, so readers of the whole table
+(rollups, the 'memory' engine) keep working unchanged. Range queries read
+source() instead, which only unions the partitions overlapping the range:
+current year lookups do not depend on the history size, and past years'
+tables no longer change.
+
+Partition an existing sales.db, or add the partition of a new year before
+loading its orders, with:
+
+    python -m apps.partitions [path/to/sales.db] [--year YYYY]
+
+then create the indexes again (optimize_db.py), they are per partition.
+"""
+import argparse
+import re
+import sqlite3
+
+###############################################################################
+# Settings
+TABLE = 'orders'
+
+# Partition table names, ex.: 'orders_2014'
+PATTERN = re.compile(rf'^{TABLE}_(\d{{4}})$')
+
+# Modification counters of the orders tables, kept by triggers, see state()
+CHANGES = 'orders_changes'
+
+###############################################################################
+# Lookup functions
+###############################################################################
+def partition(year):
+    """Partition table name of a year
+    """
+    return f'{TABLE}_{year}'
+
+def is_partitioned(conn):
+    """Returns True when 'orders' is the view over partitions
+    """
+    row = conn.execute(
+        'SELECT type FROM sqlite_master WHERE name = ?', (TABLE,)
+    ).fetchone()
+    return row is not None and row[0] == 'view'
+
+def partition_years(conn):
+    """Years having a partition, in ascending order
+    """
+    names = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'"
+    )]
+    return sorted(
+        int(m.group(1)) for m in map(PATTERN.match, names) if m
+    )
+
+def tables(conn):
+    """Tables holding the orders: the partitions, or 'orders' itself
+    """
+    if is_partitioned(conn):
+        return [partition(year) for year in partition_years(conn)]
+    return [TABLE]
+
+def source(conn, since, until):
+    """FROM clause source holding every order of the [since, until] range
+
+    Parameters
+    ----------
+        conn | sqlite3.Connection
+
+        since, until | datetime.date
+            Range limits, inclusive
+
+    Returns
+    -------
+        'orders' when not partitioned, else the partition of the range's
+        year, or a UNION ALL subquery of the overlapping partitions. The
+        caller still filters on "Order Date".
+    """
+    if not is_partitioned(conn):
+        return TABLE
+
+    years = partition_years(conn)
+    overlap = [y for y in years if since.year <= y <= until.year]
+    # No orders in the range: any partition yields the empty result
+    overlap = overlap or years[:1]
+
+    if len(overlap) == 1:
+        return partition(overlap[0])
+    return '(' + '\n        UNION ALL '.join(
+        f'SELECT * FROM {partition(year)}' for year in overlap
+    ) + ')'
+
+def changes(conn):
+    """Modification counters of the tracked orders tables, by table name
+    """
+    if conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (CHANGES,)
+    ).fetchone() is None:
+        return {}
+    return dict(conn.execute(f'SELECT name, changes FROM {CHANGES}'))
+
+def state(conn):
+    """Value changing whenever orders are added, updated or removed, used to
+    detect stale rollups
+
+    Returns
+    -------
+        String, None when a table's modifications are not tracked, see
+        track_changes()
+    """
+    counters = changes(conn)
+    states = []
+    for table in tables(conn):
+        if table not in counters:
+            return None
+        rowid = conn.execute(f'SELECT max(rowid) FROM {table}').fetchone()[0]
+        states.append(f'{table}:{rowid}:{counters[table]}')
+    return ','.join(states)
+
+###############################################################################
+# Maintenance functions
+###############################################################################
+def track_changes(conn, table):
+    """Count every insert, update and delete of an orders table in CHANGES
+    """
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {CHANGES} (
+        name TEXT PRIMARY KEY,
+        changes INTEGER
+    )""")
+    conn.execute(f'INSERT OR IGNORE INTO {CHANGES} VALUES (?, 0)', (table,))
+    for event in ['INSERT', 'UPDATE', 'DELETE']:
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_changes_{event.lower()}
+        AFTER {event} ON {table}
+        BEGIN
+            UPDATE {CHANGES} SET changes = changes + 1
+            WHERE name = '{table}';
+        END""")
+
+def create_view(conn):
+    """(Re)create the 'orders' view over every partition
+    """
+    conn.execute(f'DROP VIEW IF EXISTS {TABLE}')
+    conn.execute(f'CREATE VIEW {TABLE} AS\n' + '\nUNION ALL\n'.join(
+        f'SELECT * FROM {partition(year)}'
+        for year in partition_years(conn)
+    ))
+
+def create_partition(conn, year, template):
+    """Create an empty partition, with the columns of the 'template' table
+    """
+    sql = conn.execute(
+        'SELECT sql FROM sqlite_master WHERE type = ? AND name = ?',
+        ('table', template)
+    ).fetchone()[0]
+    name = re.compile(
+        rf'^\s*CREATE TABLE\s+(?:"{template}"|\[{template}\]|{template})',
+        re.IGNORECASE
+    )
+    conn.execute(name.sub(f'CREATE TABLE {partition(year)}', sql, count=1))
+
+    # The "Day Key" triggers are per table, see dates.add_day_key()
+    from apps import dates
+    if dates.has_day_key(conn, template):
+        dates.add_day_key(conn, partition(year))
+    if template in changes(conn):
+        track_changes(conn, partition(year))
+
+def partition_orders(db_path):
+    """Split the 'orders' table into year partitions behind an 'orders' view
+
+    Does nothing when sales.db is already partitioned.
+
+    Returns
+    -------
+        list of the partitioned years
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        if is_partitioned(conn):
+            print(f'INFO: {TABLE} already partitioned')
+            return partition_years(conn)
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            years = [int(r[0]) for r in conn.execute(f"""
+                SELECT DISTINCT substr("Order Date", 1, 4)
+                FROM {TABLE} ORDER BY 1
+            """)]
+            for year in years:
+                print(f'INFO: building {partition(year)}')
+                create_partition(conn, year, TABLE)
+                conn.execute(f"""
+                INSERT INTO {partition(year)}
+                SELECT * FROM {TABLE}
+                WHERE "Order Date" >= ? AND "Order Date" < ?
+                ORDER BY "Order Date"
+                """, (f'{year}-01-01', f'{year + 1}-01-01'))
+
+            total = conn.execute(f'SELECT count(*) FROM {TABLE}').fetchone()[0]
+            moved = sum(
+                conn.execute(f'SELECT count(*) FROM {partition(year)}')
+                .fetchone()[0] for year in years
+            )
+            if moved != total:
+                raise ValueError(
+                    f'{total - moved} orders without a valid "Order Date"'
+                )
+
+            conn.execute(f'DROP TABLE {TABLE}')
+            create_view(conn)
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+
+        return years
+    finally:
+        conn.close()
+
+def add_partition(db_path, year):
+    """Create the empty partition of a new year and add it to the view
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        years = partition_years(conn)
+        if not is_partitioned(conn):
+            raise ValueError(f'{TABLE} is not partitioned')
+        if year in years:
+            return
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            create_partition(conn, year, partition(years[-1]))
+            create_view(conn)
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
+
+###############################################################################
+## Main
+if __name__ == '__main__':
+
+    from app import config
+
+    parser = argparse.ArgumentParser(
+        description='Partition sales.db orders by year'
+    )
+    parser.add_argument('db', nargs='?', default=config['DATA']['DB'])
+    parser.add_argument('--year', type=int,
+                        help='add an empty partition for this year')
+    args = parser.parse_args()
+
+    if args.year:
+        add_partition(args.db, args.year)
+    else:
+        partition_orders(args.db)
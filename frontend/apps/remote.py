@@ -0,0 +1,317 @@
+"""remote.py
+
+Backend API data source for the sales dashboard ([DATA] ENGINE=api).
+
+Orders are fetched from the backend's paginated orders endpoint:
+
+    GET <ORDERS_PATH>?since=YYYY-MM-DD&until=YYYY-MM-DD&segment=...
+                     &page=1&page_size=N
+
+    {"items": [{"order_id", "order_date", "segment", "market", "country",
+                "sales", "quantity"}, ...],
+     "total": <orders in the range>}
+
+The first page gives the number of pages. The others are then requested
+concurrently over the pooled API connection (see api.py), and each page is
+reduced to day x segment x market x country totals as it arrives, so memory
+follows the number of groups, not of orders.
+
+Pages are cached with their ETag, shared by every worker process. They are
+revalidated with If-None-Match, and a '304 Not Modified' answer reuses the
+cached totals.
+
+The dashboards' result caches are versioned on data_version(): the ETag of
+VERSION_PATH when the backend provides one, else of the first page of all
+orders (whose body carries their total), checked every VERSION_CHECK
+seconds.
+"""
+import concurrent.futures
+import math
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+import requests
+from app import config, API_URL
+from apps import api, buckets, dates
+from apps.cache import ResultCache
+
+###############################################################################
+# Settings
+ORDERS_PATH = config['API']['ORDERS_PATH']
+PAGE_SIZE = config.getint('API', 'PAGE_SIZE')
+FETCH_WORKERS = config.getint('API', 'FETCH_WORKERS')
+VERSION_PATH = config['API']['VERSION_PATH']
+VERSION_CHECK = config.getfloat('API', 'VERSION_CHECK')
+
+# Service account used by the dashboard, if the backend requires one
+API_USERNAME = os.getenv('API_USERNAME')
+API_PASSWORD = os.getenv('API_PASSWORD')
+
+KEYS = ['segment', 'market', 'country']
+MEASURES = ['sales', 'quantity', 'orders']
+
+# Pages' totals by ETag, shared by the worker processes
+etag_cache = ResultCache(
+    config['API']['ETAG_CACHE'],
+    None,
+    maxsize=config.getint('API', 'ETAG_CACHE_SIZE'),
+    ttl=config.getint('API', 'ETAG_CACHE_TTL'),
+    enabled=config.getboolean('CACHE', 'ENABLED'),
+)
+
+###############################################################################
+# Aggregation
+###############################################################################
+def page_totals(items):
+    """Day x segment x market x country totals of a page of orders
+
+    Returns
+    -------
+        pd.DataFrame, indexed by ('day', 'segment', 'market', 'country'), of
+        MEASURES columns
+    """
+    df = pd.DataFrame.from_records(
+        items,
+        columns=['order_id', 'order_date'] + KEYS + ['sales', 'quantity'],
+    )
+    df['day'] = pd.to_datetime(
+        df['order_date'].str[:10], format='%Y-%m-%d'
+    ).to_numpy(dtype='datetime64[D]')
+
+    return df.groupby(['day'] + KEYS).agg(
+        sales=('sales', 'sum'),
+        quantity=('quantity', 'sum'),
+        orders=('order_id', 'count'),
+    )
+
+def combine(total, totals):
+    """Add a page's totals to the running ones
+    """
+    if total is None:
+        return totals
+    return pd.concat([total, totals]).groupby(level=[0, 1, 2, 3]).sum()
+
+def to_buckets(total, granularity):
+    """rollup.lookup_buckets() rows of day totals
+    """
+    if total is None or total.empty:
+        return pd.DataFrame(columns=['bucket'] + KEYS + MEASURES)
+
+    df = total.reset_index()
+    days = df['day'].to_numpy(dtype='datetime64[D]')
+    df['bucket'] = np.datetime_as_string(
+        buckets.day_keys(granularity, days), unit='D'
+    )
+    df = df.groupby(['bucket'] + KEYS, as_index=False)[MEASURES].sum()
+    for measure in ['quantity', 'orders']:
+        df[measure] = df[measure].astype(np.int64)
+    return df.sort_values(['bucket'] + KEYS, ignore_index=True)
+
+###############################################################################
+# Data source
+###############################################################################
+class APIEngine:
+    """Sales lookups from the backend API
+
+    Same lookup interface as engine.SalesEngine.
+
+    Parameters
+    ----------
+        base_url | String
+            Backend location, defaults to API_URL
+
+        username, password | String
+            Service account, defaults to API_USERNAME and API_PASSWORD.
+            Requests are anonymous without it.
+
+        page_size | Integer
+            Orders per page
+
+        workers | Integer
+            Pages fetched at once
+
+        cache | ResultCache
+            Pages' ETag cache, None disables it
+    """
+
+    def __init__(self, base_url=None, username=None, password=None,
+                 page_size=PAGE_SIZE, workers=FETCH_WORKERS,
+                 cache=etag_cache):
+        self.base_url = base_url or API_URL
+        self.username = username or API_USERNAME
+        self.password = password or API_PASSWORD
+        self.page_size = page_size
+        self.workers = workers
+        self.cache = cache
+        self._token = None
+        self._lock = threading.Lock()
+        self._version = (None, None)    # (checked at, version)
+        self._version_lock = threading.Lock()
+
+    ###########################################################################
+    # Authentication
+    def token(self, renew=False):
+        """Service account's access token, renewed once expired
+        """
+        if not self.username:
+            return None
+
+        with self._lock:
+            if renew or not api.token_valid(self._token):
+                response = api.login(self.username, self.password,
+                                     base_url=self.base_url)
+                response.raise_for_status()
+                self._token = response.json()['access_token']
+            return self._token
+
+    def ensure_loaded(self):
+        """Authenticate ahead of the first lookup (warmup)
+        """
+        self.token()
+
+    ###########################################################################
+    # Fetch
+    def fetch_page(self, params, page):
+        """A page's totals and the number of orders in the range
+
+        Returns
+        -------
+            (totals, total) tuple, see page_totals()
+        """
+        params = dict(params, page=page, page_size=self.page_size)
+        key = (self.base_url, ORDERS_PATH, sorted(params.items()))
+        hit, cached = self.cache.get('page', key) if self.cache \
+            else (False, None)
+        headers = {'If-None-Match': cached[0]} if hit and cached[0] else {}
+
+        for renew in (False, True):
+            response = api.request(
+                'GET', ORDERS_PATH, self.token(renew),
+                base_url=self.base_url, params=params, headers=headers,
+            )
+            if response.status_code != 401 or not self.username:
+                break
+
+        if response.status_code == 304 and hit:
+            return cached[1], cached[2]
+        response.raise_for_status()
+
+        body = response.json()
+        totals = page_totals(body['items'])
+        etag = response.headers.get('ETag')
+        if self.cache and etag:
+            self.cache.set('page', key, (etag, totals, body['total']))
+        return totals, body['total']
+
+    def fetch(self, since, until, segments):
+        """Day totals of the orders in the range
+
+        Pages after the first are fetched concurrently and added up as they
+        arrive.
+
+        Returns
+        -------
+            pd.DataFrame, see page_totals()
+        """
+        params = {
+            'since': since.isoformat(),
+            'until': until.isoformat(),
+            'segment': sorted(segments),
+        }
+        total, count = self.fetch_page(params, 1)
+        pages = math.ceil(count / self.page_size)
+        if pages <= 1:
+            return total
+
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as pool:
+            futures = [
+                pool.submit(self.fetch_page, params, page)
+                for page in range(2, pages + 1)
+            ]
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    total = combine(total, future.result()[0])
+            except requests.RequestException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        return total
+
+    ###########################################################################
+    # Data version
+    def probe_version(self):
+        """Backend's current data version
+
+        The ETag (or, without one, the body) of VERSION_PATH, or of the
+        first page of every order when VERSION_PATH is empty.
+        """
+        if VERSION_PATH:
+            path, params = VERSION_PATH, {}
+        else:
+            path = ORDERS_PATH
+            params = {
+                'since': f'{dates.FIRST_YEAR}-01-01',
+                'until': f'{dates.LAST_YEAR}-12-31',
+                'page': 1,
+                'page_size': 1,
+            }
+
+        for renew in (False, True):
+            response = api.request(
+                'GET', path, self.token(renew),
+                base_url=self.base_url, params=params,
+            )
+            if response.status_code != 401 or not self.username:
+                break
+        response.raise_for_status()
+        return response.headers.get('ETag') or response.text
+
+    def data_version(self):
+        """Backend's data version, probed at most every VERSION_CHECK
+        seconds
+
+        While the backend can not be reached, the version changes every
+        VERSION_CHECK seconds, so cached results expire as fast as when it
+        answers.
+        """
+        now = time.monotonic()
+        checked, version = self._version
+        if checked is not None and now - checked < VERSION_CHECK:
+            return version
+
+        with self._version_lock:
+            checked, version = self._version
+            if checked is not None and now - checked < VERSION_CHECK:
+                return version
+            try:
+                version = 'api:' + self.probe_version()
+            except requests.RequestException as e:
+                print(f'WARNING: backend data version unknown ({e})')
+                version = f'api-unknown:{int(time.time() // VERSION_CHECK)}'
+            self._version = (now, version)
+            return version
+
+    ###########################################################################
+    # Lookups
+    def lookup_buckets(self, since, until, segments, granularity):
+        """Aggregates by 'granularity' buckets for the [since, until] range
+
+        Same interface and output as rollup.lookup_buckets(), without the
+        'conn' parameter.
+        """
+        if not segments:
+            return to_buckets(None, granularity)
+        return to_buckets(self.fetch(since, until, segments), granularity)
+
+    def lookup_monthly(self, since, until, segments):
+        """Monthly aggregates for the [since, until] range
+
+        Same interface and output as rollup.lookup_monthly(), without the
+        'conn' parameter.
+        """
+        df = self.lookup_buckets(since, until, segments, 'month')
+        df['bucket'] = df['bucket'].str[:7]
+        return df.rename(columns={'bucket':'month'})
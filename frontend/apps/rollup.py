@@ -0,0 +1,388 @@
+"""rollup.py
+
+Monthly aggregates of the 'orders' table, materialized inside sales.db.
+
+Build or refresh them after every data load with:
+
+    python -m apps.rollup [path/to/sales.db]
+"""
+import argparse
+import datetime as dt
+import sqlite3
+import time
+import pandas as pd
+from apps import buckets, dates, partitions
+
+###############################################################################
+# Settings
+TABLE = 'rollup_cube'
+
+# Tables built by previous versions
+LEGACY_TABLES = ['rollup_market', 'rollup_country']
+
+# Order day range conditions: on "Order Date" strings (parameters: first day,
+# day after the last one) or on integer day keys (first and last day keys)
+DATE_RANGE = '"Order Date" >= ? AND "Order Date" < ?'
+DAY_KEY_RANGE = '"Day Key" BETWEEN ? AND ?'
+
+# Bucket columns of 'dim_calendar', by granularity
+CALENDAR_BUCKETS = {'day': 'date', 'week': 'week_start'}
+
+###############################################################################
+# Builder
+###############################################################################
+def build_rollups(db_path):
+    """(Re)build the month x segment x market x country rollup table
+
+    The table holds 'month' (YYYY-MM), 'segment', 'market', 'country' and
+    the 'sales', 'quantity' and 'orders' aggregates.
+    """
+    conn = sqlite3.connect(db_path)
+    with conn:
+        for table in LEGACY_TABLES + [TABLE]:
+            conn.execute(f'DROP TABLE IF EXISTS {table}')
+
+        print(f'INFO: building {TABLE}')
+        conn.execute(f"""
+        CREATE TABLE {TABLE} AS
+        {orders_query(None)}
+        """)
+        conn.execute(f'CREATE INDEX {TABLE}_month ON {TABLE}(month, segment)')
+
+        # Keep track of the source state, so stale rollups are ignored
+        for table in partitions.tables(conn):
+            partitions.track_changes(conn, table)
+        conn.execute('DROP TABLE IF EXISTS rollup_meta')
+        conn.execute('CREATE TABLE rollup_meta (built REAL, state TEXT)')
+        conn.execute(
+            'INSERT INTO rollup_meta VALUES (?, ?)',
+            (time.time(), partitions.state(conn))
+        )
+    conn.close()
+
+def tables(conn):
+    """Names of the tables in 'conn'
+    """
+    return {r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'"
+    )}
+
+def rollups_available(conn):
+    """Returns True when the rollups exist and match the 'orders' table
+    """
+    if not {TABLE, 'rollup_meta'} <= tables(conn):
+        return False
+
+    try:
+        built = conn.execute('SELECT state FROM rollup_meta').fetchone()
+    except sqlite3.OperationalError:     # built by a previous version
+        return False
+    return built is not None and built[0] is not None and \
+        built[0] == partitions.state(conn)
+
+###############################################################################
+# Lookup functions
+###############################################################################
+def split_range(since, until):
+    """Split [since, until] into partial edge ranges and whole months
+
+    Parameters
+    ----------
+        since, until | datetime.date
+            Range limits, inclusive
+
+    Returns
+    -------
+        (edges, months) tuple, where 'edges' is a list of (first, last)
+        date tuples not covering a whole month and 'months' is a
+        (first, last) tuple of 'YYYY-MM' strings, or None when the range
+        holds no whole month.
+    """
+    # First day of the first whole month
+    if since.day == 1:
+        first = since
+    else:
+        first = (since.replace(day=28) + dt.timedelta(days=4)).replace(day=1)
+
+    # First day after the last whole month
+    next_day = until + dt.timedelta(days=1)
+    last = next_day.replace(day=1)
+
+    if first >= last:
+        return [(since, until)], None
+
+    edges = []
+    if since < first:
+        edges.append((since, first - dt.timedelta(days=1)))
+    if last <= until:
+        edges.append((last, until))
+
+    last_month = last - dt.timedelta(days=1)
+    return edges, (first.strftime('%Y-%m'), last_month.strftime('%Y-%m'))
+
+def range_filter(since, until, day_keys):
+    """Order day condition of the [since, until] range, and its parameters
+
+    Parameters
+    ----------
+        day_keys | Boolean
+            Compare integer day keys rather than "Order Date" strings, see
+            dates.day_keys_available()
+
+    Returns
+    -------
+        (condition, params) tuple
+    """
+    if day_keys:
+        return DAY_KEY_RANGE, [dates.day_key(since), dates.day_key(until)]
+    return DATE_RANGE, [str(since), str(until + dt.timedelta(days=1))]
+
+def orders_query(n_segments, source=partitions.TABLE, condition=DATE_RANGE):
+    """Monthly aggregation of 'orders' for a date range and segments
+
+    Parameters: the range 'condition' ones (first day, day after the last
+    one by default), then the segments. When 'n_segments' is None, the
+    statement aggregates the whole table. 'source' restricts the statement
+    to the range's partitions, see partitions.source().
+    """
+    if n_segments is None:
+        where = ''
+    else:
+        where = f"""
+        WHERE {condition}
+            AND Segment IN ({', '.join('?' * n_segments)})"""
+
+    return f"""
+        SELECT
+            substr("Order Date", 1, 7) AS month
+            ,Segment AS segment
+            ,Market AS market
+            ,Country AS country
+            ,sum(Sales) AS sales
+            ,sum(Quantity) AS quantity
+            ,count("Order ID") AS orders
+        FROM {source}{where}
+        GROUP BY 1, 2, 3, 4
+        """
+
+def rollup_query(n_segments):
+    """Rollup rows for a range of months and segments
+
+    Parameters: first and last months ('YYYY-MM'), then the segments.
+    """
+    return f"""
+        SELECT month, segment, market, country, sales, quantity, orders
+        FROM {TABLE}
+        WHERE month BETWEEN ? AND ?
+            AND segment IN ({', '.join('?' * n_segments)})
+        """
+
+def dashboard_queries(conn, n_segments=3):
+    """Statements run by the dashboards on 'conn', with sample parameters
+
+    Statements on the rollups or the country dimension are left out when
+    those tables do not exist, the dashboards do not run them then.
+
+    Returns
+    -------
+        list of (name, query, params) tuples
+    """
+    # Imported here, as they build on this module
+    from apps import export, geo
+
+    segments = ['Consumer', 'Corporate', 'Home Office'][:n_segments]
+    day_keys = dates.day_keys_available(conn)
+    month = (dt.date(2011, 1, 1), dt.date(2011, 1, 31))
+    # Across years, read from several partitions once partitioned
+    years = (dt.date(2011, 12, 1), dt.date(2012, 1, 31))
+
+    queries = []
+    for name, (since, until) in [('orders', month), ('orders_years', years)]:
+        condition, params = range_filter(since, until, day_keys)
+        queries.append((
+            name,
+            orders_query(n_segments, partitions.source(conn, since, until),
+                         condition),
+            params + segments,
+        ))
+
+    if TABLE in tables(conn):
+        queries.append((
+            TABLE,
+            rollup_query(n_segments),
+            ['2011-01', '2011-12'] + segments,
+        ))
+
+    # Day and week buckets, joined to 'dim_calendar' with day keys
+    for granularity in CALENDAR_BUCKETS:
+        queries.append((
+            f'buckets_{granularity}',
+            *bucket_query(conn, *years, segments, granularity),
+        ))
+
+    if geo.dim_country_available(conn):
+        queries.append((
+            'dim_country',
+            *geo.cube_query(conn, *years, segments),
+        ))
+
+    queries.append((
+        'export_raw',
+        *export.export_query(conn, 'raw', *years, segments),
+    ))
+    return queries
+
+def monthly_query(conn, since, until, segments):
+    """Build the monthly aggregation statement for the [since, until] range
+
+    Whole months are read from the rollup table when the rollups are
+    available, while partial edge months (or the whole range, otherwise)
+    are aggregated from 'orders'.
+
+    Parameters
+    ----------
+        conn | sqlite3.Connection
+
+        since, until | datetime.date
+            Range limits, inclusive
+
+        segments | list
+            Selected segments
+
+    Returns
+    -------
+        (query, params) tuple. Query's columns are 'month', 'segment',
+        'market', 'country', 'sales', 'quantity' and 'orders'.
+    """
+    if rollups_available(conn):
+        edges, months = split_range(since, until)
+    else:
+        edges, months = [(since, until)], None
+
+    day_keys = dates.day_keys_available(conn)
+    queries = []
+    params = []
+    for first, last in edges:
+        condition, range_params = range_filter(first, last, day_keys)
+        queries.append(orders_query(
+            len(segments), partitions.source(conn, first, last), condition
+        ))
+        params += range_params + list(segments)
+
+    if months:
+        queries.append(rollup_query(len(segments)))
+        params += list(months) + list(segments)
+
+    query = '\nUNION ALL\n'.join(queries) + '\nORDER BY month ASC'
+    return query, params
+
+def bucket_query(conn, since, until, segments, granularity):
+    """Build the aggregation statement by 'granularity' buckets
+
+    Day and week buckets are aggregated from 'orders', coarser ones from
+    the monthly aggregates, see monthly_query(). With the calendar dimension
+    (dates.py), orders are filtered and aggregated by day key, then grouped
+    on its bucket columns.
+
+    Returns
+    -------
+        (query, params) tuple. Query's columns are 'bucket' (first day,
+        'YYYY-MM-DD'), 'segment', 'market', 'country', 'sales', 'quantity'
+        and 'orders'.
+    """
+    day_keys = dates.day_keys_available(conn)
+    if granularity in ('day', 'week'):
+        condition, params = range_filter(since, until, day_keys)
+        params += list(segments)
+        where = f"""
+        WHERE {condition}
+            AND Segment IN ({', '.join('?' * len(segments))})"""
+
+    if granularity in CALENDAR_BUCKETS and day_keys:
+        query = f"""
+        SELECT
+            c.{CALENDAR_BUCKETS[granularity]} AS bucket
+            ,d.segment
+            ,d.market
+            ,d.country
+            ,sum(d.sales) AS sales
+            ,sum(d.quantity) AS quantity
+            ,sum(d.orders) AS orders
+        FROM (
+            SELECT
+                "Day Key" AS day_key
+                ,Segment AS segment
+                ,Market AS market
+                ,Country AS country
+                ,sum(Sales) AS sales
+                ,sum(Quantity) AS quantity
+                ,count("Order ID") AS orders
+            FROM {partitions.source(conn, since, until)}{where}
+            GROUP BY 1, 2, 3, 4
+        ) AS d
+        JOIN dim_calendar AS c ON c.day_key = d.day_key
+        GROUP BY 1, 2, 3, 4
+        ORDER BY bucket ASC
+        """
+        return query, params
+
+    if granularity in ('day', 'week'):
+        source = partitions.source(conn, since, until)
+        column = '"Order Date"'
+        measures = """
+            ,sum(Sales) AS sales
+            ,sum(Quantity) AS quantity
+            ,count("Order ID") AS orders"""
+    else:
+        query, params = monthly_query(conn, since, until, segments)
+        source = f'({query})'
+        column = "month || '-01'"
+        measures = """
+            ,sum(sales) AS sales
+            ,sum(quantity) AS quantity
+            ,sum(orders) AS orders"""
+        where = ''
+
+    query = f"""
+        SELECT
+            {buckets.sql(granularity, column)} AS bucket
+            ,Segment AS segment
+            ,Market AS market
+            ,Country AS country{measures}
+        FROM {source}{where}
+        GROUP BY 1, 2, 3, 4
+        ORDER BY bucket ASC
+        """
+    return query, params
+
+def lookup_buckets(conn, since, until, segments, granularity):
+    """Aggregates by 'granularity' buckets for the [since, until] range
+
+    Returns
+    -------
+        pd.DataFrame, see bucket_query()
+    """
+    query, params = bucket_query(conn, since, until, segments, granularity)
+    return pd.read_sql(query, conn, params=params)
+
+def lookup_monthly(conn, since, until, segments):
+    """Monthly aggregates for the [since, until] range
+
+    Returns
+    -------
+        pd.DataFrame, see monthly_query()
+    """
+    query, params = monthly_query(conn, since, until, segments)
+    return pd.read_sql(query, conn, params=params)
+
+###############################################################################
+## Main
+if __name__ == '__main__':
+
+    from app import config
+
+    parser = argparse.ArgumentParser(description='Build sales.db rollups')
+    parser.add_argument('db', nargs='?', default=config['DATA']['DB'])
+    args = parser.parse_args()
+
+    build_rollups(args.db)
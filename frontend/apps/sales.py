@@ -1,32 +1,239 @@
 import dash_bootstrap_components as dbc
-import plotly.graph_objs as go
+import functools
+import json
 import plotly.express as px
+import plotly.io
 import pandas as pd
-import sqlite3
-import locale
+import os
 import datetime as dt
-from app import app
-from dash import dcc, html, dash_table
-from apps import mod_datepicker
-from dash.dependencies import Input, Output, State
+import flask
+import threading
+import time
+from app import app, config, BACKGROUND
+from dash import Patch, dcc, html
+from apps import buckets, dates, db, export, forecast, geo, metrics, \
+    mod_datepicker, rollup
+from apps.cache import ResultCache, canonical_key, file_version
+from apps.engine import SalesEngine
+from apps.remote import APIEngine
+from dash.dependencies import ClientsideFunction, Input, Output
 
 ###############################################################################
 # Settings
 DF_NAME='vendas'
+SEGMENTS = ['Consumer', 'Home Office', 'Corporate']
+DB_PATH = config['DATA']['DB']
+MAX_POINTS = config.getint('APP', 'MAX_POINTS')
+db.get_pool(DB_PATH, size=config.getint('DATA', 'POOL_SIZE'))
 DEFAULTS = {
     # 'period':'this_year',
     'period':'20110101,20141231',
     'is_open':'true',
 },
 
+# Optional in-process columnar engine ('memory'), backend API ('api'), or
+# SQLite queries ('sql')
+if config['DATA']['ENGINE'] == 'memory':
+    engine = SalesEngine(DB_PATH)
+elif config['DATA']['ENGINE'] == 'api':
+    engine = APIEngine()
+else:
+    engine = None
+
+# Exports read sales.db, except with the backend API: the 'memory' engine is
+# a copy of sales.db, the backend only provides monthly exports
+export_engine = engine if isinstance(engine, APIEngine) else None
+EXPORT_SCOPES = ['monthly'] if export_engine else list(export.SCOPES)
+
+def data_version():
+    """Version of the active engine's data, caches' entries follow it
+    """
+    if engine:
+        return engine.data_version()
+    return file_version(DB_PATH)
+
+# Lookup results cache, shared by all workers
+cache = ResultCache(
+    config['CACHE']['PATH'],
+    data_version,
+    maxsize=config.getint('CACHE', 'SIZE'),
+    ttl=config.getint('CACHE', 'TTL'),
+    enabled=config.getboolean('CACHE', 'ENABLED'),
+)
+
+# Serialized update_sales_figures() outputs, by view and figure id. The
+# preset periods are rendered at startup and again once the data changed.
+figure_cache = ResultCache(
+    config['CACHE']['FIGURES_PATH'],
+    data_version,
+    maxsize=config.getint('CACHE', 'FIGURES_SIZE'),
+    ttl=config.getint('CACHE', 'FIGURES_TTL'),
+    enabled=config.getboolean('CACHE', 'ENABLED'),
+)
+FIGURES = ['venda-plot', 'venda-pie', 'venda-globe']
+FIGURES_CHECK = config.getint('CACHE', 'FIGURES_CHECK')
+
+# Forecasts, by segments and horizon (months), see lookup_forecast()
+MODEL_PATH = os.getenv('FORECAST_MODEL', config['FORECAST']['MODEL'])
+HORIZON = config.getint('FORECAST', 'HORIZON')
+HORIZONS = sorted({3, 6, 12, 24, HORIZON})
+forecast_cache = ResultCache(
+    config['FORECAST']['CACHE_PATH'],
+    MODEL_PATH,
+    maxsize=config.getint('FORECAST', 'CACHE_SIZE'),
+    ttl=config.getint('FORECAST', 'CACHE_TTL'),
+    enabled=config.getboolean('CACHE', 'ENABLED'),
+)
+
+###############################################################################
+# Figures
+#
+# The figures' skeletons (traces, layout and template) are sent once, with the
+# layout. Filter changes only send the data arrays, as Patch objects.
+GLOBE_MAX_SIZE = 20     # px.scatter_geo() default marker size
+
+def sales_skeleton():
+    """Sales by period and segment bar chart, one empty trace per segment
+    """
+    df = pd.DataFrame({'period':'', 'sales':0, 'segment':SEGMENTS})
+    fig = px.bar(
+        df, x="period", y="sales", color="segment", title="Vendas",
+        labels={'period':'Período'},
+    )
+    fig.update_traces(x=[], y=[])
+    fig.update_xaxes(categoryorder='array', categoryarray=[])
+    return fig
+
+def markets_skeleton():
+    """Sales by market pie chart, without slices
+    """
+    df = pd.DataFrame({'market':[], 'sales':[]})
+    fig = px.pie(
+            df, values='sales', names='market',
+            color_discrete_sequence=px.colors.sequential.RdBu
+        )
+    fig.update_traces(labels=[], values=[])
+    return fig
+
+def globe_skeleton():
+    """Sales by country globe, one empty trace per continent
+    """
+    df = pd.DataFrame({
+        'iso_alpha':'', 'continent':geo.CONTINENTS, 'Country':'', 'Sales':1,
+    })
+    fig = px.scatter_geo(
+            df,
+            locations="iso_alpha",
+            color="continent",
+            hover_name="Country",
+            size="Sales",
+            projection="natural earth"
+    )
+    fig.update_traces(locations=[], hovertext=[], marker_size=[])
+    return fig
+
+def patch_sales(df, granularity):
+    """Bar chart update, from lookup_data() rows
+    """
+    df = df.groupby(['period','segment',]).agg(
+        {
+            'date':'first',
+            'sales':'sum',
+        }
+    ).reset_index().sort_values('date', ascending=True)
+
+    patch = Patch()
+    patch['layout']['xaxis']['title']['text'] = buckets.TITLES[granularity]
+    patch['layout']['xaxis']['categoryarray'] = \
+        df['period'].drop_duplicates().tolist()
+    for i, segment in enumerate(SEGMENTS):
+        rows = df[df['segment'] == segment]
+        patch['data'][i]['x'] = rows['period'].tolist()
+        patch['data'][i]['y'] = rows['sales'].tolist()
+    return patch
+
+def patch_markets(df):
+    """Pie chart update, from lookup_data() rows
+    """
+    df = df.groupby('market').agg({'sales':'sum'}).reset_index()
+
+    patch = Patch()
+    patch['data'][0]['labels'] = df['market'].tolist()
+    patch['data'][0]['values'] = df['sales'].tolist()
+    return patch
+
+def patch_globe(top):
+    """Globe update, from lookup_countries() rows
+    """
+    # Countries without ISO-3 code can not be placed on the globe
+    missing = geo.unmapped(top)
+    if missing:
+        print(f'WARNING: countries without ISO-3 code: {", ".join(missing)}')
+    top = top.dropna(subset=['iso_alpha'])
+
+    # Marker area scale, shared by every continent, as px.scatter_geo() does
+    sizeref = 1
+    if top['Sales'].max() > 0:
+        sizeref = 2 * top['Sales'].max() / GLOBE_MAX_SIZE**2
+
+    patch = Patch()
+    for i, continent in enumerate(geo.CONTINENTS):
+        rows = top[top['continent'] == continent]
+        patch['data'][i]['locations'] = rows['iso_alpha'].tolist()
+        patch['data'][i]['hovertext'] = rows['Country'].tolist()
+        patch['data'][i]['marker']['size'] = rows['Sales'].tolist()
+        patch['data'][i]['marker']['sizeref'] = sizeref
+
+    patch['layout']['annotations'] = [
+        dict(
+            text='Sem localização: ' + ', '.join(missing),
+            showarrow=False,
+            xref='paper', yref='paper',
+            x=0, y=0,
+        )
+    ] if missing else []
+    return patch
+
+def forecast_skeleton():
+    """Sales forecast line chart, one empty trace per segment
+    """
+    df = pd.DataFrame({'month':'', 'sales':0, 'segment':SEGMENTS})
+    fig = px.line(
+        df, x="month", y="sales", color="segment", markers=True,
+        title="Previsão de vendas", labels={'month':'Mês'},
+    )
+    fig.update_traces(x=[], y=[])
+    return fig
+
+def patch_forecast(df):
+    """Forecast chart update, from lookup_forecast() rows, None when the
+    model is not available
+    """
+    missing = df is None
+    if missing:
+        df = pd.DataFrame({'month':[], 'segment':[], 'sales':[]})
+
+    patch = Patch()
+    for i, segment in enumerate(SEGMENTS):
+        rows = df[df['segment'] == segment]
+        patch['data'][i]['x'] = rows['month'].tolist()
+        patch['data'][i]['y'] = rows['sales'].tolist()
+
+    patch['layout']['annotations'] = [
+        dict(
+            text='Previsão indisponível',
+            showarrow=False,
+            xref='paper', yref='paper',
+            x=0.5, y=0.5,
+        )
+    ] if missing else []
+    return patch
+
 ###############################################################################
 # Layout Objects
 ###############################################################################
 
-# Plots
-graph01 = dcc.Graph(id='venda-plot')
-graph02 = dcc.Graph(id='venda-pie')
-graph03 = dcc.Graph(id='venda-globe')
+# Plots are built with the layout, see skeleton()
 table01 = html.Div(id='venda-ng-table')
 download_button = dbc.Button(
     id='btn',
@@ -34,12 +241,46 @@ download_button = dbc.Button(
     color="secondary",
     className="mt-1"
 ),
+forecast_horizon = dcc.Dropdown(
+    id='forecast-horizon',
+    options=[{'label':f'{h} meses', 'value':h} for h in HORIZONS],
+    value=HORIZON,
+    clearable=False,
+)
+download_scope = dcc.Dropdown(
+    id='download-scope',
+    options=[{'label':export.SCOPES[k], 'value':k} for k in EXPORT_SCOPES],
+    value='monthly',
+    clearable=False,
+)
+download_format = dcc.Dropdown(
+    id='download-format',
+    options=[{'label':f.upper(), 'value':f}
+             for f in export.available_formats()],
+    value='csv',
+    clearable=False,
+)
 
 ###############################################################################
 # Dasboard layout
 def layout(pathname, auth_data):
     """Define dashboard layout
     """
+    return skeleton()
+
+@functools.lru_cache(maxsize=1)
+def skeleton():
+    """Dashboard components, built once per process
+
+    Figures are filled in by the callbacks, so the layout depends neither on
+    the user nor on the data. Building the empty figures takes most of the
+    module's load time, hence not at import.
+    """
+    graph01 = dcc.Graph(id='venda-plot', figure=sales_skeleton())
+    graph02 = dcc.Graph(id='venda-pie', figure=markets_skeleton())
+    graph03 = dcc.Graph(id='venda-globe', figure=globe_skeleton())
+    graph04 = dcc.Graph(id='venda-forecast', figure=forecast_skeleton())
+
     layout = [
 
         # Filters row
@@ -61,8 +302,22 @@ def layout(pathname, auth_data):
             ]
         ),
 
-        dbc.Row(download_button),
-        dcc.Download(id="download-component"),
+        # Forecast row
+        dbc.Row(
+            [
+                dbc.Col(graph04, width={'size':10, 'offset':0}),
+                dbc.Col(forecast_horizon, className='mt-5'),
+            ]
+        ),
+
+        # Download row
+        dbc.Row(
+            [
+                dbc.Col(download_scope, width=3, className='mt-1'),
+                dbc.Col(download_format, width=2, className='mt-1'),
+                dbc.Col(html.A(download_button, id='download-link')),
+            ]
+        ),
 
         # Hidden div inside the app that stores the intermediate value
         html.Div(id='defaults', style={'display': 'none'},
@@ -76,77 +331,263 @@ def layout(pathname, auth_data):
 
 ###############################################################################
 # Data lookup functions
-def lookup_data(since, until, segments):
+def parse_dates(start_date, end_date):
+    """Convert date-picker's ISO dates to (since, until) YYYYMMDD integers
+    """
+    if start_date and end_date:
+        since = dates.to_key(start_date)
+        until = dates.to_key(end_date)
+        if until < since: until = since
+    else:
+        since = until = 0
 
-    print('INFO: lookup data')
+    return since, until
 
+def parse_range(since, until, segments):
+    """Convert lookup parameters to (since, until, segments), dates and list
+    """
     try:
-        since = dt.datetime.strptime(str(since), '%Y%m%d').date()
-        until = dt.datetime.strptime(str(until), '%Y%m%d').date()
-        segment_list = ', '.join(
-            ["'" + segment + "'" for segment in segments]
-        )
+        since = dates.to_date(since)
+        until = dates.to_date(until)
+        segments = list(segments)
 
     except:
         since = until = dt.date(1900,1,1)
-        segment_list = ''
-
-    conn = sqlite3.connect('./data/sales.db')
-
-    query = f"""
-    SELECT
-        "Order Date" as date
-        ,Segment as segment
-        ,Sales as sales
-        ,Market as market 
-    FROM orders
-    WHERE "Order Date" BETWEEN '{since}' AND '{until}'
-        AND segment in ({segment_list})
-    ORDER BY "Order Date" ASC
+        segments = []
+
+    return since, until, segments
+
+def granularity(since, until):
+    """Time buckets' granularity for the range, see buckets.choose()
     """
-    df = pd.read_sql(query, conn)
-    df['date'] = pd.to_datetime(df['date'])
-    df['year'] = df['date'].apply(lambda x: x.year)
-    df['month'] = df['date'].apply(lambda x: x.month)
-    df['mes'] = df['date'].apply(
-        lambda x: f'{x.month}/{x.year}'
-    )
-    df = df.groupby(['mes','segment', 'market']).agg(
-        {
-            'date':'first',
-            'year':'first',
-            'month':'first',
-            'sales':'sum',
+    since, until, _ = parse_range(since, until, [])
+    return buckets.choose(since, until, MAX_POINTS)
 
-        }
+@cache.memoize('lookup_cube')
+def lookup_cube(since, until, segments):
+    """Time bucket x segment x market x country aggregates, with ISO-3 codes
+
+    Single lookup behind every /sales figure, from the in-memory engine, the
+    backend API or sales.db. Buckets' granularity follows the range's width.
+    """
+    print('INFO: lookup cube')
+
+    bucketing = granularity(since, until)
+    since, until, segments = parse_range(since, until, segments)
+
+    if engine:
+        df = engine.lookup_buckets(since, until, segments, bucketing)
+        return geo.join_countries(df)
+
+    with db.connection(DB_PATH) as conn:
+        return geo.lookup_cube(conn, since, until, segments, bucketing)
+
+def period_sales(cube, granularity):
+    """Sales by period, segment and market, from lookup_cube() rows
+    """
+    df = cube.groupby(['bucket', 'segment', 'market']).agg(
+        {'sales':'sum'}
     ).reset_index()
 
+    df['date'] = pd.to_datetime(df['bucket'])
+    df['period'] = buckets.labels(granularity, df['date'])
+
     df = df[[
-            'date', 'year', 'month', 'mes', 'segment', 'market', 'sales',
+            'date', 'period', 'segment', 'market', 'sales',
         ]].sort_values(
         'date', ascending=True
     )
 
     return df
 
+def lookup_data(since, until, segments):
+    """Sales by period, segment and market
+    """
+    return period_sales(
+        lookup_cube(since, until, segments), granularity(since, until)
+    )
+
+def lookup_countries(since, until, segments):
+    """Per country totals, with ISO-3 codes
+    """
+    return geo.aggregate_countries(lookup_cube(since, until, segments))
+
+###############################################################################
+# Figures cache
+def render_figures(since, until, segments):
+    """FIGURES updates for a view, as JSON strings
+    """
+    bucketing = granularity(since, until)
+    with metrics.phase('query'):
+        cube = lookup_cube(since, until, segments)
+
+    with metrics.phase('transform'):
+        df = period_sales(cube, bucketing)
+        top = geo.aggregate_countries(cube)
+
+    with metrics.phase('figure'):
+        return [
+            plotly.io.json.to_json_plotly(patch) for patch in
+            (patch_sales(df, bucketing), patch_markets(df), patch_globe(top))
+        ]
+
+def lookup_figures(since, until, segments):
+    """FIGURES updates for a view, from figure_cache when possible
+
+    Returns
+    -------
+        list of JSON strings, in FIGURES order
+    """
+    key = canonical_key(since, until, segments)
+    figures = []
+    for figure in FIGURES:
+        hit, value = figure_cache.get('figure', key + (figure,))
+        if not hit:
+            break
+        figures.append(value)
+    else:
+        return figures
+
+    figures = render_figures(since, until, segments)
+    for figure, value in zip(FIGURES, figures):
+        figure_cache.set('figure', key + (figure,), value)
+    return figures
+
+def preset_views():
+    """(since, until, segments) of the period dropdown's presets and of
+    DEFAULTS, every segment selected
+    """
+    periods = [
+        option['value']
+        for option in mod_datepicker.update_period_dropdown(None)
+    ]
+    periods.append(DEFAULTS[0]['period'])
+
+    views = []
+    for period in dict.fromkeys(periods):
+        since, until = period.split(',')
+        views.append((int(since), int(until), SEGMENTS))
+    return views
+
+###############################################################################
+# Forecast
+@cache.memoize('lookup_history')
+def lookup_history(since, until, segments):
+    """Monthly sales by segment, the forecast's history
+    """
+    since, until, segments = parse_range(since, until, segments)
+
+    if engine:
+        df = engine.lookup_buckets(since, until, segments, 'month')
+    else:
+        with db.connection(DB_PATH) as conn:
+            df = rollup.lookup_buckets(conn, since, until, segments, 'month')
+
+    return df.groupby(['bucket', 'segment'])['sales'].sum().reset_index()
+
+def lookup_forecast(segments, horizon):
+    """Monthly sales forecast of the selected segments, following the last
+    month with orders, from forecast_cache when possible
+
+    Entries are keyed by segments, horizon and data version, and discarded
+    when the model file changes.
+
+    Returns
+    -------
+        pd.DataFrame, see forecast.forecast(), None without a model
+    """
+    key = (tuple(sorted(set(segments or []))), horizon, cache.version())
+    hit, df = forecast_cache.get('forecast', key)
+    if hit:
+        return df
+
+    model = forecast.load_model(MODEL_PATH)
+    if model is None:
+        return None
+
+    with metrics.phase('query'):
+        history = lookup_history(
+            dates.day_key(dt.date(dates.FIRST_YEAR, 1, 1)),
+            dates.day_key(dt.date.today()),
+            SEGMENTS,
+        )
+
+    with metrics.phase('inference'):
+        df = forecast.forecast(model, history, list(key[0]), horizon)
+
+    forecast_cache.set('forecast', key, df)
+    return df
+
+# Data version and day the presets were rendered for, by this process
+_warmed = {'version': None, 'checked': 0.0, 'thread': None}
+_warmed_lock = threading.Lock()
+
+def warm_figures():
+    """Render the preset views into figure_cache
+
+    Returns
+    -------
+        Number of views
+    """
+    state = (figure_cache.version(), dt.date.today())
+    views = preset_views()
+    for since, until, segments in views:
+        lookup_figures(since, until, segments)
+    _warmed['version'] = state
+    return len(views)
+
+@app.server.before_request
+def refresh_figures():
+    """Warm figure_cache again, in a background thread, once the data or the
+    day (hence the presets) changed. Checked every FIGURES_CHECK seconds.
+    """
+    now = time.monotonic()
+    with _warmed_lock:
+        if now - _warmed['checked'] < FIGURES_CHECK or \
+                (_warmed['thread'] and _warmed['thread'].is_alive()):
+            return
+        _warmed['checked'] = now
+        if _warmed['version'] == (figure_cache.version(), dt.date.today()):
+            return
+
+        print('INFO: data changed, warming figures cache')
+        _warmed['thread'] = threading.Thread(target=warm_figures, daemon=True)
+        _warmed['thread'].start()
+
 ###############################################################################
 # Callbacks
 ###############################################################################
+def background(outputs):
+    """Options running a callback in the background callback manager
+
+    While running, 'outputs' graphs are dimmed. Jobs are cancelled when the
+    inputs change again (Dash terminates the previous job) or when the user
+    leaves the page. Without a manager, callbacks run in the request thread.
+    """
+    if not BACKGROUND:
+        return {}
+
+    return {
+        'background': True,
+        'running': [
+            (Output(output, 'style'), {'opacity': 0.5}, {'opacity': 1})
+            for output in outputs
+        ],
+        'cancel': [Input('url', 'pathname')],
+    }
+
 
 @app.callback(
     Output(DF_NAME+'-filters', 'children'),
     Input(DF_NAME+'-filters', 'children'),
 )
+@metrics.instrument
 def set_filters(div):
 
     store = dcc.Dropdown(
         id='segment',
-        options=[
-            {'label': 'Consumer', 'value': 'Consumer'},
-            {'label': 'Home Office', 'value': 'Home Office'},
-            {'label': 'Corporate', 'value': 'Corporate'},
-        ],
-        value=['Consumer', 'Home Office', 'Corporate'],
+        options=[{'label': s, 'value': s} for s in SEGMENTS],
+        value=SEGMENTS,
         multi=True
     )
 
@@ -169,190 +610,88 @@ def set_filters(div):
 
     return table_card
 
-@app.callback(
-    Output("download-component", "data"),
-    Input("btn", "n_clicks"),
-    State('date-picker', 'start_date'),
-    State('date-picker', 'end_date'),
-    State('segment', 'value'),
-    prevent_initial_call=True,
-)
-def download_table(n_clicks, start_date, end_date, segment):
-
-    # Parse parameters
-    if start_date and end_date:
-        a = start_date.split('-')
-        since = int(a[0] + a[1] + a[2])
-        a = end_date.split('-')
-        until = int(a[0] + a[1] + a[2])
-        if until < since: until = since
-    else:
-        since = until = 0
-
-    if n_clicks and n_clicks > 0:
-        # Lookup data
-        df = lookup_data(since, until, segment)
-        return dcc.send_data_frame(
-            df.to_csv, "sales_data.csv"
-        )
-    else:
-        return
-
-@app.callback(
-    Output(component_id='venda-plot', component_property='figure'),
+# Link to the file streamed by download() below, built in the browser
+# (assets/sales.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='sales', function_name='download_table'),
+    Output('download-link', 'href'),
     Input('date-picker', 'start_date'),
     Input('date-picker', 'end_date'),
     Input('segment', 'value'),
+    Input('download-scope', 'value'),
+    Input('download-format', 'value'),
 )
-def update_venda_graph(start_date, end_date, segments):
-
-    # Parse parameters
-    if start_date and end_date:
-        a = start_date.split('-')
-        since = int(a[0] + a[1] + a[2])
-        a = end_date.split('-')
-        until = int(a[0] + a[1] + a[2])
-        if until < since: until = since
-    else:
-        since = until = 0
-
-    # Lookup data
-    df = lookup_data(since, until, segments)
-    df = df[[ 'date', 'year', 'month', 'mes', 'segment', 'sales',
-         ]]
-
-    df = df.groupby(['mes','segment',]).agg(
-        {
-            'date':'first',
-            'year':'first',
-            'month':'first',
-            'sales':'sum',
-
-        }
-    ).reset_index().sort_values('date', ascending=True)
-    return px.bar(
-        df, x="mes", y="sales", color="segment", title="Vendas"
-    )
 
 @app.callback(
+    Output(component_id='venda-plot', component_property='figure'),
     Output(component_id='venda-pie', component_property='figure'),
+    Output(component_id='venda-globe', component_property='figure'),
     Input('date-picker', 'start_date'),
     Input('date-picker', 'end_date'),
     Input('segment', 'value'),
+    **background(['venda-plot', 'venda-pie', 'venda-globe']),
 )
-def update_pie(start_date, end_date, segments):
+@metrics.instrument
+def update_sales_figures(start_date, end_date, segments):
+    """Every /sales figure's data, from a single cube lookup
 
+    Figures are rendered once per view and served from figure_cache then.
+    """
     # Parse parameters
-    if start_date and end_date:
-        a = start_date.split('-')
-        since = int(a[0] + a[1] + a[2])
-        a = end_date.split('-')
-        until = int(a[0] + a[1] + a[2])
-        if until < since: until = since
-    else:
-        since = until = 0
+    since, until = parse_dates(start_date, end_date)
 
-    # Lookup data
-    df = lookup_data(since, until, segments)
-    return px.pie(
-            df, values='sales', names='market',
-            color_discrete_sequence=px.colors.sequential.RdBu
-        )
+    figures = lookup_figures(since, until, segments)
+    return tuple(json.loads(figure) for figure in figures)
 
 @app.callback(
-    Output(component_id='venda-globe', component_property='figure'),
-    Input('date-picker', 'start_date'),
-    Input('date-picker', 'end_date'),
+    Output('venda-forecast', 'figure'),
     Input('segment', 'value'),
+    Input('forecast-horizon', 'value'),
 )
-def update_globe(start_date, end_date, segments):
-
-    # Parse parameters
-    if start_date and end_date:
-        a = start_date.split('-')
-        since = int(a[0] + a[1] + a[2])
-        a = end_date.split('-')
-        until = int(a[0] + a[1] + a[2])
-        if until < since: until = since
-    else:
-        since = until = 0
-
-    try:
-        since = dt.datetime.strptime(str(since), '%Y%m%d').date()
-        until = dt.datetime.strptime(str(until), '%Y%m%d').date()
-        segment_list = ', '.join(
-            ["'" + segment + "'" for segment in segments]
-        )
-
-    except:
-        since = until = dt.date(1900,1,1)
-        segment_list = ''
-
-    # Lookup data
-    conn = sqlite3.connect('./data/sales.db')
-    query = f"""
-    SELECT
-        Country
-        ,Sales
-        ,Quantity
-        ,"Order ID"
-    FROM orders
-    WHERE "Order Date" BETWEEN '{since}' AND '{until}'
-        AND segment in ({segment_list})
+@metrics.instrument
+def update_forecast(segments, horizon):
+    """Forecast panel, for the selected segments
     """
-    top = pd.read_sql(query, conn)
-
-    # transform data
-    top = top.groupby('Country').agg(
-        {
-            'Quantity':'sum',
-            'Sales':'sum',
-            'Order ID':'count',
-        }
-    ).sort_values('Sales', ascending=False).reset_index()
-
-    top.rename(index=str,
-              columns={'Order ID':'Orders'},
-              inplace=True)
-
-    all = top['Sales'].sum()
-    top['dist'] = top['Sales'].apply(
-        lambda x: (x/all)
+    if horizon not in HORIZONS:
+        horizon = HORIZON
+
+    df = lookup_forecast(segments, horizon)
+    with metrics.phase('figure'):
+        return patch_forecast(df)
+
+@app.server.route('/sales/cache-stats')
+def cache_stats():
+    """Lookup cache counters, used to size the cache. Figures and forecasts
+    caches' counters are under 'figures' and 'forecast', the latter with
+    this process' model 'inference' timings.
+    """
+    return flask.jsonify(dict(
+        cache.stats(),
+        figures=figure_cache.stats(),
+        forecast=dict(forecast_cache.stats(), inference=forecast.timings),
+    ))
+
+@app.server.route('/sales/download')
+def download():
+    """Stream the sales data export linked by assets/sales.js
+    """
+    args = flask.request.args
+    scope = args.get('scope', 'monthly')
+    fmt = args.get('format', 'csv')
+    try:
+        since = dates.to_date(args['since'])
+        until = dates.to_date(args['until'])
+        blocks = export.export(
+            DB_PATH, scope, fmt, since, until, args.getlist('segment'),
+            chunksize=config.getint('EXPORT', 'CHUNK_SIZE'),
+            engine=export_engine,
         )
-    top['dist'] = (top['dist']*100).map('{:.2f}%'.format)
-
-    pd.options.display.float_format = '{:.2f}'.format
-    top.style.format(
-        {
-            'Sales': lambda x: locale.currency(x,grouping=True)
-        }
-    )
-
-    country = px.data.gapminder()
-    country = country[['country','continent', 'iso_alpha']].drop_duplicates().reset_index(drop=True)
-    country.rename(index=str,
-              columns={'country':'Country'},
-              inplace=True)
-
-
-    top_map = top[:-1].merge(
-        country,
-        on='Country',
-        how='left',
+    except (KeyError, ValueError) as e:
+        flask.abort(400, str(e))
+
+    name = export.filename(scope, fmt, args['since'], args['until'])
+    return flask.Response(
+        blocks,
+        mimetype=export.FORMATS[fmt][1],
+        headers={'Content-Disposition': f'attachment; filename="{name}"'},
     )
-    return px.scatter_geo(
-            top_map,
-            locations="iso_alpha",
-            color="continent",
-            hover_name="Country",
-            size="Sales",
-            projection="natural earth"
-    )
-
-
-
-    return px.pie(
-            df, values='sales', names='market',
-            color_discrete_sequence=px.colors.sequential.RdBu
-        )
-
@@ -0,0 +1,81 @@
+"""vendor.py
+
+Self-hosted third party stylesheets and fonts (Bootstrap, Font Awesome),
+kept under vendor/ and served instead of the public CDNs, so the first paint
+does not depend on them.
+
+URLs carry a fingerprint of the bundle's contents, /vendor/<fingerprint>/...,
+so files are cached by browsers for a year and any change to the bundle
+yields new URLs. Stylesheets reference their fonts by relative URLs, which
+resolve under the same fingerprint.
+
+The module does not depend on the Dash app, whose stylesheets it provides.
+"""
+import hashlib
+import os
+import flask
+
+###############################################################################
+# Settings
+VENDOR_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'vendor'
+)
+URL_PATH = '/vendor'
+
+# Cache lifetime of fingerprinted URLs, in seconds
+MAX_AGE = 365 * 24 * 3600
+
+# Same releases as the CDN fallback in app.py: dash-bootstrap-components'
+# Bootstrap and Font Awesome 5.15.3
+BOOTSTRAP = 'bootstrap-5.3.3/css/bootstrap.min.css'
+FONT_AWESOME = 'fontawesome-free-5.15.3/css/all.min.css'
+
+###############################################################################
+# Fingerprint
+###############################################################################
+def fingerprint(directory=VENDOR_DIR):
+    """Hash of the names and contents of every file under 'directory'
+
+    Returns
+    -------
+        12 hexadecimal digits string
+    """
+    digest = hashlib.sha256()
+    for root, dirs, files in sorted(os.walk(directory)):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, directory).encode())
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+FINGERPRINT = fingerprint()
+
+def url(path):
+    """Fingerprinted URL of a file under VENDOR_DIR
+    """
+    return f'{URL_PATH}/{FINGERPRINT}/{path}'
+
+###############################################################################
+# Route
+###############################################################################
+def register(server):
+    """Serve VENDOR_DIR files on the Flask 'server'
+    """
+
+    @server.route(f'{URL_PATH}/<fingerprint>/<path:filename>')
+    def vendor(fingerprint, filename):
+        """Vendored file, cached for good when the fingerprint is current
+
+        Pages rendered before a bundle update still get the files, but
+        without the long lived cache headers.
+        """
+        current = fingerprint == FINGERPRINT
+        response = flask.send_from_directory(
+            VENDOR_DIR, filename, max_age=MAX_AGE if current else 0,
+        )
+        if current:
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
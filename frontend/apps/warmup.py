@@ -0,0 +1,91 @@
+"""warmup.py
+
+Registers the dashboard pages, loads the shared state and runs the most
+common lookups before serving, so the first requests do not pay for it.
+
+In production the warmup runs in the WSGI server's master process, before
+forking the workers, which then share the loaded data copy-on-write. After
+a failure, ex. sales.db missing or locked, /ready answers 503 and warmup is
+retried in the background until it succeeds (see retry()).
+"""
+import os
+import threading
+import time
+
+# Set once warmup finished
+ready = threading.Event()
+error = None
+
+# Seconds between warmup attempts, after a failure
+RETRY_INTERVAL = 30
+
+# Process running the retry thread
+_retrying = None
+
+def warmup():
+    """Load shared state and prime the lookup cache
+
+    Returns
+    -------
+        True on success
+    """
+    global error
+    import optimize_db
+    from apps import db, forecast, geo, pages
+
+    print('INFO: warming up')
+    start = time.perf_counter()
+    try:
+        # Dashboard pages and their callbacks, before the first request
+        pages.load_all()
+        from apps import sales
+
+        # Warn about dashboard queries not using indexes
+        if os.path.isfile(sales.DB_PATH):
+            with db.connection(sales.DB_PATH) as conn:
+                optimize_db.check_query_plans(conn)
+
+        # Shared state
+        if sales.engine:
+            sales.engine.ensure_loaded()
+        geo.country_dimension()
+
+        # Dashboard's default view
+        since, until = sales.DEFAULTS[0]['period'].split(',')
+        sales.lookup_cube(int(since), int(until), sales.SEGMENTS)
+
+        # Rendered figures of the preset periods
+        sales.warm_figures()
+
+        # Forecast model, shared by the workers, and the default forecast
+        forecast.load_model(sales.MODEL_PATH)
+        sales.lookup_forecast(sales.SEGMENTS, sales.HORIZON)
+
+    except Exception as e:
+        error = str(e)
+        print(f'ERROR: warmup failed ({e})')
+        return False
+
+    error = None
+    ready.set()
+    print(f'INFO: warmup finished in {time.perf_counter() - start:.2f}s')
+    return True
+
+def retry(interval=RETRY_INTERVAL):
+    """Run warmup again every 'interval' seconds in a background thread,
+    until it succeeds. Does nothing once warmup succeeded.
+
+    Threads do not survive fork(), so each worker process starts its own
+    (see gunicorn.conf.py's post_fork).
+    """
+    global _retrying
+    if ready.is_set() or _retrying == os.getpid():
+        return
+    _retrying = os.getpid()
+
+    def run():
+        while not ready.wait(interval):
+            print('INFO: retrying warmup')
+            warmup()
+
+    threading.Thread(target=run, name='warmup-retry', daemon=True).start()
@@ -0,0 +1,238 @@
+/* datepicker.js
+ *
+ * Clientside versions of apps/mod_datepicker.py callbacks. They follow the
+ * Python implementation, so only the resulting start/end dates reach the
+ * server.
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    datepicker: (function () {
+
+        var DAY = 24 * 60 * 60 * 1000;
+        var HIDDEN = {'display': 'none'};
+
+        /* Dates are handled as UTC midnight, so there are no DST shifts */
+        function date(year, month, day) {
+            return new Date(Date.UTC(year, month - 1, day));
+        }
+
+        function addDays(d, days) {
+            return new Date(d.getTime() + days * DAY);
+        }
+
+        function today() {
+            var now = new Date();
+            return date(now.getFullYear(), now.getMonth() + 1, now.getDate());
+        }
+
+        function pad(n) {
+            return (n < 10 ? '0' : '') + n;
+        }
+
+        /* 'YYYYMMDD' */
+        function compact(d) {
+            return d.getUTCFullYear() + pad(d.getUTCMonth() + 1) +
+                pad(d.getUTCDate());
+        }
+
+        /* 'YYYYMMDD' to 'YYYY-MM-DD', the date-picker format */
+        function iso(s) {
+            return s.slice(0, 4) + '-' + s.slice(4, 6) + '-' + s.slice(6, 8);
+        }
+
+        function parse(s) {
+            s = String(s).replace(/-/g, '');
+            return date(+s.slice(0, 4), +s.slice(4, 6), +s.slice(6, 8));
+        }
+
+        /* Sales' DEFAULTS is rendered as a Python literal, ex.:
+         * "({'period': '20110101,20141231', 'is_open': 'true'},)" */
+        function parseDefaults(defaults) {
+            var s = defaults.slice(1, -2)
+                .replace(/'/g, '"')
+                .replace(/\bTrue\b/g, 'true')
+                .replace(/\bFalse\b/g, 'false')
+                .replace(/\bNone\b/g, 'null');
+            return JSON.parse(s);
+        }
+
+        function triggeredId() {
+            var triggered = window.dash_clientside.callback_context.triggered;
+            if (!triggered || !triggered.length || !triggered[0].prop_id) {
+                return 'No clicks yet';
+            }
+            return triggered[0].prop_id.split('.')[0];
+        }
+
+        /* Port of mod_datepicker.lookup_daterange() */
+        function lookupDaterange(desiredPeriod, startDate) {
+            var d = startDate ? parse(startDate) : today();
+            var start = null, end = null;
+
+            if (desiredPeriod.split(',').length === 2) {
+                return desiredPeriod;
+            }
+            if (desiredPeriod.split('_').length !== 2) {
+                return null;
+            }
+
+            var mode = desiredPeriod.split('_')[0];
+            var period = desiredPeriod.split('_')[1];
+            var weekday = d.getUTCDay();    // isoweekday() % 7
+            var y = d.getUTCFullYear(), m = d.getUTCMonth() + 1;
+
+            if (mode === 'this') {
+                if (period === 'day') {
+                    start = end = d;
+                } else if (period === 'week') {
+                    start = addDays(d, -weekday);
+                    end = addDays(start, 6);
+                } else if (period === 'month') {
+                    start = date(y, m, 1);
+                    end = addDays(date(y, m + 1, 1), -1);
+                } else if (period === 'year') {
+                    start = date(y, 1, 1);
+                    end = date(y, 12, 31);
+                }
+            } else if (mode === 'previous') {
+                if (period === 'day') {
+                    start = end = addDays(d, -1);
+                } else if (period === 'week') {
+                    start = addDays(addDays(d, -7), -weekday);
+                    end = addDays(start, 6);
+                } else if (period === 'month') {
+                    start = date(y, m - 1, 1);
+                    end = addDays(date(y, m, 1), -1);
+                } else if (period === 'year') {
+                    start = date(y - 1, 1, 1);
+                    end = date(y - 1, 12, 31);
+                }
+            } else if (mode === 'next') {
+                if (period === 'day') {
+                    start = end = addDays(d, 1);
+                } else if (period === 'week') {
+                    start = addDays(addDays(d, 7), -weekday);
+                    end = addDays(start, 6);
+                } else if (period === 'month') {
+                    start = date(y, m + 1, 1);
+                    end = addDays(date(y, m + 2, 1), -1);
+                } else if (period === 'year') {
+                    start = date(y + 1, 1, 1);
+                    end = date(y + 1, 12, 31);
+                }
+            }
+
+            if (start && end) {
+                return compact(start) + ',' + compact(end);
+            }
+            return null;
+        }
+
+        function shift(direction, period, startDate, endDate, periodType) {
+            if (!startDate) {
+                return [null, null, null, {}, period];
+            }
+            if (!periodType) {
+                return [startDate, endDate, null, {}, period];
+            }
+            var a = lookupDaterange(direction + '_' + periodType,
+                                    startDate.replace(/-/g, '')).split(',');
+            return [iso(a[0]), iso(a[1]), periodType, {}, period];
+        }
+
+        return {
+
+            lookup_daterange: lookupDaterange,
+
+            toggle_collapse: function (n, defaults, isOpen) {
+                if (triggeredId() === 'update-defaults' && defaults) {
+                    defaults = parseDefaults(defaults);
+                    if ('is_open' in defaults) {
+                        return defaults.is_open ? [true, true] : [false, false];
+                    }
+                }
+                if (n) {
+                    return [!isOpen, !isOpen];
+                }
+                return [isOpen, isOpen];
+            },
+
+            update_datepicker: function (period, leftBtn, rightBtn,
+                                         dtPickerBtn, defaults, startDate,
+                                         endDate, periodType) {
+                var buttonId = triggeredId();
+
+                if (buttonId === 'date-picker-container') {
+                    return [startDate, endDate, null, HIDDEN, null];
+                }
+
+                if (buttonId === 'period-dropdown') {
+                    if (!period) {
+                        return [null, null, null, HIDDEN, period];
+                    }
+                    var s = period.split(',')[0], e = period.split(',')[1];
+                    var value = s + ',' + e;
+                    var types = ['day', 'week', 'month', 'year'];
+                    periodType = null;
+                    for (var i = 0; i < types.length; i++) {
+                        if (value === lookupDaterange('this_' + types[i])) {
+                            periodType = types[i];
+                            break;
+                        }
+                    }
+                    return [iso(s), iso(e), periodType,
+                            periodType ? {} : HIDDEN, period];
+                }
+
+                if (buttonId === 'period-left-btn') {
+                    return shift('previous', period, startDate, endDate,
+                                 periodType);
+                }
+
+                if (buttonId === 'period-right-btn') {
+                    return shift('next', period, startDate, endDate,
+                                 periodType);
+                }
+
+                if (buttonId === 'update-defaults') {
+                    if (!defaults) {
+                        return window.dash_clientside.no_update;
+                    }
+                    defaults = parseDefaults(defaults);
+                    var p = defaults.period;
+                    var a = p ? lookupDaterange(p) : null;
+                    if (!a) {
+                        return [null, null, null, HIDDEN, null];
+                    }
+                    a = a.split(',');
+                    if (p.split('_').length === 2) {
+                        periodType = p.split('_')[1];
+                    }
+                    return [iso(a[0]), iso(a[1]), periodType, {},
+                            a.join(',')];
+                }
+
+                return [null, null, null, HIDDEN, period];
+            },
+
+            update_period_dropdown: function (options) {
+                if (options && options.length) {
+                    return options;
+                }
+                var periods = [
+                    ['Hoje', 'this_day'],
+                    ['Semana atual', 'this_week'],
+                    ['Mês atual', 'this_month'],
+                    ['Ano atual', 'this_year'],
+                ];
+                return periods.map(function (p) {
+                    var value = lookupDaterange(p[1]);
+                    return {'label': p[0], 'value': value, 'title': value};
+                });
+            },
+
+            set_defaults: function (defaults) {
+                return defaults;
+            }
+        };
+    })()
+});
@@ -0,0 +1,38 @@
+/* sales.js
+ *
+ * Clientside callbacks of apps/sales.py, for outputs the browser can build
+ * without a server round trip.
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    sales: (function () {
+
+        /* Date-picker's 'YYYY-MM-DD' to a YYYYMMDD integer */
+        function toKey(s) {
+            return parseInt(String(s).slice(0, 10).replace(/-/g, ''), 10);
+        }
+
+        return {
+
+            /* Port of sales.parse_dates() plus the /sales/download URL,
+             * streamed by sales.download() */
+            download_table: function (startDate, endDate, segments, scope,
+                                      fmt) {
+                var since = 0, until = 0;
+                if (startDate && endDate) {
+                    since = toKey(startDate);
+                    until = Math.max(toKey(endDate), since);
+                }
+
+                var params = new URLSearchParams();
+                params.append('since', since);
+                params.append('until', until);
+                (segments || []).forEach(function (segment) {
+                    params.append('segment', segment);
+                });
+                params.append('scope', scope);
+                params.append('format', fmt);
+                return '/sales/download?' + params.toString();
+            }
+        };
+    })()
+});
@@ -0,0 +1,25 @@
+"""benchmarks
+
+Data path benchmarks of the sales dashboard, against synthetic 'orders'
+databases of 100k, 1M and 10M rows:
+
+    python -m benchmarks.generate [--sizes 100k 1M 10M]
+    python -m benchmarks.run [--sizes 100k 1M] -o results.json
+    python -m benchmarks.compare before.json after.json
+
+and an HTTP load test replaying user sessions against a local instance:
+
+    python -m benchmarks.loadtest [--users 10] [--duration 60] -o load.json
+"""
+import subprocess
+
+def commit():
+    """Current git commit, if any
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,70 @@
+"""compare.py
+
+Compares two benchmarks.run result files, ex. from two commits.
+
+Usage:
+
+    python -m benchmarks.compare BEFORE.json AFTER.json [--threshold 1.2]
+
+Exits with status 1 when any case got slower than the threshold ratio.
+"""
+import argparse
+import json
+import sys
+
+###############################################################################
+# Settings
+THRESHOLD = 1.2     # median time ratio (after / before) flagged as regression
+
+###############################################################################
+# Comparison
+###############################################################################
+def compare(before, after, threshold=THRESHOLD):
+    """Median time ratios of the cases found in both result documents
+
+    Returns
+    -------
+        list of (case, before, after, ratio, regression) tuples, times in
+        seconds
+    """
+    rows = []
+    for case, stats in after['results'].items():
+        if case not in before['results']:
+            continue
+        old = before['results'][case]['median']
+        new = stats['median']
+        ratio = new / old if old else float('inf')
+        rows.append((case, old, new, ratio, ratio > threshold))
+    return rows
+
+def report(rows):
+    """Text table of compare() rows
+    """
+    width = max([len(r[0]) for r in rows] + [4])
+    lines = [f'{"case":<{width}}  before(ms)   after(ms)   ratio']
+    for case, old, new, ratio, regression in rows:
+        lines.append(
+            f'{case:<{width}}  {old * 1000:>10.1f}  {new * 1000:>10.1f}  '
+            f'{ratio:>6.2f}' + ('  REGRESSION' if regression else '')
+        )
+    return '\n'.join(lines)
+
+###############################################################################
+## Main
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Compare benchmark results')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    rows = compare(before, after, args.threshold)
+    print(f'{before["commit"]} -> {after["commit"]}')
+    print(report(rows))
+    sys.exit(1 if any(r[4] for r in rows) else 0)
@@ -0,0 +1,174 @@
+"""generate.py
+
+Synthetic 'orders' databases, following sales.db schema, prepared as in
+production (rollups, country dimension, indexes and statistics).
+
+Usage:
+
+    python -m benchmarks.generate [--sizes 100k 1M 10M] [--dir DIR]
+"""
+import argparse
+import os
+import sqlite3
+import time
+import numpy as np
+import optimize_db
+from apps import geo, rollup
+
+###############################################################################
+# Settings
+SIZES = {
+    '100k': 100_000,
+    '1M': 1_000_000,
+    '10M': 10_000_000,
+}
+
+DATA_DIR = './data/benchmarks'
+
+FIRST_DAY = '2011-01-01'
+DAYS = 4 * 365 + 1              # 2011 to 2014
+
+SEGMENTS = ['Consumer', 'Corporate', 'Home Office']
+SEGMENT_SHARES = [0.52, 0.30, 0.18]
+
+# Markets by country (or by continent)
+MARKETS = {
+    'United States': 'US',
+    'Canada': 'Canada',
+    'Americas': 'LATAM',
+    'Europe': 'EU',
+    'Africa': 'Africa',
+    'Asia': 'APAC',
+    'Oceania': 'APAC',
+}
+
+LINES_PER_ORDER = 2
+CHUNK_SIZE = 500_000            # rows inserted at once
+
+###############################################################################
+# Generator
+###############################################################################
+def path(size, data_dir=DATA_DIR):
+    """Database location for a SIZES key
+    """
+    return os.path.join(data_dir, f'sales_{size}.db')
+
+def countries():
+    """(country, market, weight) arrays, as named in 'orders'
+
+    Gapminder names with an 'orders' alias (ex.: 'Korea, Rep.') are left
+    out, so each country appears once. Weights follow the countries' GDP.
+    """
+    import plotly.express as px
+
+    dim = geo.country_dimension()
+    dim = dim[~dim['country'].isin(geo.ALIASES.values())]
+    market = dim['country'].map(MARKETS).fillna(dim['continent'].map(MARKETS))
+
+    gapminder = px.data.gapminder().query('year == 2007')
+    gdp = (gapminder['pop'] * gapminder['gdpPercap']).groupby(
+        gapminder['iso_alpha']
+    ).sum()
+    weight = dim['iso_alpha'].map(gdp)
+    weight = weight.fillna(weight.min())
+
+    return (
+        dim['country'].to_numpy(dtype=str),
+        market.to_numpy(dtype=str),
+        (weight / weight.sum()).to_numpy(),
+    )
+
+def orders(n_rows, seed=42, first_row=0):
+    """Synthetic 'orders' rows
+
+    Countries are drawn by GDP, sales follow a log-normal distribution.
+
+    Returns
+    -------
+        dict of column arrays
+    """
+    rnd = np.random.default_rng(seed)
+    names, markets, weights = countries()
+    place = rnd.choice(len(names), n_rows, p=weights)
+
+    days = np.datetime64(FIRST_DAY) + rnd.integers(0, DAYS, n_rows)
+    row_id = np.arange(first_row, first_row + n_rows)
+
+    return {
+        'Row ID': row_id + 1,
+        'Order ID': np.char.add(
+            'ORD-', (row_id // LINES_PER_ORDER).astype(str)
+        ),
+        'Order Date': np.char.add(
+            np.datetime_as_string(days, unit='D'), ' 00:00:00'
+        ),
+        'Segment': rnd.choice(SEGMENTS, n_rows, p=SEGMENT_SHARES),
+        'Country': names[place],
+        'Market': markets[place],
+        'Sales': np.round(rnd.lognormal(4.5, 1.2, n_rows), 2),
+        'Quantity': rnd.integers(1, 15, n_rows),
+    }
+
+def generate(db_path, n_rows, seed=42):
+    """Create a prepared 'orders' database of 'n_rows' rows
+    """
+    print(f'INFO: generating {db_path} ({n_rows} rows)')
+    start = time.perf_counter()
+
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("""
+        CREATE TABLE orders (
+            "Row ID" INTEGER,
+            "Order ID" TEXT,
+            "Order Date" TIMESTAMP,
+            "Segment" TEXT,
+            "Country" TEXT,
+            "Market" TEXT,
+            "Sales" REAL,
+            "Quantity" INTEGER
+        )""")
+        for first in range(0, n_rows, CHUNK_SIZE):
+            chunk = orders(
+                min(CHUNK_SIZE, n_rows - first), seed=seed + first,
+                first_row=first,
+            )
+            conn.executemany(
+                'INSERT INTO orders VALUES (?,?,?,?,?,?,?,?)',
+                zip(*(chunk[c].tolist() for c in chunk)),
+            )
+    conn.close()
+
+    rollup.build_rollups(db_path)
+    geo.build_dim_country(db_path)
+    optimize_db.optimize(db_path)
+
+    print(f'INFO: {db_path} ready in {time.perf_counter() - start:.1f}s')
+    return db_path
+
+def ensure(size, data_dir=DATA_DIR):
+    """Database for a SIZES key, generated on first use
+    """
+    db_path = path(size, data_dir)
+    if not os.path.exists(db_path):
+        generate(db_path, SIZES[size])
+    return db_path
+
+###############################################################################
+## Main
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic sales databases'
+    )
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES),
+                        default=list(SIZES))
+    parser.add_argument('--dir', default=DATA_DIR)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        generate(path(size, args.dir), SIZES[size])
@@ -0,0 +1,688 @@
+"""loadtest.py
+
+HTTP load test of the sales dashboard: N simulated users replay recorded
+/sales sessions against a local app instance, sending the same
+/_dash-update-component requests a browser would, and the throughput and
+latency percentiles of every callback are reported.
+
+Each user emulates the browser's side of Dash: it reads the callback graph
+from /_dash-dependencies, fires the callbacks of the components a response
+mounts, chains callbacks whose inputs changed and polls background
+callbacks until their result is ready. Callbacks running in the browser
+(clientside) are not sent; their outputs are taken from the recording.
+Callback latencies are measured from the first request to the final
+response, polls included, as a user would wait for them.
+
+The app is started with the chosen server and settings, so serving modes
+and configurations can be compared, or an already running instance is
+targeted with --url:
+
+    python -m benchmarks.loadtest --users 20 --duration 60 -o gunicorn.json
+    python -m benchmarks.loadtest --server flask -o flask.json
+    python -m benchmarks.loadtest --set CACHE.ENABLED=False -o nocache.json
+    python -m benchmarks.compare gunicorn.json nocache.json
+"""
+import argparse
+import configparser
+import datetime as dt
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import numpy as np
+import requests
+from benchmarks import commit, generate
+
+###############################################################################
+# Settings
+HOST = '127.0.0.1'
+PORT = 8060
+READY_TIMEOUT = 300             # seconds to wait for the app's warmup
+REQUEST_TIMEOUT = 120
+
+# Recorded sessions, as (action, inputs, clientside) steps: 'inputs' are the
+# properties the user changed, 'clientside' the outputs of the callbacks the
+# browser ran itself. 'download' fetches the file behind the download link,
+# which the browser builds itself too (see download_href()).
+def recorded_sessions(today=None):
+    """Recorded /sales sessions, on 'today' (default: the current date)
+
+    The period dropdown's presets and its arrows move relative to today, as
+    in the browser, while past ranges are picked in the date picker, which
+    hides the arrows.
+    """
+    today = today or dt.date.today()
+
+    def months(offset):
+        """First and last days of the month 'offset' months from today's"""
+        first = dt.date(today.year + (today.month - 1 + offset) // 12,
+                        (today.month - 1 + offset) % 12 + 1, 1)
+        after = dt.date(first.year + first.month // 12,
+                        first.month % 12 + 1, 1)
+        return first, after - dt.timedelta(days=1)
+
+    def years(offset):
+        """First and last days of the year 'offset' years from today's"""
+        year = today.year + offset
+        return dt.date(year, 1, 1), dt.date(year, 12, 31)
+
+    def shown(first, last, period_type=None):
+        """Date picker outputs showing [first, last]"""
+        outputs = {
+            'date-picker.start_date': first.isoformat(),
+            'date-picker.end_date': last.isoformat(),
+        }
+        if period_type:
+            outputs.update({'period-type.children': period_type,
+                            'period-arrows.style': {}})
+        return outputs
+
+    def preset(first, last):
+        """Period dropdown value of a preset"""
+        return f'{first:%Y%m%d},{last:%Y%m%d}'
+
+    # Opening the date picker clears the period, and hides the arrows
+    picker = {'period-type.children': None,
+              'period-arrows.style': {'display': 'none'},
+              'period-dropdown.value': None}
+
+    return {
+        'browse': [
+            ('open', {'url.pathname': '/sales'},
+             shown(dt.date(2011, 1, 1), dt.date(2014, 12, 31))),
+            ('picker', {'date-picker-container.n_clicks': 1}, picker),
+            ('start', {'date-picker.start_date': '2013-01-01'}, {}),
+            ('end', {'date-picker.end_date': '2013-12-31'}, {}),
+            ('period', {'period-dropdown.value': preset(*years(0))},
+             shown(*years(0), 'year')),
+            ('previous', {'period-left-btn.n_clicks': 1},
+             shown(*years(-1), 'year')),
+            ('previous', {'period-left-btn.n_clicks': 2},
+             shown(*years(-2), 'year')),
+            ('segments', {'segment.value': ['Consumer', 'Corporate']}, {}),
+            ('download', {}, {}),
+        ],
+        'drilldown': [
+            ('open', {'url.pathname': '/sales'},
+             shown(dt.date(2011, 1, 1), dt.date(2014, 12, 31))),
+            ('segments', {'segment.value': ['Home Office']}, {}),
+            ('period', {'period-dropdown.value': preset(*months(0))},
+             shown(*months(0), 'month')),
+            ('previous', {'period-left-btn.n_clicks': 1},
+             shown(*months(-1), 'month')),
+            ('next', {'period-right-btn.n_clicks': 1},
+             shown(*months(0), 'month')),
+            ('picker', {'date-picker-container.n_clicks': 1}, picker),
+            ('start', {'date-picker.start_date': '2014-03-01'}, {}),
+            ('end', {'date-picker.end_date': '2014-03-31'}, {}),
+            ('segments', {'segment.value': ['Home Office', 'Consumer']}, {}),
+            ('download', {}, {}),
+        ],
+    }
+
+SESSIONS = recorded_sessions()
+
+# Report names of the callbacks, by first output
+NAMES = {
+    'dashboard.children': 'display_dashboard',
+    'login-btn.children': 'update_login_btn',
+    'vendas-filters.children': 'set_filters',
+    'venda-plot.figure': 'update_sales_figures',
+    'date-picker.start_date': 'update_datepicker',
+    'url.id': 'cancel_background',
+}
+
+###############################################################################
+# Simulated user
+###############################################################################
+def parse_outputs(output):
+    """'id.prop' strings of a /_dash-dependencies output
+    """
+    if output.startswith('..'):
+        outputs = output[2:-2].split('...')
+    else:
+        outputs = [output]
+    return [o.split('@')[0] for o in outputs]
+
+def prop(name):
+    """{'id', 'property'} dict of an 'id.prop' string
+    """
+    component, _, property = name.rpartition('.')
+    return {'id': component, 'property': property}
+
+def components(tree):
+    """(id, props) of every component with an id in a layout JSON tree
+    """
+    if isinstance(tree, list):
+        for item in tree:
+            yield from components(item)
+    elif isinstance(tree, dict) and 'props' in tree and 'type' in tree:
+        props = tree['props']
+        if isinstance(props.get('id'), str):
+            yield props['id'], props
+        for value in props.values():
+            yield from components(value)
+
+def download_href(props):
+    """/sales download link of the current filters, as assets/sales.js
+    builds it
+    """
+    start, end = props.get('date-picker.start_date'), \
+        props.get('date-picker.end_date')
+    since = until = 0
+    if start and end:
+        since = int(start[:10].replace('-', ''))
+        until = max(int(end[:10].replace('-', '')), since)
+    query = urllib.parse.urlencode({
+        'since': since,
+        'until': until,
+        'segment': props.get('segment.value') or [],
+        'scope': props.get('download-scope.value'),
+        'format': props.get('download-format.value'),
+    }, doseq=True)
+    return f'/sales/download?{query}'
+
+class User:
+    """Browser session replaying recorded steps
+
+    Parameters
+    ----------
+        url | String
+            App's base URL
+
+        dependencies | List
+            /_dash-dependencies contents
+
+        layout | Dict
+            /_dash-layout contents
+
+        record | Callable
+            Called with (name, seconds, requests, error) for every callback
+            and download
+    """
+
+    def __init__(self, url, dependencies, layout, record):
+        self.url = url
+        self.layout = layout
+        self.record = record
+        self.http = requests.Session()
+        self.callbacks = []
+        for dep in dependencies:
+            self.callbacks.append({
+                'dep': dep,
+                'outputs': parse_outputs(dep['output']),
+                'inputs': [f'{i["id"]}.{i["property"]}'
+                           for i in dep['inputs']],
+                'state': [f'{s["id"]}.{s["property"]}'
+                          for s in dep['state']],
+            })
+        self.reset()
+
+    def reset(self):
+        """Start over from the app's initial layout
+        """
+        self.props = {}
+        self.mounted = set()
+        return self.mount(self.layout)
+
+    ###########################################################################
+    # Callback graph
+    def is_mounted(self, callback):
+        """Whether the callback's inputs and outputs are all in the page
+        """
+        return all(p.rpartition('.')[0] in self.mounted
+                   for p in callback['inputs'] + callback['outputs'])
+
+    def triggered(self, changed):
+        """Indexes of the callbacks with a changed input
+        """
+        return [i for i, c in enumerate(self.callbacks)
+                if set(c['inputs']) & changed and self.is_mounted(c)]
+
+    def initial(self, ids):
+        """Indexes of the callbacks fired when 'ids' components mount
+        """
+        result = []
+        for i, c in enumerate(self.callbacks):
+            if c['dep'].get('prevent_initial_call'):
+                continue
+            touched = {p.rpartition('.')[0]
+                       for p in c['inputs'] + c['outputs']}
+            if touched & ids and self.is_mounted(c):
+                result.append(i)
+        return result
+
+    def mount(self, tree):
+        """Register the components of a new layout chunk
+
+        Returns
+        -------
+            set of mounted ids
+        """
+        ids = set()
+        for component, props in components(tree):
+            ids.add(component)
+            for key, value in props.items():
+                if key not in ('id', 'children'):
+                    self.props[f'{component}.{key}'] = value
+        self.mounted |= ids
+        return ids
+
+    def dispatch(self, changed, clientside=None, mounted=()):
+        """Run the callbacks chained from the 'changed' properties, and the
+        initial callbacks of the 'mounted' component ids, in the browser's
+        order: a callback waits for the pending callbacks updating its inputs
+        """
+        clientside = clientside or {}
+        pending = dict.fromkeys(
+            self.triggered(changed) + self.initial(set(mounted))
+        )
+
+        while pending:
+            outputs = {i: set(self.callbacks[i]['outputs']) for i in pending}
+            ready = [
+                i for i in pending
+                if not any(set(self.callbacks[i]['inputs']) & outputs[j]
+                           for j in pending if j != i)
+            ] or list(pending)
+
+            for i in ready:
+                del pending[i]
+                callback = self.callbacks[i]
+                if callback['dep'].get('clientside_function'):
+                    values = {o: clientside[o] for o in callback['outputs']
+                              if o in clientside}
+                    self.props.update(values)
+                    new = set(values)
+                    ids = set()
+                else:
+                    new, ids = self.call(callback)
+
+                # Callbacks are not fired again by their own outputs
+                pending.update(dict.fromkeys(
+                    j for j in self.triggered(new) + self.initial(ids)
+                    if j != i
+                ))
+
+    ###########################################################################
+    # Requests
+    def call(self, callback):
+        """Send a server callback, polling background ones
+
+        Returns
+        -------
+            (changed, mounted) sets of 'id.prop' names and component ids
+        """
+        dep = callback['dep']
+        outputs = [prop(o) for o in callback['outputs']]
+        body = {
+            'output': dep['output'],
+            'outputs': outputs if dep['output'].startswith('..') \
+                else outputs[0],
+            'inputs': [dict(prop(p), value=self.props.get(p))
+                       for p in callback['inputs']],
+            'changedPropIds': [],
+            'state': [dict(prop(p), value=self.props.get(p))
+                      for p in callback['state']],
+        }
+        name = NAMES.get(callback['outputs'][0], callback['outputs'][0])
+        interval = ((dep.get('long') or {}).get('interval') or 1000) / 1000
+
+        start = time.perf_counter()
+        n_requests, error = 0, False
+        params = {}
+        try:
+            while True:
+                response = self.http.post(
+                    f'{self.url}/_dash-update-component', json=body,
+                    params=params, timeout=REQUEST_TIMEOUT,
+                )
+                n_requests += 1
+                if response.status_code == 204:      # PreventUpdate
+                    data = {}
+                    break
+                response.raise_for_status()
+                data = response.json()
+                if 'cacheKey' in data and 'job' in data:
+                    # Background callback started, then poll for its result
+                    params = {'cacheKey': data['cacheKey'],
+                              'job': data['job']}
+                elif 'response' in data or not params:
+                    break
+                time.sleep(interval)
+        except (requests.RequestException, ValueError):
+            error = True
+            data = {}
+        self.record(name, time.perf_counter() - start, n_requests, error)
+
+        changed, ids = set(), set()
+        for component, values in data.get('response', {}).items():
+            for key, value in values.items():
+                changed.add(f'{component}.{key}')
+                self.props[f'{component}.{key}'] = value
+                if key == 'children':
+                    ids |= self.mount(value)
+        return changed, ids
+
+    def download(self):
+        """Fetch the file behind the current download link
+        """
+        href = self.props['download-link.href'] = download_href(self.props)
+
+        start = time.perf_counter()
+        error = False
+        try:
+            with self.http.get(f'{self.url}{href}', stream=True,
+                               timeout=REQUEST_TIMEOUT) as response:
+                response.raise_for_status()
+                for _ in response.iter_content(65536):
+                    pass
+        except requests.RequestException:
+            error = True
+        self.record('download', time.perf_counter() - start, 1, error)
+
+    def replay(self, session, think=0):
+        """Run a recorded session from scratch
+
+        Parameters
+        ----------
+            session | List
+                SESSIONS value
+
+            think | Float
+                Mean pause between steps, in seconds
+        """
+        # The page loads with the first step's URL
+        mounted = self.reset()
+        for action, inputs, clientside in session:
+            if action == 'download':
+                self.download()
+            else:
+                self.props.update(inputs)
+                self.dispatch(set(inputs), clientside, mounted)
+                mounted = ()
+            if think:
+                time.sleep(random.uniform(0.5, 1.5) * think)
+
+###############################################################################
+# App server
+###############################################################################
+def write_config(overrides, config_file='config.ini'):
+    """Copy of config.ini with 'SECTION.KEY=VALUE' overrides
+
+    Returns
+    -------
+        temporary file path
+    """
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read(config_file)
+    for item in overrides:
+        key, _, value = item.partition('=')
+        section, _, option = key.partition('.')
+        config[section][option] = value
+
+    fd, path = tempfile.mkstemp(prefix='loadtest-', suffix='.ini')
+    with os.fdopen(fd, 'w') as f:
+        config.write(f)
+    return path
+
+def wait_ready(url, timeout=READY_TIMEOUT, process=None):
+    """Wait for the app's readiness probe
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process and process.poll() is not None:
+            raise RuntimeError('app server exited')
+        try:
+            if requests.get(f'{url}/ready', timeout=5).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f'{url} not ready after {timeout}s')
+
+def start_server(server='gunicorn', port=PORT, workers=None, threads=None,
+                 config_file=None, log_path=None):
+    """Start the app, as 'entrypoint.sh serve' (gunicorn) or on Flask's
+    threaded development server, and wait for its warmup
+
+    Parameters
+    ----------
+        config_file | String
+            Settings file instead of config.ini, see write_config()
+
+    Returns
+    -------
+        subprocess.Popen
+    """
+    env = dict(os.environ)
+    if config_file:
+        env['CONFIG_FILE'] = config_file
+
+    if server == 'gunicorn':
+        cmd = ['gunicorn', '-c', 'gunicorn.conf.py',
+               '--bind', f'{HOST}:{port}']
+        if workers:
+            cmd += ['--workers', str(workers)]
+        if threads:
+            cmd += ['--threads', str(threads)]
+        cmd.append('wsgi:server')
+    else:
+        cmd = [sys.executable, '-c',
+               'from wsgi import server; '
+               f'server.run(host="{HOST}", port={port}, threaded=True)']
+
+    log = open(log_path, 'w') if log_path else subprocess.DEVNULL
+    process = subprocess.Popen(cmd, env=env, stdout=log,
+                               stderr=subprocess.STDOUT)
+    try:
+        wait_ready(f'http://{HOST}:{port}', process=process)
+    except Exception:
+        stop_server(process)
+        raise
+    return process
+
+def stop_server(process):
+    """Stop a start_server() process
+    """
+    process.terminate()
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+###############################################################################
+# Load test
+###############################################################################
+def percentiles(times):
+    """Latency statistics of a list of seconds
+    """
+    p50, p95, p99 = np.percentile(times, [50, 95, 99])
+    return {
+        'median': float(p50),
+        'p50': float(p50),
+        'p95': float(p95),
+        'p99': float(p99),
+        'mean': float(np.mean(times)),
+        'max': float(np.max(times)),
+    }
+
+def load_test(url, users=10, duration=60, think=1.0, sessions=None):
+    """Replay SESSIONS with 'users' concurrent users for 'duration' seconds
+
+    Users start with a random session, then go through them in turn. The
+    sessions running at the deadline are completed.
+
+    Returns
+    -------
+        (results, throughput) dicts: per callback statistics and the run's
+        totals
+    """
+    sessions = [SESSIONS[s] for s in sessions or SESSIONS]
+    dependencies = requests.get(
+        f'{url}/_dash-dependencies', timeout=REQUEST_TIMEOUT
+    ).json()
+    layout = requests.get(
+        f'{url}/_dash-layout', timeout=REQUEST_TIMEOUT
+    ).json()
+
+    samples = []
+    counts = {'sessions': 0, 'requests': 0}
+    lock = threading.Lock()
+
+    def record(name, seconds, n_requests, error):
+        with lock:
+            samples.append((name, seconds, error))
+            counts['requests'] += n_requests
+
+    # Untimed session, so that lazy initializations do not count
+    User(url, dependencies, layout, lambda *args: None).replay(sessions[0])
+
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def simulate():
+        user = User(url, dependencies, layout, record)
+        turn = random.randrange(len(sessions))
+        while time.perf_counter() < deadline:
+            user.replay(sessions[turn % len(sessions)], think)
+            turn += 1
+            with lock:
+                counts['sessions'] += 1
+
+    threads = [threading.Thread(target=simulate) for _ in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    results = {}
+    for name in sorted({s[0] for s in samples}):
+        times = [s[1] for s in samples if s[0] == name]
+        stats = percentiles(times)
+        stats['count'] = len(times)
+        stats['errors'] = sum(s[2] for s in samples if s[0] == name)
+        stats['per_second'] = len(times) / elapsed
+        results[name] = stats
+
+    throughput = {
+        'elapsed': elapsed,
+        'callbacks': len(samples) / elapsed,
+        'requests': counts['requests'] / elapsed,
+        'sessions': counts['sessions'] / elapsed,
+        'errors': sum(s[2] for s in samples),
+    }
+    return results, throughput
+
+def report(results, throughput):
+    """Text table of load_test() results
+    """
+    width = max([len(name) for name in results] + [8])
+    lines = [
+        f'{"callback":<{width}}  {"count":>6}  {"err":>4}  {"req/s":>7}  '
+        f'{"p50(ms)":>8}  {"p95(ms)":>8}  {"p99(ms)":>8}'
+    ]
+    for name, s in results.items():
+        lines.append(
+            f'{name:<{width}}  {s["count"]:>6}  {s["errors"]:>4}  '
+            f'{s["per_second"]:>7.2f}  {s["p50"] * 1000:>8.1f}  '
+            f'{s["p95"] * 1000:>8.1f}  {s["p99"] * 1000:>8.1f}'
+        )
+    lines.append(
+        f'throughput: {throughput["callbacks"]:.2f} callbacks/s, '
+        f'{throughput["requests"]:.2f} requests/s, '
+        f'{throughput["sessions"]:.2f} sessions/s, '
+        f'{throughput["errors"]} errors in {throughput["elapsed"]:.1f}s'
+    )
+    return '\n'.join(lines)
+
+###############################################################################
+## Main
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Load test the dashboard with simulated users'
+    )
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=60,
+                        help='seconds')
+    parser.add_argument('--think', type=float, default=1.0,
+                        help='mean pause between steps, in seconds')
+    parser.add_argument('--sessions', nargs='+', choices=list(SESSIONS))
+    parser.add_argument('--url',
+                        help='running app to test, instead of starting one')
+    parser.add_argument('--server', choices=['gunicorn', 'flask'],
+                        default='gunicorn')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int,
+                        help='gunicorn workers, default: config.ini')
+    parser.add_argument('--threads', type=int,
+                        help='gunicorn threads, default: config.ini')
+    parser.add_argument('--set', action='append', default=[],
+                        metavar='SECTION.KEY=VALUE',
+                        help='config.ini override, ex.: CACHE.ENABLED=False')
+    parser.add_argument('--dir', default=generate.DATA_DIR)
+    parser.add_argument('-o', '--output',
+                        help='results file, default: '
+                             'DIR/loadtest-<commit>.json')
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    process = None
+    config_file = write_config(args.set) if args.set else None
+    url = args.url
+    try:
+        if not url:
+            print(f'INFO: starting {args.server} server')
+            process = start_server(
+                args.server, args.port, args.workers, args.threads,
+                config_file,
+                log_path=os.path.join(args.dir, 'loadtest-server.log'),
+            )
+            url = f'http://{HOST}:{args.port}'
+
+        print(f'INFO: {args.users} users for {args.duration}s on {url}')
+        results, throughput = load_test(
+            url, args.users, args.duration, args.think, args.sessions
+        )
+    finally:
+        if process:
+            stop_server(process)
+        if config_file:
+            os.remove(config_file)
+
+    print(report(results, throughput))
+
+    document = {
+        'commit': commit(),
+        'created': dt.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {
+            'url': args.url,
+            'server': None if args.url else args.server,
+            'workers': args.workers,
+            'threads': args.threads,
+            'overrides': args.set,
+            'users': args.users,
+            'duration': args.duration,
+            'think': args.think,
+        },
+        'throughput': throughput,
+        'results': results,
+    }
+    output = args.output or os.path.join(
+        args.dir, f'loadtest-{document["commit"] or "local"}.json'
+    )
+    with open(output, 'w') as f:
+        json.dump(document, f, indent=2)
+    print(f'INFO: results written to {output}')
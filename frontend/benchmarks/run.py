@@ -0,0 +1,188 @@
+"""run.py
+
+Times the sales dashboard data path against the synthetic databases and
+writes the results as JSON, to be compared between commits with
+benchmarks.compare.
+
+Cases, for each database size and date range:
+
+    lookup_data     cube lookup (sql or memory engine) + period aggregation
+    update_globe    per country aggregation + globe update
+    figures         every /sales figure update, serialized to JSON
+    download_table  monthly and raw CSV exports, fully streamed
+
+Usage:
+
+    python -m benchmarks.run [--sizes 100k 1M] [--repeat 5] [-o FILE]
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import statistics
+import time
+import plotly
+from apps import buckets, db, export, geo, sales
+from apps.engine import SalesEngine
+from benchmarks import commit, generate
+
+###############################################################################
+# Settings
+RANGES = {
+    # name: (since, until), the bucket granularity follows the width
+    'all': (dt.date(2011, 1, 1), dt.date(2014, 12, 31)),
+    'year': (dt.date(2013, 1, 1), dt.date(2013, 12, 31)),
+    'month': (dt.date(2013, 3, 1), dt.date(2013, 3, 31)),
+}
+
+ENGINES = ['sql', 'memory']
+
+###############################################################################
+# Helper functions
+###############################################################################
+def timeit(func, repeat):
+    """Run func() 'repeat' times
+
+    Returns
+    -------
+        (stats, result) tuple, where stats holds the 'min', 'median',
+        'mean' and 'max' run times in seconds and result is the last
+        func() return value
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+
+    stats = {
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'max': max(times),
+        'repeat': repeat,
+    }
+    return stats, result
+
+def to_json(value):
+    """Serialize a callback output as Dash does
+    """
+    return json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder)
+
+###############################################################################
+# Benchmarks
+###############################################################################
+def lookup_cube(source, since, until, segments, granularity):
+    """sales.lookup_cube() without the cache, from a SalesEngine or from
+    a database path
+    """
+    if isinstance(source, SalesEngine):
+        return geo.join_countries(
+            source.lookup_buckets(since, until, segments, granularity)
+        )
+
+    with db.connection(source) as conn:
+        return geo.lookup_cube(conn, since, until, segments, granularity)
+
+def bench_database(db_path, repeat, segments=sales.SEGMENTS):
+    """Time every case against a database
+
+    Returns
+    -------
+        dict mapping '<engine>/<case>/<range>' names to timing stats
+    """
+    results = {}
+    engine = SalesEngine(db_path)
+
+    stats, _ = timeit(engine.load, 1)
+    results['memory/engine_load'] = stats
+
+    for name, (since, until) in RANGES.items():
+        granularity = buckets.choose(since, until, sales.MAX_POINTS)
+
+        for engine_name in ENGINES:
+            def lookup_data():
+                cube = lookup_cube(
+                    engine if engine_name == 'memory' else db_path,
+                    since, until, segments, granularity,
+                )
+                return cube, sales.period_sales(cube, granularity)
+
+            stats, (cube, df) = timeit(lookup_data, repeat)
+            stats['rows'] = len(cube)
+            results[f'{engine_name}/lookup_data/{name}'] = stats
+
+        stats, _ = timeit(
+            lambda: sales.patch_globe(geo.aggregate_countries(cube)),
+            repeat,
+        )
+        results[f'figure/update_globe/{name}'] = stats
+
+        def figures():
+            top = geo.aggregate_countries(cube)
+            return [to_json(p) for p in (
+                sales.patch_sales(df, granularity),
+                sales.patch_markets(df),
+                sales.patch_globe(top),
+            )]
+        stats, payloads = timeit(figures, repeat)
+        stats['bytes'] = sum(len(p) for p in payloads)
+        results[f'figure/figures/{name}'] = stats
+
+        for scope in export.SCOPES:
+            def download():
+                return sum(len(b) for b in export.export(
+                    db_path, scope, 'csv', since, until, segments
+                ))
+            stats, size = timeit(download, repeat)
+            stats['bytes'] = size
+            results[f'sql/download_table_{scope}/{name}'] = stats
+
+    return results
+
+def run(sizes, repeat, data_dir=generate.DATA_DIR):
+    """Benchmark every database size
+
+    Returns
+    -------
+        dict, the JSON document
+    """
+    results = {}
+    for size in sizes:
+        db_path = generate.ensure(size, data_dir)
+        print(f'INFO: benchmarking {db_path}')
+        for name, stats in bench_database(db_path, repeat).items():
+            results[f'{size}/{name}'] = stats
+            print(f'INFO: {size}/{name}: {stats["median"] * 1000:.1f} ms')
+
+    return {
+        'commit': commit(),
+        'created': dt.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+###############################################################################
+## Main
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the data path')
+    parser.add_argument('--sizes', nargs='+', choices=list(generate.SIZES),
+                        default=['100k', '1M'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--dir', default=generate.DATA_DIR)
+    parser.add_argument('-o', '--output',
+                        help='results file, default: '
+                             'DIR/benchmark-<commit>.json')
+    args = parser.parse_args()
+
+    document = run(args.sizes, args.repeat, args.dir)
+
+    output = args.output or os.path.join(
+        args.dir, f'benchmark-{document["commit"] or "local"}.json'
+    )
+    with open(output, 'w') as f:
+        json.dump(document, f, indent=2)
+    print(f'INFO: results written to {output}')
@@ -9,6 +9,35 @@ run_app() {
 	python index.py
 }
 
+serve_app() {
+	exec gunicorn -c gunicorn.conf.py wsgi:server
+}
+
+build_rollups() {
+	python -m apps.rollup "$@"
+	python -m apps.geo "$@"
+}
+
+partition_db() {
+	python -m apps.partitions "$@"
+}
+
+build_calendar() {
+	python -m apps.dates "$@"
+}
+
+optimize_db() {
+	python optimize_db.py "$@"
+}
+
+run_benchmark() {
+	python -m benchmarks.run "$@"
+}
+
+run_loadtest() {
+	python -m benchmarks.loadtest "$@"
+}
+
 print_usage() {
 echo "
 $PROJECT_NAME
@@ -17,7 +46,18 @@ Usage:	$0 COMMAND
 
 Options:
   help		        Print this help
-  run			Run Dash server
+  run			Run Dash development server
+  serve			Run production server (gunicorn, see config.ini)
+  rollup [DB]		Build sales.db monthly rollups and country dimension
+  partition [DB]	Partition sales.db orders by year (--year YYYY adds one)
+  calendar [DB]		Build sales.db calendar dimension and orders' day keys
+  optimize-db [DB]	Create sales.db indexes and statistics
+  benchmark [ARGS]	Benchmark the data path (see benchmarks/run.py)
+  loadtest [ARGS]	Load test with simulated users (see benchmarks/loadtest.py)
+
+Environment:
+  CONFIG_FILE		Settings file (config.ini)
+  FORECAST_MODEL	Forecast model file ([FORECAST] MODEL, data/model.pkl)
 "
 }
 
@@ -29,6 +69,34 @@ case "$1" in
       	shift 1
         run_app
         ;;
+    serve)
+      	shift 1
+        serve_app
+        ;;
+    rollup)
+      	shift 1
+        build_rollups "$@"
+        ;;
+    partition)
+      	shift 1
+        partition_db "$@"
+        ;;
+    calendar)
+      	shift 1
+        build_calendar "$@"
+        ;;
+    optimize-db)
+      	shift 1
+        optimize_db "$@"
+        ;;
+    benchmark)
+      	shift 1
+        run_benchmark "$@"
+        ;;
+    loadtest)
+      	shift 1
+        run_loadtest "$@"
+        ;;
     *)
         exec "$@"
 esac
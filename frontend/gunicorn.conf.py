@@ -0,0 +1,39 @@
+"""gunicorn.conf.py
+
+Production WSGI server settings, read from config.ini's [SERVER] section.
+Module level names are gunicorn settings, hence the underscored helpers.
+"""
+import configparser
+import os
+
+_config = configparser.ConfigParser()
+_config.read(os.getenv('CONFIG_FILE', 'config.ini'))
+_server = _config['SERVER']
+
+bind = _server['BIND']
+workers = _server.getint('WORKERS')
+threads = _server.getint('THREADS')
+timeout = _server.getint('TIMEOUT')
+
+# Load the app (and warm it up) before forking, so workers share memory
+preload_app = True
+
+accesslog = '-'
+
+def on_starting(server):
+    """Set the metric files up, before any worker is forked
+    """
+    from apps import metrics
+    metrics.setup()
+
+def post_fork(server, worker):
+    """Retry a failed warmup in the new worker, see warmup.retry()
+    """
+    from apps import warmup
+    warmup.retry()
+
+def child_exit(server, worker):
+    """Drop the exited worker's in-flight callbacks from the metrics
+    """
+    from apps import metrics
+    metrics.mark_process_dead(worker.pid)
@@ -1,9 +1,9 @@
 import dash
 import dash_bootstrap_components as dbc
+import flask
 from dash import dcc, html
-from dash.dependencies import Input, Output, State
 from app import _, app, config, DEBUG, API_URL
-from apps import layout
+from apps import db, layout, metrics, warmup
 
 ###############################################################################
 # Dash App's layout
@@ -23,21 +23,26 @@ app.layout = dbc.Container([
     ),
 
     # Contents
-    html.Div(id='page-content', className='my-1'),
+    html.Div(layout.layout(), id='page-content', className='my-1'),
 
 ],fluid=False
 )
 
 ###############################################################################
 # Callbacks
-@app.callback(
-    Output('page-content', 'children'),
-    Input('url', 'pathname'),
-    State('auth-data', 'data'),
-)
-def display_page(pathname, auth_data):
+@app.server.route('/ready')
+def ready():
+    """Readiness probe, succeeds once warmup finished
+    """
+    if warmup.ready.is_set():
+        return flask.jsonify({'ready':True})
+    return flask.jsonify({'ready':False, 'error':warmup.error}), 503
 
-    return layout.layout(pathname, auth_data)
+@app.server.route('/db-stats')
+def db_stats():
+    """Connection pools statistics, for monitoring
+    """
+    return flask.jsonify(db.stats())
 
 ###############################################################################
 ## Main
@@ -51,6 +56,10 @@ if __name__ == '__main__':
         f"API_URL: {API_URL}\n"
     )
 
+    metrics.setup()
+    if not warmup.warmup():
+        warmup.retry()
+
     # Run Server
     app.run_server(host='0.0.0.0', debug=DEBUG)
 
@@ -0,0 +1,131 @@
+"""optimize_db.py
+
+sales.db maintenance: creates the indexes used by the dashboard queries and
+refreshes the query planner statistics.
+
+Usage:
+
+    python optimize_db.py [path/to/sales.db]
+"""
+import argparse
+import sqlite3
+from apps import dates, partitions, rollup
+
+###############################################################################
+# Settings
+INDEXES = {
+    # Covers the date range + segment filter and every column read by the
+    # dashboards, so 'orders' rows are never visited
+    'orders_date_cover': (
+        'orders',
+        ['"Order Date"', 'Segment', 'Market', 'Country', 'Sales',
+         'Quantity', '"Order ID"'],
+    ),
+}
+
+# Created once the orders have their "Day Key" (apps/dates.py), which the
+# dashboard queries then filter on
+DAY_KEY_INDEXES = {
+    'orders_day_cover': (
+        'orders',
+        ['"Day Key"', 'Segment', 'Market', 'Country', 'Sales', 'Quantity',
+         '"Order ID"', '"Order Date"'],
+    ),
+}
+
+###############################################################################
+# Maintenance functions
+###############################################################################
+def create_indexes(conn):
+    """Create INDEXES, and DAY_KEY_INDEXES when day keys are available, that
+    do not exist yet
+
+    'orders' indexes are created on every partition once it is partitioned,
+    ex.: 'orders_date_cover_2014' on 'orders_2014'.
+    """
+    indexes = dict(INDEXES)
+    if dates.day_keys_available(conn):
+        indexes.update(DAY_KEY_INDEXES)
+
+    for name, (table, columns) in indexes.items():
+        targets = [table]
+        if table == partitions.TABLE:
+            targets = partitions.tables(conn)
+
+        for target in targets:
+            index = name + target[len(table):]
+            print(f'INFO: creating index {index}')
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS {index} ON {target}'
+                f'({", ".join(columns)})'
+            )
+
+def analyze(conn):
+    """Refresh the query planner statistics
+    """
+    print('INFO: analyzing database')
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA optimize')
+
+def optimize(db_path):
+    """Create indexes and statistics, then check the query plans
+    """
+    conn = sqlite3.connect(db_path)
+    with conn:
+        create_indexes(conn)
+        analyze(conn)
+    check_query_plans(conn)
+    conn.close()
+
+###############################################################################
+# Query plan checks
+###############################################################################
+def full_scans(conn, query, params):
+    """Returns EXPLAIN QUERY PLAN steps that scan a whole table
+    """
+    plan = conn.execute('EXPLAIN QUERY PLAN ' + query, params).fetchall()
+
+    # Subqueries and views (ex.: partitioned 'orders') are planned on their
+    # own, reading their results is not a table scan
+    subqueries = {
+        row[3].split(' ', 1)[1] for row in plan
+        if row[3].startswith(('CO-ROUTINE ', 'MATERIALIZE '))
+    }
+    return [
+        row[3] for row in plan
+        if row[3].startswith('SCAN') and 'INDEX' not in row[3]
+        and row[3][len('SCAN '):] not in subqueries
+    ]
+
+def check_query_plans(conn):
+    """Warn about dashboard queries that degraded to full table scans
+
+    See rollup.dashboard_queries() for the checked statements.
+
+    Returns
+    -------
+        dict mapping query names to the offending plan steps
+    """
+    degraded = {}
+    for name, query, params in rollup.dashboard_queries(conn):
+        scans = full_scans(conn, query, params)
+        if scans:
+            degraded[name] = scans
+            print(
+                f'WARNING: query "{name}" is not using an index '
+                f'({"; ".join(scans)}), run optimize-db'
+            )
+
+    return degraded
+
+###############################################################################
+## Main
+if __name__ == '__main__':
+
+    from app import config
+
+    parser = argparse.ArgumentParser(description='Optimize sales.db')
+    parser.add_argument('db', nargs='?', default=config['DATA']['DB'])
+    args = parser.parse_args()
+
+    optimize(args.db)
@@ -0,0 +1,121 @@
+import datetime as dt
+import random
+import sqlite3
+import pytest
+
+SEGMENTS = ['Consumer', 'Corporate', 'Home Office']
+COUNTRIES = [
+    ('United States', 'US'),
+    ('Brazil', 'LATAM'),
+    ('France', 'EU'),
+    ('China', 'APAC'),
+    ('Nigeria', 'Africa'),
+]
+
+def create_sales_db(path, n_orders=2000, seed=42):
+    """Create a small 'orders' table following sales.db schema"""
+    rnd = random.Random(seed)
+    first = dt.date(2011, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.execute("""
+    CREATE TABLE orders (
+        "Row ID" INTEGER,
+        "Order ID" TEXT,
+        "Order Date" TIMESTAMP,
+        "Segment" TEXT,
+        "Country" TEXT,
+        "Market" TEXT,
+        "Sales" REAL,
+        "Quantity" INTEGER
+    )""")
+    rows = []
+    for i in range(n_orders):
+        date = first + dt.timedelta(days=rnd.randrange(4 * 365))
+        country, market = rnd.choice(COUNTRIES)
+        rows.append((
+            i + 1,
+            f'ORD-{i // 2}',
+            f'{date} 00:00:00',
+            rnd.choice(SEGMENTS),
+            country,
+            market,
+            round(rnd.uniform(1, 1000), 2),
+            rnd.randint(1, 10),
+        ))
+    conn.executemany('INSERT INTO orders VALUES (?,?,?,?,?,?,?,?)', rows)
+    conn.commit()
+    conn.close()
+    return path
+
+@pytest.fixture
+def sales_db(tmp_path):
+    return create_sales_db(str(tmp_path / 'sales.db'))
+
+class StubAPI:
+    """Local HTTP server standing in for the backend API
+
+    'routes' maps (method, path) to functions of the request handler,
+    returning (status, headers, body). 'connections' counts the TCP
+    connections accepted.
+    """
+
+    def __init__(self):
+        import http.server
+        import threading
+
+        stub = self
+        self.routes = {}
+        self.requests = []
+        self.connections = 0
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def handle(self):
+                stub.connections += 1
+                super().handle()
+
+            def respond(self):
+                path = self.path.split('?')[0]
+                length = int(self.headers.get('Content-Length') or 0)
+                self.body = self.rfile.read(length)
+                stub.requests.append((self.command, self.path))
+                route = stub.routes.get((self.command, path))
+                if route:
+                    status, headers, body = route(self)
+                else:
+                    status, headers, body = 404, {}, b''
+                if isinstance(body, (dict, list)):
+                    import json
+                    body = json.dumps(body).encode()
+                    headers = {'Content-Type': 'application/json', **headers}
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                      Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stub_api():
+    """Backend API stub, see StubAPI"""
+    stub = StubAPI()
+    yield stub
+    stub.close()
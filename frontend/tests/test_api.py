@@ -0,0 +1,168 @@
+import base64
+import json
+import time
+import pytest
+import requests
+from apps import api, login
+
+def jwt(**claims):
+    """Unsigned JWT with 'claims'"""
+    def encode(data):
+        return base64.urlsafe_b64encode(
+            json.dumps(data).encode()
+        ).rstrip(b'=').decode()
+    return f'{encode({"alg": "HS256"})}.{encode(claims)}.signature'
+
+@pytest.fixture(autouse=True)
+def breaker(monkeypatch):
+    """Fresh circuit breaker for each test"""
+    breaker = api.CircuitBreaker(threshold=3, reset_timeout=0.2)
+    monkeypatch.setattr(api, 'breaker', breaker)
+    monkeypatch.setattr(api, 'BACKOFF', 0)
+    monkeypatch.setitem(api._session, 'pid', None)
+    return breaker
+
+###############################################################################
+# request()
+def test_login(stub_api):
+    """logins reuse the pooled connection and send build_request_headers"""
+    def token(handler):
+        assert handler.headers['accept'] == 'application/json'
+        assert handler.body == b'username=foo&password=bar'
+        return 200, {}, {'access_token': jwt(exp=time.time() + 600)}
+    stub_api.routes[('POST', '/token')] = token
+
+    for _ in range(3):
+        response = login.api_login(stub_api.url, 'foo', 'bar')
+        assert response.ok
+    assert stub_api.connections == 1
+
+def test_bearer_token(stub_api):
+    """access tokens are sent as bearer tokens"""
+    stub_api.routes[('GET', '/orders')] = lambda h: (
+        200, {}, {'authorization': h.headers['Authorization']}
+    )
+    response = api.request('GET', '/orders', 'abc', base_url=stub_api.url)
+    assert response.json() == {'authorization': 'Bearer abc'}
+
+def test_retries(stub_api):
+    """502/503/504 answers are retried, up to RETRIES times"""
+    answers = iter([503, 502, 200])
+    stub_api.routes[('GET', '/orders')] = lambda h: (next(answers), {}, [])
+    response = api.request('GET', '/orders', base_url=stub_api.url)
+    assert response.status_code == 200
+    assert len(stub_api.requests) == api.RETRIES + 1
+
+def test_login_not_retried(stub_api):
+    """logins are not sent again once the backend received them"""
+    stub_api.routes[('POST', '/token')] = lambda h: (503, {}, {})
+    response = login.api_login(stub_api.url, 'foo', 'bar')
+    assert response.status_code == 503
+    assert len(stub_api.requests) == 1
+
+def test_read_timeout(stub_api, monkeypatch):
+    """a stuck backend does not hang the caller"""
+    monkeypatch.setattr(api, 'READ_TIMEOUT', 0.1)
+    monkeypatch.setattr(api, 'RETRIES', 0)
+    stub_api.routes[('GET', '/slow')] = lambda h: (
+        time.sleep(0.5) or (200, {}, [])
+    )
+    start = time.perf_counter()
+    with pytest.raises(requests.RequestException):
+        api.request('GET', '/slow', base_url=stub_api.url)
+    assert time.perf_counter() - start < 0.5
+
+###############################################################################
+# CircuitBreaker
+def test_circuit_breaker(stub_api, breaker):
+    """repeated failures open the circuit, a trial call closes it"""
+    healthy = {'status': 500}
+    stub_api.routes[('GET', '/orders')] = lambda h: (
+        healthy['status'], {}, []
+    )
+    for _ in range(breaker.threshold):
+        api.request('GET', '/orders', base_url=stub_api.url)
+    assert breaker.state == 'open'
+
+    sent = len(stub_api.requests)
+    with pytest.raises(api.CircuitOpenError):
+        api.request('GET', '/orders', base_url=stub_api.url)
+    assert len(stub_api.requests) == sent
+    assert login.api_login(stub_api.url, 'foo', 'bar') is None
+
+    time.sleep(breaker.reset_timeout)
+    assert breaker.state == 'half-open'
+    healthy['status'] = 200
+    api.request('GET', '/orders', base_url=stub_api.url)
+    assert breaker.state == 'closed'
+
+def test_circuit_breaker_trial_failure(breaker):
+    """a failed trial call opens the circuit again"""
+    for _ in range(breaker.threshold):
+        breaker.failure()
+    time.sleep(breaker.reset_timeout)
+    breaker.before_call()
+    with pytest.raises(api.CircuitOpenError):
+        breaker.before_call()      # one trial at a time
+    breaker.failure()
+    assert breaker.state == 'open'
+
+@pytest.mark.parametrize('error', [
+    requests.ConnectionError('backend down'),
+    requests.Timeout('backend slow'),
+])
+def test_circuit_breaker_errors(breaker, monkeypatch, error):
+    """connection errors and timeouts are failures"""
+    def session():
+        raise error
+    monkeypatch.setattr(api, 'session', session)
+    with pytest.raises(type(error)):
+        api.request('GET', '/orders', base_url='http://backend')
+    assert breaker.failures == 1
+
+@pytest.mark.parametrize('error', [
+    requests.exceptions.MissingSchema('API_URL not set'),
+    ValueError('invalid request'),
+    KeyboardInterrupt(),
+])
+def test_circuit_breaker_other_errors(breaker, monkeypatch, error):
+    """other errors propagate without counting, still ending a trial"""
+    def session():
+        raise error
+    monkeypatch.setattr(api, 'session', session)
+    with pytest.raises(type(error)):
+        api.request('GET', '/orders', base_url='http://backend')
+    assert breaker.failures == 0 and breaker.state == 'closed'
+
+    for _ in range(breaker.threshold):
+        breaker.failure()
+    time.sleep(breaker.reset_timeout)
+    with pytest.raises(type(error)):
+        api.request('GET', '/orders', base_url='http://backend')
+    assert not breaker.trial and breaker.state == 'half-open'
+    breaker.before_call()
+
+def test_circuit_breaker_no_api_url(breaker, monkeypatch):
+    """a missing API_URL is not a backend failure"""
+    monkeypatch.setattr(api, 'API_URL', None)
+    with pytest.raises(requests.exceptions.MissingSchema):
+        api.request('GET', '/orders')
+    assert breaker.failures == 0
+
+###############################################################################
+# Tokens
+def test_token_valid():
+    """token expiry is checked locally"""
+    assert api.token_valid(jwt(exp=time.time() + 600))
+    assert not api.token_valid(jwt(exp=time.time() - 1))
+    assert not api.token_valid(jwt(exp=time.time() + 10), leeway=30)
+    assert api.token_valid('opaque-token')
+    assert not api.token_valid(None)
+
+def test_authenticated():
+    """expired tokens log users out"""
+    assert api.authenticated({'username': 'foo',
+                              'access_token': jwt(exp=time.time() + 600)})
+    assert not api.authenticated({'username': 'foo',
+                                  'access_token': jwt(exp=time.time() - 1)})
+    assert not api.authenticated({'username': None, 'access_token': None})
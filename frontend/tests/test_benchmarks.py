@@ -0,0 +1,103 @@
+import datetime as dt
+import json
+import sqlite3
+import threading
+import pytest
+import requests
+from werkzeug.serving import make_server
+from index import app
+from apps.mod_datepicker import lookup_daterange
+from benchmarks import compare, generate, loadtest, run
+
+###############################################################################
+# generate()
+def test_generate(tmp_path):
+    """synthetic database follows sales.db schema and is prepared"""
+    db_path = generate.generate(str(tmp_path / 'sales.db'), 5000)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT count(*) FROM orders').fetchone() == (5000,)
+    assert conn.execute(
+        'SELECT count(*) FROM orders WHERE Market IS NULL'
+    ).fetchone() == (0,)
+    tables = {r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'"
+    )}
+    assert {'rollup_cube', 'dim_country'} <= tables
+
+###############################################################################
+# run(), compare()
+def test_run(tmp_path, monkeypatch):
+    """results are JSON serializable and comparable"""
+    monkeypatch.setitem(generate.SIZES, '100k', 2000)
+    document = run.run(['100k'], repeat=1, data_dir=str(tmp_path))
+    document = json.loads(json.dumps(document))
+
+    results = document['results']
+    assert '100k/sql/lookup_data/all' in results
+    assert '100k/memory/lookup_data/month' in results
+    assert results['100k/figure/figures/year']['bytes'] > 0
+
+    rows = compare.compare(document, document)
+    assert len(rows) == len(results)
+    assert not any(r[4] for r in rows)
+
+###############################################################################
+# loadtest
+def test_parse_outputs():
+    """single and multiple outputs of /_dash-dependencies"""
+    assert loadtest.parse_outputs('venda-plot.figure') == \
+        ['venda-plot.figure']
+    assert loadtest.parse_outputs(
+        '..login-alert.children@305956bf...auth-data.data@305956bf..'
+    ) == ['login-alert.children', 'auth-data.data']
+
+@pytest.mark.parametrize('today', [dt.date(2014, 1, 15), dt.date(2026, 12, 3)])
+def test_recorded_sessions(today):
+    """periods follow the date picker: presets of 'today', arrows only
+    after a preset"""
+    for session in loadtest.recorded_sessions(today).values():
+        period_type = start = None
+        for action, inputs, clientside in session:
+            if 'period-dropdown.value' in inputs:
+                value = inputs['period-dropdown.value']
+                period_type = clientside['period-type.children']
+                assert value == lookup_daterange(f'this_{period_type}',
+                                                 f'{today:%Y%m%d}')
+            elif action in ('previous', 'next'):
+                assert period_type
+                expected = lookup_daterange(f'{action}_{period_type}',
+                                            start.replace('-', ''))
+                assert expected == '{},{}'.format(*(
+                    clientside[f'date-picker.{k}'].replace('-', '')
+                    for k in ('start_date', 'end_date')
+                ))
+            elif action == 'picker':
+                period_type = clientside['period-type.children']
+            start = clientside.get('date-picker.start_date',
+                                   inputs.get('date-picker.start_date', start))
+
+def test_replay():
+    """a simulated user opens /sales and downloads its data"""
+    server = make_server('127.0.0.1', 0, app.server, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f'http://127.0.0.1:{server.server_port}'
+        dependencies = requests.get(f'{url}/_dash-dependencies').json()
+        layout = requests.get(f'{url}/_dash-layout').json()
+        samples = []
+        user = loadtest.User(
+            url, dependencies, layout, lambda *args: samples.append(args)
+        )
+        session = loadtest.SESSIONS['browse']
+        user.replay([session[0], session[-1]])
+    finally:
+        server.shutdown()
+
+    names = [s[0] for s in samples]
+    for name in ['display_dashboard', 'update_login_btn', 'set_filters',
+                 'update_sales_figures', 'download']:
+        assert name in names
+    assert not any(s[3] for s in samples)
+    assert 'since=20110101&until=20141231' in \
+        user.props['download-link.href']
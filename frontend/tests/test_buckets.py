@@ -0,0 +1,50 @@
+import datetime as dt
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+from apps import buckets
+
+DAYS = [dt.date(2011, 1, 1) + dt.timedelta(days=i) for i in range(0, 800, 7)]
+
+###############################################################################
+# choose()
+@pytest.mark.parametrize('since,until,expected', [
+    (dt.date(2013, 3, 1), dt.date(2013, 3, 31), 'day'),
+    (dt.date(2013, 1, 1), dt.date(2013, 12, 31), 'week'),
+    (dt.date(2011, 1, 1), dt.date(2014, 12, 31), 'month'),
+    (dt.date(2005, 1, 1), dt.date(2014, 12, 31), 'quarter'),
+    (dt.date(1900, 1, 1), dt.date(2014, 12, 31), 'year'),
+])
+def test_choose(since, until, expected):
+    """granularity gets coarser as the range grows"""
+    granularity = buckets.choose(since, until, max_points=60)
+    assert granularity == expected
+    assert expected == 'year' or buckets.count(granularity, since, until) <= 60
+
+###############################################################################
+# sql(), day_keys()
+@pytest.mark.parametrize('granularity', buckets.GRANULARITIES)
+def test_keys(granularity):
+    """SQL and NumPy bucket keys match start()"""
+    expected = [str(buckets.start(granularity, d)) for d in DAYS]
+
+    conn = sqlite3.connect(':memory:')
+    query = f"SELECT {buckets.sql(granularity, 'd')} FROM (SELECT ? AS d)"
+    assert [
+        conn.execute(query, (f'{d} 00:00:00',)).fetchone()[0] for d in DAYS
+    ] == expected
+
+    keys = buckets.day_keys(granularity, np.array(DAYS, dtype='datetime64[D]'))
+    assert np.datetime_as_string(keys, unit='D').tolist() == expected
+
+###############################################################################
+# labels()
+def test_labels():
+    """axis labels"""
+    dates = pd.Series(pd.to_datetime(['2013-03-25']))
+    assert buckets.labels('day', dates).tolist() == ['25/03/2013']
+    assert buckets.labels('week', dates).tolist() == ['S13/2013']
+    assert buckets.labels('month', dates).tolist() == ['3/2013']
+    assert buckets.labels('quarter', dates).tolist() == ['T1/2013']
+    assert buckets.labels('year', dates).tolist() == ['2013']
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import time
+import pytest
+from apps.cache import ResultCache, canonical_key
+
+def make_cache(tmp_path, sales_db, **kwargs):
+    return ResultCache(str(tmp_path / 'cache.db'), sales_db, **kwargs)
+
+###############################################################################
+# canonical_key()
+def test_canonical_key1():
+    """segments order and duplicates do not change the key"""
+    assert canonical_key('20110101', 20111231, ['b', 'a', 'b']) == \
+        canonical_key(20110101, '20111231', ['a', 'b'])
+
+###############################################################################
+# ResultCache
+def test_cache_hit_miss(tmp_path, sales_db):
+    """memoized function runs once per canonical key"""
+    cache = make_cache(tmp_path, sales_db)
+    calls = []
+
+    @cache.memoize('f')
+    def f(since, until, segments):
+        calls.append(segments)
+        return len(segments)
+
+    assert f(1, 2, ['a', 'b']) == 2
+    assert f(1, 2, ['b', 'a']) == 2
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 1, 1)
+
+def test_cache_shared(tmp_path, sales_db):
+    """entries and counters are shared by instances using the same file"""
+    make_cache(tmp_path, sales_db).set('f', (1, 2, ()), 'value')
+    other = make_cache(tmp_path, sales_db)
+    assert other.get('f', (1, 2, ())) == (True, 'value')
+    assert other.stats()['hits'] == 1
+
+def test_cache_counters(tmp_path, sales_db):
+    """lookups do not write counters, stats() adds them up"""
+    cache = make_cache(tmp_path, sales_db)
+    cache.set('f', 1, 'a')
+    for _ in range(3):
+        cache.get('f', 1)
+    cache.get('f', 2)
+    conn = sqlite3.connect(cache.path)
+    assert dict(conn.execute('SELECT name, value FROM counters')) == \
+        {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    other = make_cache(tmp_path, sales_db)
+    other.get('f', 1)
+    assert (other.stats()['hits'], cache.stats()['hits']) == (1, 4)
+    assert cache.stats()['misses'] == 1
+
+    cache.clear()
+    assert cache.stats()['hits'] == 0
+
+@pytest.mark.parametrize('value', [
+    b'', b'\x80\x05\x95', b'capps.cache\nMissing\n.', b'cmissing\nX\n.',
+])
+def test_cache_bad_entry(tmp_path, sales_db, value):
+    """unreadable entries miss and are dropped"""
+    cache = make_cache(tmp_path, sales_db)
+    cache.set('f', 1, 'a')
+    with sqlite3.connect(cache.path) as conn:
+        conn.execute('UPDATE entries SET value = ?', (value,))
+    assert cache.get('f', 1) == (False, None)
+    stats = cache.stats()
+    assert (stats['misses'], stats['size']) == (1, 0)
+
+def test_cache_unavailable(tmp_path, sales_db):
+    """stats() and clear() survive an unusable cache file"""
+    cache = ResultCache(str(tmp_path), sales_db)
+    assert cache.get('f', 1) == (False, None)
+    cache.clear()
+    stats = cache.stats()
+    assert (stats['misses'], stats['size']) == (1, None)
+
+def test_cache_lru(tmp_path, sales_db):
+    """least recently used entries are evicted"""
+    cache = make_cache(tmp_path, sales_db, maxsize=2)
+    cache.set('f', 1, 'a')
+    cache.set('f', 2, 'b')
+    cache.get('f', 1)
+    cache.set('f', 3, 'c')
+    assert cache.get('f', 1)[0]
+    assert not cache.get('f', 2)[0]
+    assert cache.stats()['evictions'] == 1
+
+def test_cache_ttl(tmp_path, sales_db):
+    """expired entries miss"""
+    cache = make_cache(tmp_path, sales_db, ttl=0)
+    cache.set('f', 1, 'a')
+    time.sleep(0.01)
+    assert not cache.get('f', 1)[0]
+
+def test_cache_invalidation(tmp_path, sales_db):
+    """changes on the source database invalidate entries"""
+    cache = make_cache(tmp_path, sales_db)
+    cache.set('f', 1, 'a')
+    st = os.stat(sales_db)
+    os.utime(sales_db, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert not cache.get('f', 1)[0]
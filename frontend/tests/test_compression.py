@@ -0,0 +1,114 @@
+import gzip
+import re
+import pytest
+from index import app
+from app import config
+from apps import compression, vendor
+
+MIN_SIZE = config.getint('COMPRESSION', 'MIN_SIZE')
+
+###############################################################################
+# Callback and layout responses
+def test_compressed_json():
+    """large JSON responses are compressed, following Accept-Encoding"""
+    client = app.server.test_client()
+    plain = client.get('/_dash-dependencies')
+    assert 'Content-Encoding' not in plain.headers
+    assert len(plain.data) >= MIN_SIZE
+
+    response = client.get('/_dash-dependencies',
+                          headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert int(response.headers['Content-Length']) == len(response.data)
+    assert gzip.decompress(response.data) == plain.data
+
+def test_brotli():
+    """brotli is preferred when accepted"""
+    brotli = pytest.importorskip('brotli')
+    client = app.server.test_client()
+    plain = client.get('/_dash-dependencies')
+    response = client.get('/_dash-dependencies',
+                          headers={'Accept-Encoding': 'gzip, deflate, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == plain.data
+
+def test_small_responses():
+    """responses under MIN_SIZE are sent as they are"""
+    client = app.server.test_client()
+    response = client.post('/_dash-update-component', json={
+        'output': 'login-btn.children',
+        'outputs': {'id': 'login-btn', 'property': 'children'},
+        'inputs': [{'id': 'auth-data', 'property': 'data',
+                    'value': {'username': 'foo'}}],
+        'changedPropIds': ['auth-data.data'],
+        'state': [],
+    }, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert len(response.data) < MIN_SIZE
+    assert 'Content-Encoding' not in response.headers
+
+###############################################################################
+# Vendored assets
+def test_vendor_assets():
+    """stylesheets are self-hosted, fingerprinted and cached for good"""
+    client = app.server.test_client()
+    page = client.get('/').get_data(as_text=True)
+    assert 'cdn.jsdelivr.net' not in page
+    assert 'use.fontawesome.com' not in page
+    assert vendor.url(vendor.BOOTSTRAP) in page
+
+    css = client.get(vendor.url(vendor.FONT_AWESOME))
+    assert css.status_code == 200
+    assert 'immutable' in css.headers['Cache-Control']
+    assert css.cache_control.max_age == vendor.MAX_AGE
+
+    # Fonts resolve next to the stylesheet, under the same fingerprint
+    for font in set(re.findall(r'url\(\.\./(webfonts/[^)?#]+)',
+                               css.get_data(as_text=True))):
+        response = client.get(
+            vendor.url(f'fontawesome-free-5.15.3/{font}'),
+            headers={'Accept-Encoding': 'gzip'},
+        )
+        assert response.status_code == 200
+        assert 'Content-Encoding' not in response.headers
+
+def test_vendor_compressed_once(monkeypatch):
+    """immutable assets are compressed once per encoding"""
+    calls = []
+    compress = compression.compress
+    monkeypatch.setattr(compression, 'compress',
+                        lambda data, encoding, level: calls.append(encoding)
+                        or compress(data, encoding, level))
+
+    client = app.server.test_client()
+    path = vendor.url(vendor.BOOTSTRAP)
+    first = client.get(path, headers={'Accept-Encoding': 'gzip'})
+    second = client.get(path, headers={'Accept-Encoding': 'gzip'})
+    assert calls.count('gzip') <= 1
+    assert second.headers['Content-Encoding'] == 'gzip'
+    assert second.data == first.data
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert gzip.decompress(second.data) == client.get(path).data
+
+    # Not for stale fingerprints
+    stale = f'/vendor/000000000000/{vendor.BOOTSTRAP}'
+    calls.clear()
+    for _ in range(2):
+        client.get(stale, headers={'Accept-Encoding': 'gzip'})
+    assert calls == ['gzip', 'gzip']
+
+def test_vendor_stale_fingerprint():
+    """outdated fingerprints are served without long lived caching"""
+    client = app.server.test_client()
+    response = client.get(f'/vendor/000000000000/{vendor.BOOTSTRAP}')
+    assert response.status_code == 200
+    assert 'immutable' not in response.headers.get('Cache-Control', '')
+
+def test_fingerprint(tmp_path):
+    """fingerprint changes with the bundle's contents"""
+    (tmp_path / 'a.css').write_text('a {}')
+    before = vendor.fingerprint(str(tmp_path))
+    assert before == vendor.fingerprint(str(tmp_path))
+    (tmp_path / 'a.css').write_text('a { color: red }')
+    assert vendor.fingerprint(str(tmp_path)) != before
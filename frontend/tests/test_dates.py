@@ -0,0 +1,128 @@
+import datetime as dt
+import shutil
+import sqlite3
+import pytest
+from apps import dates, export, partitions
+from apps.mod_datepicker import compute_daterange, lookup_daterange
+from apps.rollup import build_rollups, lookup_buckets
+from optimize_db import check_query_plans, optimize
+
+@pytest.fixture
+def calendar_db(sales_db, tmp_path):
+    """Copy of sales_db with the calendar dimension"""
+    path = str(tmp_path / 'calendar.db')
+    shutil.copy(sales_db, path)
+    dates.build_dim_calendar(path)
+    return path
+
+###############################################################################
+# Calendar
+def test_calendar_dimension():
+    """one row per day, with its period attributes"""
+    dim = dates.calendar_dimension()
+    assert len(dim) == (dt.date(dates.LAST_YEAR, 12, 31)
+                        - dt.date(dates.FIRST_YEAR, 1, 1)).days + 1
+    row = dim[dim['day_key'] == 20140101].iloc[0]
+    assert (row['iso_year'], row['iso_week'], row['week_start']) == \
+        (2014, 1, '2013-12-30')
+    assert (row['quarter_start'], row['fiscal_year']) == ('2014-01-01', 2014)
+
+def test_conversions():
+    """dates, ISO strings and day keys convert to each other"""
+    assert dates.to_key(dt.date(2014, 3, 9)) == 20140309
+    assert dates.to_key('2014-03-09 00:00:00') == 20140309
+    assert dates.to_key('20140309') == 20140309
+    assert dates.to_date(20140309) == dt.date(2014, 3, 9)
+    assert dates.to_date(19500309) == dt.date(1950, 3, 9)
+    with pytest.raises(ValueError):
+        dates.to_key('03/09/2014')
+
+@pytest.mark.parametrize('mode', ['this', 'previous', 'next'])
+@pytest.mark.parametrize('period', ['day', 'week', 'month', 'year'])
+def test_lookup_daterange(mode, period):
+    """calendar lookups match the date arithmetic"""
+    day = dt.date(2011, 12, 1)
+    while day < dt.date(2013, 3, 1):
+        key = day.strftime('%Y%m%d')
+        assert lookup_daterange(f'{mode}_{period}', key) == \
+            compute_daterange(f'{mode}_{period}', key)
+        day += dt.timedelta(days=3)
+
+    # Outside of the calendar
+    assert lookup_daterange(f'{mode}_{period}', '19991231') == \
+        compute_daterange(f'{mode}_{period}', '19991231')
+
+def test_lookup_quarter():
+    """quarters come from the calendar only"""
+    assert lookup_daterange('this_quarter', '20111201') == '20111001,20111231'
+    assert lookup_daterange('next_quarter', '20111201') == '20120101,20120331'
+
+def test_current_period():
+    """ranges are matched against today's periods"""
+    today = dt.date(2014, 3, 12)
+    assert dates.current_period(20140312, 20140312, today) == 'day'
+    assert dates.current_period(20140309, 20140315, today) == 'week'
+    assert dates.current_period(20140301, 20140331, today) == 'month'
+    assert dates.current_period(20140101, 20141231, today) == 'year'
+    assert dates.current_period(20140301, 20140330, today) is None
+
+###############################################################################
+# Storage
+@pytest.mark.parametrize('granularity', ['day', 'week', 'month', 'year'])
+@pytest.mark.parametrize('partitioned', [False, True])
+def test_lookup_buckets(sales_db, calendar_db, granularity, partitioned):
+    """day key filters return the same rows"""
+    if partitioned:
+        partitions.partition_orders(calendar_db)
+    build_rollups(calendar_db)
+    assert dates.day_keys_available(sqlite3.connect(calendar_db))
+
+    since, until = dt.date(2012, 2, 10), dt.date(2013, 8, 20)
+    segments = ['Consumer', 'Corporate']
+    expected = lookup_buckets(sqlite3.connect(sales_db), since, until,
+                              segments, granularity)
+    df = lookup_buckets(sqlite3.connect(calendar_db), since, until,
+                        segments, granularity)
+    assert df.drop(columns='sales').equals(expected.drop(columns='sales'))
+    assert (df['sales'] - expected['sales']).abs().max() < 1e-6
+
+def test_export(sales_db, calendar_db):
+    """raw exports filter on day keys"""
+    args = ('raw', dt.date(2012, 11, 1), dt.date(2013, 2, 28), ['Consumer'])
+    query, params = export.export_query(sqlite3.connect(calendar_db), *args)
+    assert '"Day Key" BETWEEN' in query
+    assert params[:2] == [20121101, 20130228]
+    assert sqlite3.connect(calendar_db).execute(query, params).fetchall() == \
+        sqlite3.connect(sales_db).execute(
+            *export.export_query(sqlite3.connect(sales_db), *args)
+        ).fetchall()
+
+def test_triggers(calendar_db):
+    """new orders get their day key, also in new partitions"""
+    conn = sqlite3.connect(calendar_db)
+    conn.execute("""INSERT INTO orders ("Order ID", "Order Date")
+                    VALUES ('NEW-1', '2014-06-30 00:00:00')""")
+    conn.commit()
+    assert conn.execute('SELECT "Day Key" FROM orders '
+                        "WHERE \"Order ID\" = 'NEW-1'").fetchone() == \
+        (20140630,)
+    conn.close()
+
+    partitions.partition_orders(calendar_db)
+    partitions.add_partition(calendar_db, 2015)
+    conn = sqlite3.connect(calendar_db)
+    conn.execute("""INSERT INTO orders_2015 ("Order ID", "Order Date")
+                    VALUES ('NEW-2', '2015-01-02 00:00:00')""")
+    assert conn.execute('SELECT "Day Key" FROM orders_2015').fetchall() == \
+        [(20150102,)]
+    assert dates.day_keys_available(conn)
+
+def test_optimize(calendar_db):
+    """day key queries are covered by an index"""
+    build_rollups(calendar_db)
+    optimize(calendar_db)
+    conn = sqlite3.connect(calendar_db)
+    assert conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'orders_day_cover'"
+    ).fetchone()
+    assert check_query_plans(conn) == {}
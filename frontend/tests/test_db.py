@@ -0,0 +1,55 @@
+import sqlite3
+import threading
+import pytest
+from apps.db import ConnectionPool
+
+###############################################################################
+# ConnectionPool
+def test_pool_read_only(sales_db):
+    """connections can read but not write"""
+    pool = ConnectionPool(sales_db)
+    with pool.connection() as conn:
+        assert conn.execute('SELECT count(*) FROM orders').fetchone()[0] > 0
+        with pytest.raises(sqlite3.Error):
+            conn.execute('DELETE FROM orders')
+    assert pool.stats()['errors'] == 0
+
+def test_pool_reuse(sales_db):
+    """returned connections are reused"""
+    pool = ConnectionPool(sales_db, size=2)
+    for i in range(5):
+        with pool.connection() as conn:
+            conn.execute('SELECT 1')
+    stats = pool.stats()
+    assert (stats['checkouts'], stats['opened'], stats['in_use']) == (5, 1, 0)
+
+def test_pool_wait(sales_db):
+    """checkouts wait for a connection when the pool is exhausted"""
+    pool = ConnectionPool(sales_db, size=1)
+    checked_out = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.connection():
+            checked_out.set()
+            release.wait()
+
+    t = threading.Thread(target=hold)
+    t.start()
+    checked_out.wait()
+    threading.Timer(0.05, release.set).start()
+    with pool.connection() as conn:
+        conn.execute('SELECT 1')
+    t.join()
+
+    stats = pool.stats()
+    assert stats['waits'] == 1
+    assert stats['wait_time'] > 0
+
+def test_pool_timeout(sales_db):
+    """exhausted pool raises after timeout"""
+    pool = ConnectionPool(sales_db, size=1, timeout=0.01)
+    with pool.connection():
+        with pytest.raises(sqlite3.OperationalError):
+            with pool.connection():
+                pass
@@ -0,0 +1,75 @@
+import datetime as dt
+import sqlite3
+import pytest
+from apps.engine import SalesEngine
+from apps.rollup import lookup_buckets, lookup_monthly
+
+###############################################################################
+# SalesEngine.lookup_monthly()
+@pytest.mark.parametrize('since,until,segments', [
+    (dt.date(2011, 1, 1), dt.date(2014, 12, 31), ['Consumer', 'Corporate']),
+    (dt.date(2011, 3, 15), dt.date(2013, 7, 10), ['Home Office']),
+    (dt.date(2012, 2, 2), dt.date(2012, 2, 2), ['Consumer']),
+])
+def test_lookup_monthly(sales_db, since, until, segments):
+    """engine results match the SQL aggregation"""
+    expected = lookup_monthly(
+        sqlite3.connect(sales_db), since, until, segments
+    )
+    df = SalesEngine(sales_db).lookup_monthly(since, until, segments)
+
+    key = list(expected.columns[:4])
+    expected = expected.sort_values(key).reset_index(drop=True)
+    df = df.sort_values(key).reset_index(drop=True)
+    assert df[key].equals(expected[key])
+    assert (df['sales'] - expected['sales']).abs().max() < 1e-6
+    assert df['quantity'].tolist() == expected['quantity'].tolist()
+    assert df['orders'].tolist() == expected['orders'].tolist()
+
+@pytest.mark.parametrize('granularity', ['day', 'week', 'quarter', 'year'])
+def test_lookup_buckets(sales_db, granularity):
+    """engine buckets match the SQL ones"""
+    since, until = dt.date(2011, 3, 15), dt.date(2013, 7, 10)
+    segments = ['Consumer', 'Home Office']
+    expected = lookup_buckets(
+        sqlite3.connect(sales_db), since, until, segments, granularity
+    )
+    df = SalesEngine(sales_db).lookup_buckets(
+        since, until, segments, granularity
+    )
+
+    key = list(expected.columns[:4])
+    expected = expected.sort_values(key).reset_index(drop=True)
+    df = df.sort_values(key).reset_index(drop=True)
+    assert df[key].equals(expected[key])
+    assert (df['sales'] - expected['sales']).abs().max() < 1e-6
+    assert df['orders'].tolist() == expected['orders'].tolist()
+
+def test_lookup_empty(sales_db):
+    """ranges without data return an empty frame"""
+    engine = SalesEngine(sales_db)
+    df = engine.lookup_monthly(
+        dt.date(2020, 1, 1), dt.date(2020, 12, 31),
+        ['Consumer']
+    )
+    assert df.empty
+    df = engine.lookup_monthly(
+        dt.date(2011, 1, 1), dt.date(2011, 12, 31), []
+    )
+    assert df.empty
+
+def test_reload(sales_db):
+    """engine reloads when sales.db changes"""
+    engine = SalesEngine(sales_db)
+    engine.ensure_loaded()
+    version = engine.version
+    conn = sqlite3.connect(sales_db)
+    with conn:
+        conn.execute('DELETE FROM orders WHERE "Order Date" < ?',
+                     ('2012-01-01',))
+    df = engine.lookup_monthly(
+        dt.date(2011, 1, 1), dt.date(2011, 12, 31),
+        ['Consumer']
+    )
+    assert engine.version != version
+    assert df.empty
@@ -0,0 +1,83 @@
+import csv
+import datetime as dt
+import gzip
+import io
+import pytest
+from apps import db, export
+from apps.engine import SalesEngine
+
+SINCE = dt.date(2011, 3, 15)
+UNTIL = dt.date(2012, 6, 30)
+SEGMENTS = ['Consumer', 'Corporate']
+
+def read_csv(blocks):
+    return list(csv.reader(io.StringIO(b''.join(blocks).decode())))
+
+###############################################################################
+# export()
+def test_export_csv(sales_db):
+    """raw export is streamed in chunks"""
+    blocks = list(export.export(
+        sales_db, 'raw', 'csv', SINCE, UNTIL, SEGMENTS, chunksize=100
+    ))
+    rows = read_csv(blocks)
+    assert rows[0][:3] == ['Order ID', 'Order Date', 'Segment']
+    assert len(blocks) > 1
+    assert {r[2] for r in rows[1:]} == set(SEGMENTS)
+    assert min(r[1] for r in rows[1:]) >= str(SINCE)
+    assert max(r[1] for r in rows[1:]) < str(UNTIL + dt.timedelta(days=1))
+
+def test_export_gzip(sales_db):
+    """gzip export holds the same rows as the csv one"""
+    plain = b''.join(export.export(
+        sales_db, 'monthly', 'csv', SINCE, UNTIL, SEGMENTS
+    ))
+    compressed = b''.join(export.export(
+        sales_db, 'monthly', 'csv.gz', SINCE, UNTIL, SEGMENTS, chunksize=10
+    ))
+    assert gzip.decompress(compressed) == plain
+
+def test_export_parquet(sales_db):
+    """parquet export holds every row"""
+    pq = pytest.importorskip('pyarrow.parquet')
+    data = b''.join(export.export(
+        sales_db, 'raw', 'parquet', SINCE, UNTIL, SEGMENTS, chunksize=100
+    ))
+    rows = read_csv(export.export(
+        sales_db, 'raw', 'csv', SINCE, UNTIL, SEGMENTS
+    ))
+    assert pq.read_table(io.BytesIO(data)).num_rows == len(rows) - 1
+
+def test_export_invalid(sales_db):
+    """unknown formats and scopes are rejected"""
+    with pytest.raises(ValueError):
+        export.export(sales_db, 'raw', 'pdf', SINCE, UNTIL, SEGMENTS)
+    with pytest.raises(ValueError):
+        export.export(sales_db, 'all', 'csv', SINCE, UNTIL, SEGMENTS)
+
+def test_export_connection(sales_db):
+    """streamed exports do not hold a pooled connection"""
+    pool = db.get_pool(sales_db, size=1)
+    blocks = export.export(
+        sales_db, 'raw', 'csv', SINCE, UNTIL, SEGMENTS, chunksize=10
+    )
+    next(blocks)
+    with pool.connection() as conn:
+        assert conn.execute('SELECT 1').fetchone() == (1,)
+    assert len(read_csv([b''] + list(blocks))) > 10
+
+def test_export_engine(sales_db):
+    """lookup engines provide monthly exports only"""
+    engine = SalesEngine(sales_db)
+    rows = read_csv(export.export(
+        sales_db, 'monthly', 'csv', SINCE, UNTIL, SEGMENTS, engine=engine
+    ))
+    expected = read_csv(export.export(
+        sales_db, 'monthly', 'csv', SINCE, UNTIL, SEGMENTS
+    ))
+    assert [r[:3] + r[4:] for r in rows] == [r[:3] + r[4:] for r in expected]
+    assert all(abs(float(a[3]) - float(b[3])) < 1e-6
+               for a, b in zip(rows[1:], expected[1:]))
+    with pytest.raises(ValueError):
+        export.export(sales_db, 'raw', 'csv', SINCE, UNTIL, SEGMENTS,
+                      engine=engine)
@@ -0,0 +1,147 @@
+import os
+import pickle
+import sqlite3
+import pandas as pd
+import pytest
+from app import config
+from apps import forecast, sales
+from apps.cache import ResultCache
+from apps.rollup import lookup_buckets
+
+MODEL = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'data', 'model.pkl'
+)
+
+class YearlyModel:
+    """Model predicting 'base' + 'step' per year since 2000"""
+    def __init__(self, base, step=0.0):
+        self.base = base
+        self.step = step
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append(list(X['year']))
+        return self.base + self.step * (X['year'].to_numpy() - 2000)
+
+def history(sales_db):
+    """Monthly sales by segment of sales_db"""
+    df = lookup_buckets(
+        sqlite3.connect(sales_db), pd.Timestamp('2011-01-01').date(),
+        pd.Timestamp('2014-12-31').date(), sales.SEGMENTS, 'month'
+    )
+    return df.groupby(['bucket', 'segment'])['sales'].sum().reset_index()
+
+###############################################################################
+# Model
+def test_load_model(tmp_path):
+    """the model is unpickled once, and again when its file changes"""
+    path = str(tmp_path / 'model.pkl')
+    assert forecast.load_model(path) is None
+
+    with open(path, 'wb') as f:
+        pickle.dump(YearlyModel(1.0), f)
+    model = forecast.load_model(path)
+    assert model.base == 1.0
+    assert forecast.load_model(path) is model
+
+    with open(path, 'wb') as f:
+        pickle.dump(YearlyModel(20.0), f)
+    assert forecast.load_model(path).base == 20.0
+
+def test_load_model_corrupted(tmp_path):
+    """empty or outdated model files are not loaded"""
+    path = tmp_path / 'model.pkl'
+    path.write_bytes(b'')
+    assert forecast.load_model(str(path)) is None
+
+    # Pickled against a class that no longer exists
+    path.write_bytes(b'capps.forecast\nMissing\n.')
+    assert forecast.load_model(str(path)) is None
+
+def test_model_path():
+    """the model is read from the app directory, the image's build context"""
+    frontend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = os.path.join(frontend, config['FORECAST']['MODEL'])
+    assert not os.path.relpath(path, frontend).startswith('..')
+
+def test_shipped_model():
+    """data/model.pkl predicts yearly totals from the year"""
+    pytest.importorskip('sklearn')
+    model = forecast.load_model(MODEL)
+    yearly = forecast.predict_years(model, [2015, 2016])
+    assert len(yearly) == 2 and (yearly > 0).all()
+
+###############################################################################
+# Forecast
+def test_forecast(sales_db):
+    """yearly predictions, scored in one batch, split by month and segment"""
+    model = YearlyModel(1200.0, 120.0)
+    df = forecast.forecast(model, history(sales_db), ['Consumer', 'Corporate'],
+                           18)
+    assert model.calls == [[2015, 2016]]
+    assert len(df) == 36
+    assert (df['month'].iloc[0], df['month'].iloc[-1]) == \
+        ('2015-01-01', '2016-06-01')
+    assert set(df['segment']) == {'Consumer', 'Corporate'}
+
+    # Every segment of a whole year adds up to its prediction
+    df = forecast.forecast(model, history(sales_db), sales.SEGMENTS, 12)
+    assert abs(df['sales'].sum() - 3000.0) < 1e-6
+
+    assert forecast.forecast(model, history(sales_db), [], 12).empty
+
+def test_shares(sales_db):
+    """incomplete years are left out of the shares"""
+    df = history(sales_db)
+    share = forecast.shares(df)
+    assert share.shape == (12, 3)
+    assert abs(share.to_numpy().sum() - 1) < 1e-9
+    partial = pd.concat([df, pd.DataFrame({
+        'bucket': ['2015-01-01'], 'segment': ['Consumer'], 'sales': [1e9],
+    })])
+    assert forecast.shares(partial).equals(share)
+
+###############################################################################
+# Dashboard
+@pytest.fixture
+def model_path(tmp_path, sales_db, monkeypatch):
+    path = str(tmp_path / 'model.pkl')
+    with open(path, 'wb') as f:
+        pickle.dump(YearlyModel(1000.0), f)
+    monkeypatch.setattr(sales, 'MODEL_PATH', path)
+    monkeypatch.setattr(sales, 'forecast_cache',
+                        ResultCache(str(tmp_path / 'forecast.db'), path))
+    monkeypatch.setattr(sales, 'lookup_history',
+                        lambda since, until, segments: history(sales_db))
+    return path
+
+def test_lookup_forecast(model_path):
+    """forecasts are cached by segments and horizon, until the model
+    changes"""
+    df = sales.lookup_forecast(['Corporate', 'Consumer'], 12)
+    assert len(df) == 24
+    assert sales.lookup_forecast(['Consumer', 'Corporate'], 12).equals(df)
+    assert len(sales.lookup_forecast(['Consumer'], 3)) == 3
+    stats = sales.forecast_cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2)
+
+    with open(model_path, 'wb') as f:
+        pickle.dump(YearlyModel(2000.0), f)
+    new = sales.lookup_forecast(['Corporate', 'Consumer'], 12)
+    assert abs(new['sales'].sum() - 2 * df['sales'].sum()) < 1e-6
+
+def test_update_forecast(model_path, monkeypatch):
+    """the panel shows the selected segments, or why it is empty"""
+    ops = {
+        tuple(op['location']): op['params']['value']
+        for op in sales.update_forecast(['Consumer'], 6)
+        .to_plotly_json()['operations']
+    }
+    assert len(ops[('data', 0, 'y')]) == 6
+    assert ops[('data', 1, 'y')] == []
+    assert ops[('layout', 'annotations')] == []
+
+    monkeypatch.setattr(sales, 'lookup_forecast', lambda *args: None)
+    ops = sales.update_forecast(['Consumer'], 6).to_plotly_json()
+    assert ops['operations'][-1]['params']['value'][0]['text'] == \
+        'Previsão indisponível'
@@ -0,0 +1,34 @@
+import datetime as dt
+import sqlite3
+from apps import geo
+
+SINCE = dt.date(2011, 1, 1)
+UNTIL = dt.date(2014, 12, 31)
+SEGMENTS = ['Consumer', 'Corporate', 'Home Office']
+
+###############################################################################
+# country_dimension()
+def test_country_dimension():
+    """aliases and extra countries are mapped"""
+    dim = geo.country_dimension().set_index('country')
+    assert dim.index.is_unique
+    assert dim.loc['South Korea', 'iso_alpha'] == 'KOR'
+    assert dim.loc['Russia', 'iso_alpha'] == 'RUS'
+
+###############################################################################
+# lookup_countries()
+def test_lookup_countries(sales_db):
+    """joining in sales.db matches joining in memory"""
+    conn = sqlite3.connect(sales_db)
+    conn.execute("UPDATE orders SET Country = 'Atlantis' WHERE rowid = 1")
+    conn.commit()
+
+    expected = geo.lookup_countries(conn, SINCE, UNTIL, SEGMENTS)
+    geo.build_dim_country(sales_db)
+    assert geo.dim_country_available(conn)
+    top = geo.lookup_countries(conn, SINCE, UNTIL, SEGMENTS)
+
+    assert top['Country'].tolist() == expected['Country'].tolist()
+    assert top['iso_alpha'].tolist()[:-1] == \
+        expected['iso_alpha'].tolist()[:-1]
+    assert geo.unmapped(top) == ['Atlantis']
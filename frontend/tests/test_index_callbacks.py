@@ -4,9 +4,30 @@ from dash._utils import AttributeDict
 import dash_bootstrap_components as dbc
 
 # Import the names of callback functions you want to test
-from index import display_page
+from index import app
+from apps import home, sales
+from apps.layout import display_dashboard
 
-def test_display_page():
-    output = display_page('/', {'user':'foo'})
-    assert isinstance(output, dbc._components.Container)
+def test_app_layout():
+    """the shell is part of the initial layout, around the 'dashboard'"""
+    client = app.server.test_client()
+    layout = client.get('/_dash-layout').get_data(as_text=True)
+    assert '"id": "dashboard"' in layout or '"id":"dashboard"' in layout
+    assert '"id": "login-btn"' in layout or '"id":"login-btn"' in layout
 
+def test_single_pass_routing():
+    """navigation only updates the 'dashboard' container"""
+    client = app.server.test_client()
+    dependencies = client.get('/_dash-dependencies').get_json()
+    routes = [d['output'] for d in dependencies
+              if {'id':'url', 'property':'pathname'} in d['inputs']
+              and d['output'].endswith('.children')]
+    assert routes == ['dashboard.children']
+
+def test_display_dashboard():
+    output = display_dashboard('/', {'user':'foo'})
+    assert output is home.layout
+
+    output = display_dashboard('/sales', {'user':'foo'})
+    assert output is display_dashboard('/sales', None)
+    assert output is sales.skeleton()
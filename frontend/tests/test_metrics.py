@@ -0,0 +1,84 @@
+import os
+import pytest
+from index import app
+from apps import metrics
+
+prometheus_client = pytest.importorskip('prometheus_client')
+import prometheus_client.parser
+
+def sample(text, name, **labels):
+    """Value of a metric sample in /metrics output"""
+    for family in prometheus_client.parser.text_string_to_metric_families(
+            text):
+        for s in family.samples:
+            if s.name == name and all(
+                    s.labels.get(k) == v for k, v in labels.items()):
+                return s.value
+    return 0
+
+###############################################################################
+# /metrics
+def test_metrics():
+    """callback requests are recorded by phase"""
+    client = app.server.test_client()
+    before = client.get('/metrics').get_data(as_text=True)
+
+    response = client.post('/_dash-update-component', json={
+        'output': 'login-btn.children',
+        'outputs': {'id': 'login-btn', 'property': 'children'},
+        'inputs': [{'id': 'auth-data', 'property': 'data',
+                    'value': {'username': 'foo'}}],
+        'changedPropIds': ['auth-data.data'],
+        'state': [],
+    })
+    assert response.status_code == 200
+    after = client.get('/metrics').get_data(as_text=True)
+
+    for phase in ['total', 'serialization']:
+        name = 'dash_callback_duration_seconds_count'
+        labels = {'callback': 'update_login_btn', 'phase': phase}
+        assert sample(after, name, **labels) == \
+            sample(before, name, **labels) + 1
+    assert sample(after, 'dash_callback_response_bytes_sum',
+                  callback='update_login_btn') > 0
+    assert sample(after, 'dash_callback_in_flight',
+                  callback='update_login_btn') == 0
+
+def test_phase():
+    """phases outside instrumented callbacks are ignored, errors counted"""
+    with metrics.phase('query'):
+        pass
+
+    @metrics.instrument
+    def failing():
+        with metrics.phase('query'):
+            raise ValueError()
+
+    with app.server.test_request_context():
+        with pytest.raises(ValueError):
+            failing()
+    assert prometheus_client.REGISTRY.get_sample_value(
+        'dash_callback_errors_total', {'callback': 'failing'}
+    ) == 1
+
+###############################################################################
+# Setup
+def test_setup(tmp_path, monkeypatch):
+    """metric files are cleared by the serving process only"""
+    directory = tmp_path / 'metrics'
+    directory.mkdir()
+    (directory / 'counter_1.db').write_bytes(b'stale')
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(directory))
+    monkeypatch.setattr(prometheus_client.values, 'ValueClass',
+                        prometheus_client.values.ValueClass)
+    monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR', raising=False)
+
+    metrics.setup()
+    assert os.environ['PROMETHEUS_MULTIPROC_DIR'] == str(directory)
+    assert metrics.multiprocess_mode()
+    assert list(directory.iterdir()) == []
+
+    # Child processes inherit the directory
+    (directory / 'counter_2.db').write_bytes(b'')
+    metrics.setup()
+    assert [p.name for p in directory.iterdir()] == ['counter_2.db']
@@ -0,0 +1,43 @@
+import sqlite3
+from apps import dates, geo
+from apps.rollup import build_rollups, dashboard_queries
+from optimize_db import check_query_plans, optimize
+
+###############################################################################
+# check_query_plans()
+def test_check_query_plans1(sales_db):
+    """queries on a plain 'orders' table are reported as scans"""
+    degraded = check_query_plans(sqlite3.connect(sales_db))
+    assert set(degraded) == {
+        'orders', 'orders_years', 'buckets_day', 'buckets_week', 'export_raw'
+    }
+
+def test_check_query_plans2(sales_db):
+    """every dashboard query uses an index after optimize()"""
+    build_rollups(sales_db)
+    optimize(sales_db)
+    assert check_query_plans(sqlite3.connect(sales_db)) == {}
+
+def test_check_query_plans3(sales_db):
+    """dimension joins are checked and look rows up by key"""
+    dates.build_dim_calendar(sales_db)
+    geo.build_dim_country(sales_db)
+    build_rollups(sales_db)
+    optimize(sales_db)
+    conn = sqlite3.connect(sales_db)
+
+    plans = {
+        name: [r[3] for r in conn.execute('EXPLAIN QUERY PLAN ' + query,
+                                          params)]
+        for name, query, params in dashboard_queries(conn)
+    }
+    assert set(plans) == {
+        'orders', 'orders_years', 'rollup_cube', 'buckets_day',
+        'buckets_week', 'dim_country', 'export_raw'
+    }
+    for name in ['buckets_day', 'buckets_week']:
+        assert any(step.startswith('SEARCH c USING INTEGER PRIMARY KEY')
+                   for step in plans[name])
+    assert any(step.startswith('SEARCH d USING INDEX')
+               for step in plans['dim_country'])
+    assert check_query_plans(conn) == {}
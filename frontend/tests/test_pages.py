@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+from apps import pages
+
+FRONTEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(code):
+    """Output of 'code' run by a fresh interpreter, in the app directory"""
+    return subprocess.run(
+        [sys.executable, '-c', code], cwd=FRONTEND, check=True,
+        capture_output=True, text=True, timeout=120,
+    ).stdout
+
+###############################################################################
+# Registry
+def test_lazy_import():
+    """loading the app does not import the dashboards"""
+    out = run('import sys, index; print("apps.sales" in sys.modules)')
+    assert out.strip().splitlines()[-1] == 'False'
+
+def test_first_request():
+    """pages' callbacks are registered before the first request"""
+    out = run(
+        'import index\n'
+        'deps = index.app.server.test_client().get("/_dash-dependencies")\n'
+        'print(any("venda-plot" in d["output"] for d in deps.get_json()))'
+    )
+    assert 'INFO: page apps.sales loaded in' in out
+    assert out.strip().splitlines()[-1] == 'True'
+
+def test_get():
+    """pages are looked up by path"""
+    assert pages.get('/sales') is sys.modules['apps.sales']
+    assert pages.get('/nowhere') is None
+    assert pages.load_all() >= 0 and pages.loaded()
@@ -0,0 +1,116 @@
+import datetime as dt
+import shutil
+import sqlite3
+import pytest
+from apps import export, partitions
+from apps.rollup import (
+    build_rollups, dashboard_queries, lookup_buckets, rollups_available
+)
+from optimize_db import check_query_plans, optimize
+
+@pytest.fixture
+def partitioned_db(sales_db, tmp_path):
+    """Partitioned copy of sales_db"""
+    path = str(tmp_path / 'partitioned.db')
+    shutil.copy(sales_db, path)
+    partitions.partition_orders(path)
+    return path
+
+def tables_read(conn, query, params):
+    """Tables an EXPLAIN QUERY PLAN visits"""
+    plan = conn.execute('EXPLAIN QUERY PLAN ' + query, params).fetchall()
+    return {
+        word for row in plan for word in row[3].split()
+        if partitions.PATTERN.match(word)
+    }
+
+###############################################################################
+# partition_orders()
+def test_partition_orders(sales_db, partitioned_db):
+    """every order moves to its year's partition, behind the 'orders' view"""
+    conn = sqlite3.connect(partitioned_db)
+    assert partitions.is_partitioned(conn)
+    assert partitions.partition_years(conn) == [2011, 2012, 2013, 2014]
+    assert conn.execute('SELECT count(*) FROM orders_2012 '
+                        'WHERE "Order Date" NOT LIKE \'2012-%\'').fetchone() \
+        == (0,)
+
+    query = 'SELECT * FROM orders ORDER BY "Row ID"'
+    assert conn.execute(query).fetchall() == \
+        sqlite3.connect(sales_db).execute(query).fetchall()
+
+    # Idempotent
+    assert partitions.partition_orders(partitioned_db) == \
+        [2011, 2012, 2013, 2014]
+
+def test_add_partition(partitioned_db):
+    """new years get an empty partition, part of the view"""
+    partitions.add_partition(partitioned_db, 2015)
+    conn = sqlite3.connect(partitioned_db)
+    assert partitions.partition_years(conn)[-1] == 2015
+    conn.execute("INSERT INTO orders_2015 SELECT * FROM orders_2014 LIMIT 1")
+    assert conn.execute('SELECT count(*) FROM orders').fetchone()[0] == 2001
+
+###############################################################################
+# Lookups
+@pytest.mark.parametrize('granularity', ['day', 'week', 'month', 'year'])
+@pytest.mark.parametrize('rollups', [False, True])
+def test_lookup_buckets(sales_db, partitioned_db, granularity, rollups):
+    """lookups return the same rows once partitioned"""
+    if rollups:
+        build_rollups(sales_db)
+        build_rollups(partitioned_db)
+        assert rollups_available(sqlite3.connect(partitioned_db))
+
+    since, until = dt.date(2012, 2, 10), dt.date(2013, 8, 20)
+    segments = ['Consumer', 'Corporate']
+    expected = lookup_buckets(sqlite3.connect(sales_db), since, until,
+                              segments, granularity)
+    df = lookup_buckets(sqlite3.connect(partitioned_db), since, until,
+                        segments, granularity)
+    # Sums may differ in the last digits, rows being added in another order
+    assert df.drop(columns='sales').equals(expected.drop(columns='sales'))
+    assert (df['sales'] - expected['sales']).abs().max() < 1e-6
+
+def test_pruning(partitioned_db):
+    """queries only read the partitions overlapping the range"""
+    conn = sqlite3.connect(partitioned_db)
+    assert partitions.source(conn, dt.date(2012, 3, 1),
+                             dt.date(2012, 5, 1)) == 'orders_2012'
+
+    query, params = export.export_query(
+        conn, 'raw', dt.date(2012, 11, 1), dt.date(2013, 2, 28), ['Consumer']
+    )
+    assert tables_read(conn, query, params) == {'orders_2012', 'orders_2013'}
+    assert len(conn.execute(query, params).fetchall()) > 0
+
+def test_optimize(partitioned_db):
+    """indexes are created per partition"""
+    build_rollups(partitioned_db)
+    optimize(partitioned_db)
+    conn = sqlite3.connect(partitioned_db)
+    indexes = {r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'"
+    )}
+    assert {f'orders_date_cover_{y}' for y in range(2011, 2015)} <= indexes
+    queries = {name: (query, params) for name, query, params
+               in dashboard_queries(conn)}
+    assert tables_read(conn, *queries['orders_years']) == \
+        {'orders_2011', 'orders_2012'}
+    assert check_query_plans(conn) == {}
+
+def test_rollups_stale(partitioned_db):
+    """partitions' updates and new partitions' inserts make rollups stale"""
+    build_rollups(partitioned_db)
+    partitions.add_partition(partitioned_db, 2015)
+    build_rollups(partitioned_db)
+    conn = sqlite3.connect(partitioned_db)
+    with conn:
+        conn.execute('UPDATE orders_2012 SET Sales = 0 WHERE rowid = 3')
+    assert not rollups_available(conn)
+
+    build_rollups(partitioned_db)
+    partitions.add_partition(partitioned_db, 2016)
+    build_rollups(partitioned_db)
+    conn.execute("INSERT INTO orders_2016 SELECT * FROM orders_2014 LIMIT 1")
+    assert not rollups_available(conn)
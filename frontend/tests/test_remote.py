@@ -0,0 +1,144 @@
+import datetime as dt
+import hashlib
+import sqlite3
+import urllib.parse
+import pytest
+from apps import remote
+from apps.cache import ResultCache
+from apps.rollup import lookup_buckets
+
+def orders_route(db_path, valid_token=None):
+    """Stub '/orders' endpoint serving 'orders' rows, by page with ETags"""
+    def route(handler):
+        if valid_token and \
+                handler.headers.get('Authorization') != f'Bearer {valid_token}':
+            return 401, {}, {'detail': 'Not authenticated'}
+
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(handler.path).query)
+        page, size = int(query['page'][0]), int(query['page_size'][0])
+        segments = query.get('segment', [])
+        where = f"""
+            WHERE "Order Date" >= ? AND "Order Date" < date(?, '+1 day')"""
+        if segments:    # every segment, without the parameter
+            where += f" AND Segment IN ({','.join('?' * len(segments))})"
+        args = [query['since'][0], query['until'][0]] + segments
+
+        conn = sqlite3.connect(db_path)
+        total = conn.execute(f'SELECT count(*) FROM orders {where}',
+                             args).fetchone()[0]
+        rows = conn.execute(f"""
+            SELECT "Order ID", "Order Date", Segment, Market, Country, Sales,
+                Quantity
+            FROM orders {where} ORDER BY "Row ID" LIMIT ? OFFSET ?""",
+            args + [size, (page - 1) * size]).fetchall()
+        conn.close()
+
+        etag = '"' + hashlib.md5(repr((rows, total)).encode()).hexdigest() + '"'
+        if handler.headers.get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, b''
+        items = [dict(zip(['order_id', 'order_date', 'segment', 'market',
+                           'country', 'sales', 'quantity'], r)) for r in rows]
+        return 200, {'ETag': etag}, {'items': items, 'total': total}
+    return route
+
+def assert_same(df, expected):
+    """lookups return the same rows"""
+    key = list(expected.columns[:4])
+    expected = expected.sort_values(key).reset_index(drop=True)
+    df = df.sort_values(key).reset_index(drop=True)
+    assert df[key].equals(expected[key])
+    assert (df['sales'] - expected['sales']).abs().max() < 1e-6
+    assert df['quantity'].tolist() == expected['quantity'].tolist()
+    assert df['orders'].tolist() == expected['orders'].tolist()
+
+@pytest.fixture
+def etag_cache(tmp_path):
+    return ResultCache(str(tmp_path / 'api-cache.db'), None, maxsize=100)
+
+###############################################################################
+# APIEngine.lookup_buckets()
+@pytest.mark.parametrize('granularity', ['day', 'week', 'month', 'year'])
+def test_lookup_buckets(sales_db, stub_api, granularity):
+    """paginated API lookups match the SQL aggregation"""
+    stub_api.routes[('GET', '/orders')] = orders_route(sales_db)
+    since, until = dt.date(2011, 3, 15), dt.date(2013, 7, 10)
+    segments = ['Consumer', 'Home Office']
+
+    engine = remote.APIEngine(stub_api.url, page_size=100, cache=None)
+    df = engine.lookup_buckets(since, until, segments, granularity)
+    expected = lookup_buckets(
+        sqlite3.connect(sales_db), since, until, segments, granularity
+    )
+    assert_same(df, expected)
+
+    pages = [p for m, p in stub_api.requests if p.startswith('/orders')]
+    assert len(pages) > 1
+    assert stub_api.connections <= engine.workers + 1
+
+def test_lookup_empty(sales_db, stub_api):
+    """ranges without orders return an empty frame"""
+    stub_api.routes[('GET', '/orders')] = orders_route(sales_db)
+    engine = remote.APIEngine(stub_api.url, cache=None)
+    df = engine.lookup_buckets(dt.date(2020, 1, 1), dt.date(2020, 12, 31),
+                               ['Consumer'], 'month')
+    assert df.empty
+    assert engine.lookup_buckets(dt.date(2011, 1, 1), dt.date(2011, 12, 31),
+                                 [], 'month').empty
+
+###############################################################################
+# ETag cache
+def test_etag_cache(sales_db, stub_api, etag_cache):
+    """unchanged pages are revalidated, not downloaded again"""
+    stub_api.routes[('GET', '/orders')] = orders_route(sales_db)
+    since, until = dt.date(2012, 1, 1), dt.date(2012, 12, 31)
+    engine = remote.APIEngine(stub_api.url, page_size=200, cache=etag_cache)
+
+    first = engine.lookup_buckets(since, until, ['Consumer'], 'month')
+    pages = len(stub_api.requests)
+
+    responses = []
+    route = stub_api.routes[('GET', '/orders')]
+    stub_api.routes[('GET', '/orders')] = lambda h: \
+        responses.append(route(h)) or responses[-1]
+    second = engine.lookup_buckets(since, until, ['Consumer'], 'month')
+
+    assert_same(second, first)
+    assert [r[0] for r in responses] == [304] * pages
+
+###############################################################################
+# Authentication
+def test_service_account(sales_db, stub_api):
+    """requests carry the service account's token, renewed when refused"""
+    tokens = iter(['expired', 'fresh'])
+    stub_api.routes[('POST', '/token')] = lambda h: (
+        200, {}, {'access_token': next(tokens)}
+    )
+    stub_api.routes[('GET', '/orders')] = orders_route(sales_db, 'fresh')
+
+    engine = remote.APIEngine(stub_api.url, 'service', 'secret', cache=None)
+    df = engine.lookup_buckets(dt.date(2011, 1, 1), dt.date(2011, 12, 31),
+                               ['Corporate'], 'year')
+    assert df['orders'].sum() > 0
+    assert engine._token == 'fresh'
+
+###############################################################################
+# Data version
+def test_data_version(sales_db, stub_api, monkeypatch):
+    """the version follows the backend's orders, and expires while it is
+    unreachable"""
+    stub_api.routes[('GET', '/orders')] = orders_route(sales_db)
+    engine = remote.APIEngine(stub_api.url, cache=None)
+    version = engine.data_version()
+    assert version.startswith('api:"')
+
+    # Checked every VERSION_CHECK seconds
+    with sqlite3.connect(sales_db) as conn:
+        conn.execute('DELETE FROM orders WHERE "Row ID" = 1')
+    assert engine.data_version() == version
+    monkeypatch.setattr(remote, 'VERSION_CHECK', 0)
+    assert engine.data_version() not in (version, None)
+
+    del stub_api.routes[('GET', '/orders')]
+    monkeypatch.setattr(remote, 'VERSION_CHECK', 3600)
+    engine._version = (None, None)
+    assert engine.data_version().startswith('api-unknown:')
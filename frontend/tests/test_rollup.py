@@ -0,0 +1,70 @@
+import datetime as dt
+import sqlite3
+import pytest
+from apps.rollup import build_rollups, lookup_monthly, rollups_available, \
+    split_range
+
+SEGMENTS = ['Consumer', 'Corporate']
+
+###############################################################################
+# split_range()
+def test_split_range1():
+    """partial edges and whole months"""
+    edges, months = split_range(dt.date(2011, 3, 15), dt.date(2013, 7, 10))
+    assert edges == [
+        (dt.date(2011, 3, 15), dt.date(2011, 3, 31)),
+        (dt.date(2013, 7, 1), dt.date(2013, 7, 10)),
+    ]
+    assert months == ('2011-04', '2013-06')
+
+def test_split_range2():
+    """month aligned range has no edges"""
+    assert split_range(dt.date(2011, 1, 1), dt.date(2014, 12, 31)) == \
+        ([], ('2011-01', '2014-12'))
+
+def test_split_range3():
+    """range within a single month"""
+    assert split_range(dt.date(2012, 2, 2), dt.date(2012, 2, 20)) == \
+        ([(dt.date(2012, 2, 2), dt.date(2012, 2, 20))], None)
+
+###############################################################################
+# lookup_monthly()
+@pytest.mark.parametrize('since,until', [
+    (dt.date(2011, 1, 1), dt.date(2014, 12, 31)),
+    (dt.date(2011, 3, 15), dt.date(2013, 7, 10)),
+    (dt.date(2012, 2, 2), dt.date(2012, 2, 20)),
+])
+def test_lookup_monthly(sales_db, since, until):
+    """rollup results match the aggregation of raw orders"""
+    conn = sqlite3.connect(sales_db)
+    raw = lookup_monthly(conn, since, until, SEGMENTS)
+
+    build_rollups(sales_db)
+    assert rollups_available(conn)
+    fast = lookup_monthly(conn, since, until, SEGMENTS)
+
+    key = list(raw.columns[:4])
+    raw = raw.sort_values(key).reset_index(drop=True)
+    fast = fast.sort_values(key).reset_index(drop=True)
+    assert raw[key].equals(fast[key])
+    assert (raw['sales'] - fast['sales']).abs().max() < 1e-6
+    assert raw['orders'].equals(fast['orders'])
+
+def test_rollups_stale(sales_db):
+    """rollups are ignored once 'orders' changes"""
+    build_rollups(sales_db)
+    conn = sqlite3.connect(sales_db)
+    conn.execute('INSERT INTO orders SELECT * FROM orders LIMIT 1')
+    assert not rollups_available(conn)
+
+@pytest.mark.parametrize('statement', [
+    'UPDATE orders SET Sales = Sales + 1 WHERE "Row ID" = 10',
+    'DELETE FROM orders WHERE "Row ID" = 10',
+])
+def test_rollups_stale_rows(sales_db, statement):
+    """updates and deletes of any row make the rollups stale too"""
+    build_rollups(sales_db)
+    conn = sqlite3.connect(sales_db)
+    assert rollups_available(conn)
+    conn.execute(statement)
+    assert not rollups_available(conn)
@@ -0,0 +1,122 @@
+import datetime as dt
+import json
+import sqlite3
+import plotly
+import pytest
+from apps import geo, sales
+from apps.cache import ResultCache
+
+SINCE = dt.date(2011, 1, 1)
+UNTIL = dt.date(2014, 12, 31)
+
+def size(value):
+    return len(json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder))
+
+def assignments(patch):
+    """Patch operations as a {location: value} dict"""
+    return {
+        tuple(op['location']): op['params']['value']
+        for op in patch.to_plotly_json()['operations']
+    }
+
+###############################################################################
+# skeletons
+def test_skeletons():
+    """one trace per segment and per continent, in patching order"""
+    assert [t.name for t in sales.sales_skeleton().data] == sales.SEGMENTS
+    assert [t.name for t in sales.globe_skeleton().data] == geo.CONTINENTS
+    assert len(sales.markets_skeleton().data) == 1
+
+###############################################################################
+# patch_*()
+def test_patches(sales_db):
+    """patches carry the data arrays only"""
+    cube = geo.lookup_cube(
+        sqlite3.connect(sales_db), SINCE, UNTIL, ['Consumer', 'Corporate']
+    )
+    df = sales.period_sales(cube, 'month')
+    top = geo.aggregate_countries(cube)
+
+    ops = assignments(sales.patch_sales(df, 'month'))
+    assert ops[('layout', 'xaxis', 'title', 'text')] == 'Mês'
+    assert len(ops[('layout', 'xaxis', 'categoryarray')]) == 48
+    assert len(ops[('data', 0, 'y')]) == 48
+    assert ops[('data', 1, 'y')] == []      # 'Home Office' not selected
+
+    ops = assignments(sales.patch_markets(df))
+    assert abs(sum(ops[('data', 0, 'values')]) - cube['sales'].sum()) < 1e-6
+
+    patch = sales.patch_globe(top)
+    ops = assignments(patch)
+    assert sorted(ops[('data', 1, 'hovertext')]) == \
+        ['Brazil', 'United States']
+    assert ops[('layout', 'annotations')] == []
+    assert size(patch) < size(sales.globe_skeleton())
+
+###############################################################################
+# Figures cache
+@pytest.fixture
+def figure_cache(tmp_path, sales_db, monkeypatch):
+    cache = ResultCache(str(tmp_path / 'figures.db'), sales_db, maxsize=100)
+    monkeypatch.setattr(sales, 'figure_cache', cache)
+    monkeypatch.setattr(sales, 'lookup_cube', lambda since, until, segments:
+        geo.lookup_cube(sqlite3.connect(sales_db), *sales.parse_range(
+            since, until, segments), sales.granularity(since, until)))
+    return cache
+
+def test_lookup_figures(figure_cache, monkeypatch):
+    """views are rendered once, then served as serialized patches"""
+    segments = ['Corporate', 'Consumer']
+    figures = sales.lookup_figures(20110101, 20141231, segments)
+    assert len(figures) == len(sales.FIGURES)
+
+    cube = sales.lookup_cube(20110101, 20141231, segments)
+    df = sales.period_sales(cube, 'month')
+    assert json.loads(figures[1]) == json.loads(
+        plotly.io.json.to_json_plotly(sales.patch_markets(df))
+    )
+
+    def render(*args):
+        raise AssertionError('rendered again')
+    monkeypatch.setattr(sales, 'render_figures', render)
+    assert sales.lookup_figures(20110101, 20141231, segments[::-1]) == figures
+    assert figure_cache.stats()['hits'] == len(sales.FIGURES)
+
+def test_warm_figures(figure_cache, monkeypatch):
+    """presets are warmed, and again once the data changed"""
+    views = sales.preset_views()
+    assert (20110101, 20141231, sales.SEGMENTS) in views
+    assert len(views) == 5
+
+    rendered = []
+    monkeypatch.setattr(sales, 'render_figures',
+                        lambda *view: rendered.append(view) or ['{}'] * 3)
+    monkeypatch.setattr(sales, '_warmed',
+                        {'version': None, 'checked': 0.0, 'thread': None})
+    assert sales.warm_figures() == 5
+    assert len(rendered) == 5
+
+    # Unchanged data: nothing to do
+    sales.refresh_figures()
+    assert sales._warmed['thread'] is None
+
+    # Data refresh
+    with sqlite3.connect(figure_cache.source) as conn:
+        conn.execute('DELETE FROM orders WHERE "Row ID" = 1')
+    sales._warmed['checked'] = 0.0
+    sales.refresh_figures()
+    sales._warmed['thread'].join(10)
+    assert len(rendered) == 10
+
+def test_engine_version(monkeypatch):
+    """lookup and figure caches follow the active engine's data version"""
+    class Engine:
+        version = 'api:"1"'
+        def data_version(self):
+            return self.version
+
+    engine = Engine()
+    monkeypatch.setattr(sales, 'engine', engine)
+    assert sales.cache.version() == sales.figure_cache.version() == 'api:"1"'
+    engine.version = 'api:"2"'
+    assert sales.figure_cache.version() == 'api:"2"'
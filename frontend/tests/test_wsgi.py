@@ -0,0 +1,38 @@
+import importlib
+import sys
+import threading
+from apps import warmup
+
+def test_warmup_failure(monkeypatch):
+    """the WSGI app is served, not ready, after a failed warmup"""
+    def failing():
+        warmup.error = 'database is locked'
+        return False
+
+    monkeypatch.setattr(warmup, 'warmup', failing)
+    monkeypatch.setattr(warmup, 'ready', threading.Event())
+    monkeypatch.setattr(warmup, 'error', warmup.error)
+    monkeypatch.delitem(sys.modules, 'wsgi', raising=False)
+    server = importlib.import_module('wsgi').server
+
+    response = server.test_client().get('/ready')
+    assert response.status_code == 503
+    assert response.get_json()['error'] == 'database is locked'
+
+def test_warmup_retry(monkeypatch):
+    """warmup is retried until it succeeds"""
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 2:
+            warmup.ready.set()
+        return warmup.ready.is_set()
+
+    monkeypatch.setattr(warmup, 'warmup', flaky)
+    monkeypatch.setattr(warmup, 'ready', threading.Event())
+    monkeypatch.setattr(warmup, '_retrying', None)
+    warmup.retry(interval=0.01)
+    warmup.retry(interval=0.01)
+    assert warmup.ready.wait(5)
+    assert len(attempts) == 2
@@ -0,0 +1,18 @@
+"""wsgi.py
+
+WSGI entry point for production serving, ex.:
+
+    gunicorn -c gunicorn.conf.py wsgi:server
+"""
+import time
+
+_start = time.perf_counter()
+from index import app
+from apps import warmup
+print(f'INFO: app imported in {time.perf_counter() - _start:.2f}s')
+
+# With gunicorn's preload_app this runs once, before forking the workers. On
+# failure /ready answers 503 while the workers retry it (warmup.retry()).
+warmup.warmup()
+
+server = app.server